@@ -1,82 +1,596 @@
+import atexit
+import contextvars
 import os
+import queue
+import select
 import subprocess
 import sys
-import shlex
 import threading
 import time
-import psutil
-import shutil
-import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, filedialog, simpledialog
-import webbrowser
-import pyperclip
+
+# GUI modules are imported on demand by load_gui_modules() so headless runs
+# (see run_cli) never load Tk.
+tk = ttk = scrolledtext = messagebox = filedialog = simpledialog = None
 
 # ------------------------------------------------
 # CONFIG / GLOBALS
 # ------------------------------------------------
 
-CONFIG_FILE = "config.txt"  # Stores vault path, Obsidian path, setup_done flag, etc.
-config_data = {
-    "VAULT_PATH": "",
-    "OBSIDIAN_PATH": "",
-    "SETUP_DONE": "0"
+CONFIG_FILE_NAME = "ogresync.ini"  # lives in get_config_dir()
+LEGACY_CONFIG_FILE = "config.txt"  # KEY=VALUE file in the working directory (older versions)
+
+# key: (type, default). Types: "bool", "seconds", "path", "str", "rules" (one
+# "glob = strategy" per line, see CONFLICT_STRATEGIES) or a tuple of allowed values.
+CONFIG_SCHEMA = {
+    "VAULT_PATH": ("path", ""),
+    "OBSIDIAN_PATH": ("str", ""),         # executable path or launch command
+    "SETUP_DONE": ("bool", False),
+    "LIVE_SYNC": ("bool", False),         # commit/push while Obsidian is open
+    "LIVE_SYNC_DEBOUNCE": ("seconds", 5.0),     # quiet time before a live commit
+    "LIVE_SYNC_MAX_LATENCY": ("seconds", 60.0), # max time a change waits for a live commit
+    "PREFETCH": ("bool", True),           # fetch from GitHub in the background while Obsidian is open
+    "PREFETCH_INTERVAL": ("seconds", 60.0),     # initial time between background fetches
+    "CONFLICT_POLICY": (("ask", "ours", "theirs", "abort"), "ask"),  # what to do when remote changes conflict
+    "TRACE": ("bool", False),             # record step/command timings and export a trace per sync
+    "TRACE_DIR": ("path", ""),            # where trace files go (default: <config dir>/traces)
+    "PUSH_AGENT": ("bool", True),         # push commits left behind offline from a background process
+    "PUSH_AGENT_INTERVAL": ("seconds", 30.0),   # how often the push agent re-checks connectivity
+    "MERGE_DRIVER": ("bool", True),       # merge edits to different lines of a note automatically
+    "CONFLICT_RULES": ("rules", ((".obsidian/workspace*.json", "ours"),)),  # glob = strategy, per conflicting file
+    "PROMPT_TIMEOUT": ("seconds", 1800.0),      # how long a sync waits for an answer in a dialog (0: no limit)
+    "FILE_STATE_INDEX": ("bool", True),   # find changed files from a saved stat table instead of a full git scan
 }
+# Settings a [vault:NAME] section may override for that vault.
+VAULT_SETTINGS = ("LIVE_SYNC", "LIVE_SYNC_DEBOUNCE", "LIVE_SYNC_MAX_LATENCY",
+                  "PREFETCH", "PREFETCH_INTERVAL", "CONFLICT_POLICY", "MERGE_DRIVER", "CONFLICT_RULES")
+
+config_data = {key: default for key, (_, default) in CONFIG_SCHEMA.items()}
+vault_configs = {}  # vault name -> {"VAULT_PATH": ..., overridden VAULT_SETTINGS...}
 
 SSH_KEY_PATH = os.path.expanduser("~/.ssh/id_rsa.pub")
 
+# Keeps git from opening an editor (e.g. on 'rebase --continue') in the background thread.
+NON_INTERACTIVE_GIT_ENV = {"GIT_EDITOR": "true"}
+PROCESS_STOP_GRACE = 5.0  # seconds a stopped command gets to clean up before it is killed
+
 root = None  # We will create this conditionally
+cancel_button = None
 log_text = None
 progress_bar = None
+console_log_json = False  # headless runs: print log messages as JSON lines (see run_cli)
 
 # ------------------------------------------------
 # CONFIG HANDLING
 # ------------------------------------------------
 
-def load_config():
+def get_config_dir():
+    """
+    Returns the per-user configuration folder: %APPDATA%\\Ogresync on Windows,
+    ~/Library/Application Support/Ogresync on macOS and $XDG_CONFIG_HOME/ogresync
+    (~/.config/ogresync) elsewhere. OGRESYNC_CONFIG_DIR overrides it.
+    """
+    if os.environ.get("OGRESYNC_CONFIG_DIR"):
+        return os.environ["OGRESYNC_CONFIG_DIR"]
+    if sys.platform.startswith("win"):
+        return os.path.join(os.environ.get("APPDATA") or os.path.expanduser("~"), "Ogresync")
+    if sys.platform.startswith("darwin"):
+        return os.path.expanduser("~/Library/Application Support/Ogresync")
+    return os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "ogresync")
+
+def get_config_path():
+    return os.path.join(get_config_dir(), CONFIG_FILE_NAME)
+
+def parse_config_value(key, raw):
+    """
+    Converts a stored value (text from the file, or an already typed value) to the
+    type CONFIG_SCHEMA declares for key. Raises ValueError if it does not fit.
+    """
+    kind, _ = CONFIG_SCHEMA[key]
+    if kind == "bool":
+        if isinstance(raw, bool):
+            return raw
+        text = str(raw).strip().lower()
+        if text in ("1", "true", "yes", "on"):
+            return True
+        if text in ("0", "false", "no", "off", ""):
+            return False
+        raise ValueError(f"{key} must be true or false, not {raw!r}")
+    if kind == "seconds":
+        value = float(raw)
+        if value < 0:
+            raise ValueError(f"{key} must not be negative")
+        return value
+    if kind == "path":
+        return os.path.expanduser(str(raw).strip()) if str(raw).strip() else ""
+    if kind == "rules":
+        if isinstance(raw, tuple):
+            return raw
+        rules = []
+        for line in str(raw).splitlines():
+            if not line.strip() or line.strip().startswith(("#", ";")):
+                continue
+            pattern, sep, strategy = line.rpartition("=")
+            pattern, strategy = pattern.strip(), strategy.strip().lower()
+            if not sep or not pattern or strategy not in CONFLICT_STRATEGIES:
+                raise ValueError(f"{key}: expected 'glob = {' | '.join(CONFLICT_STRATEGIES)}', not {line.strip()!r}")
+            rules.append((pattern, strategy))
+        return tuple(rules)
+    if isinstance(kind, tuple):
+        value = str(raw).strip().lower()
+        if value not in kind:
+            raise ValueError(f"{key} must be one of {', '.join(kind)}, not {raw!r}")
+        return value
+    return str(raw).strip()
+
+def format_config_value(key, value):
+    kind, _ = CONFIG_SCHEMA[key]
+    if kind == "bool":
+        return "true" if value else "false"
+    if kind == "seconds":
+        return f"{value:g}"
+    if kind == "rules":
+        return "".join(f"\n{pattern} = {strategy}" for pattern, strategy in value)
+    return str(value)
+
+def get_config(key, vault_path=None):
     """
-    Reads config.txt into config_data dict.
-    Expected lines like: KEY=VALUE
+    Returns the typed value of a setting. If vault_path is given and that vault's
+    section overrides the setting, the override wins. Invalid values fall back to
+    the schema default.
     """
-    if not os.path.exists(CONFIG_FILE):
+    raw = config_data.get(key, CONFIG_SCHEMA[key][1])
+    if vault_path and key in VAULT_SETTINGS:
+        target = os.path.abspath(vault_path)
+        for section in vault_configs.values():
+            if section.get("VAULT_PATH") and os.path.abspath(section["VAULT_PATH"]) == target:
+                raw = section.get(key, raw)
+                break
+    try:
+        return parse_config_value(key, raw)
+    except (TypeError, ValueError):
+        return CONFIG_SCHEMA[key][1]
+
+def get_vaults():
+    """
+    Returns [(name, path)] for every configured vault.
+    """
+    return [(name, section["VAULT_PATH"]) for name, section in vault_configs.items() if section.get("VAULT_PATH")]
+
+def vault_name(vault_path):
+    return os.path.basename(os.path.normpath(vault_path)) or "vault"
+
+_config_stat = None  # (mtime_ns, size) of the file config_data was last loaded from or saved to
+
+def _read_config_file(path):
+    """
+    Parses ogresync.ini into (settings, vaults). Unknown keys are ignored and
+    invalid values are reported and replaced by their defaults.
+    """
+    import configparser
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(path, encoding="utf-8")
+    settings, vaults = {}, {}
+
+    def read_section(section, keys, target):
+        for key in keys:
+            option = key.lower()
+            if parser.has_option(section, option):
+                try:
+                    target[key] = parse_config_value(key, parser.get(section, option))
+                except ValueError as e:
+                    print(f"Ignoring invalid setting in {path}: {e}")
+
+    if parser.has_section("ogresync"):
+        read_section("ogresync", [k for k in CONFIG_SCHEMA if k != "VAULT_PATH"], settings)
+    for section in parser.sections():
+        if section.startswith("vault:"):
+            entry = {}
+            if parser.has_option(section, "path"):
+                entry["VAULT_PATH"] = parse_config_value("VAULT_PATH", parser.get(section, "path"))
+            read_section(section, VAULT_SETTINGS, entry)
+            vaults[section[len("vault:"):]] = entry
+    if parser.has_option("ogresync", "vault"):
+        settings["DEFAULT_VAULT"] = parser.get("ogresync", "vault")
+    return settings, vaults
+
+def _migrate_legacy_config(path):
+    """
+    Converts a config.txt from older versions into ogresync.ini, then renames it
+    to config.txt.migrated so it is clear it is no longer read.
+    """
+    if not os.path.exists(LEGACY_CONFIG_FILE):
         return
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+    with open(LEGACY_CONFIG_FILE, "r", encoding="utf-8") as f:
         for line in f:
-            line = line.strip()
-            if "=" in line:
-                key, val = line.split("=", 1)
-                config_data[key.strip()] = val.strip()
+            key, sep, val = line.strip().partition("=")
+            key = key.strip()
+            if sep and key in CONFIG_SCHEMA:
+                try:
+                    config_data[key] = parse_config_value(key, val)
+                except ValueError:
+                    pass
+    if config_data["VAULT_PATH"]:
+        vault_configs.setdefault(vault_name(config_data["VAULT_PATH"]), {})["VAULT_PATH"] = config_data["VAULT_PATH"]
+    save_config()
+    os.replace(LEGACY_CONFIG_FILE, LEGACY_CONFIG_FILE + ".migrated")
+    print(f"Migrated {os.path.abspath(LEGACY_CONFIG_FILE)} to {path}")
+
+def load_config():
+    """
+    Loads ogresync.ini into config_data (typed values) and vault_configs.
+    The file is only parsed again if its mtime or size changed since the last
+    load/save, so calling this often is cheap. A config.txt from older versions
+    is migrated on first use.
+    """
+    global _config_stat
+    path = get_config_path()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _migrate_legacy_config(path)
+        return
+    if _config_stat == (st.st_mtime_ns, st.st_size):
+        return
+    settings, vaults = _read_config_file(path)
+    default_vault = settings.pop("DEFAULT_VAULT", None)
+    config_data.update(settings)
+    vault_configs.clear()
+    vault_configs.update(vaults)
+    if default_vault in vaults:
+        config_data["VAULT_PATH"] = vaults[default_vault].get("VAULT_PATH", "")
+    elif vaults:
+        config_data["VAULT_PATH"] = next(iter(vaults.values())).get("VAULT_PATH", "")
+    _config_stat = (st.st_mtime_ns, st.st_size)
 
 def save_config():
     """
-    Writes config_data dict to config.txt.
+    Writes config_data and vault_configs to ogresync.ini atomically: the new
+    content goes to a temporary file in the same folder, which then replaces
+    the old file, so a crash never leaves a truncated configuration behind.
+    """
+    import configparser
+    global _config_stat
+    path = get_config_path()
+    if config_data["VAULT_PATH"]:
+        name = next((n for n, section in vault_configs.items()
+                     if section.get("VAULT_PATH") == config_data["VAULT_PATH"]), None)
+        if name is None:
+            base = name = vault_name(config_data["VAULT_PATH"])
+            suffix = 2
+            while name in vault_configs:
+                name, suffix = f"{base}-{suffix}", suffix + 1
+            vault_configs[name] = {"VAULT_PATH": config_data["VAULT_PATH"]}
+    else:
+        name = None
+
+    parser = configparser.ConfigParser(interpolation=None)
+    parser["ogresync"] = {key.lower(): format_config_value(key, get_config(key))
+                          for key in CONFIG_SCHEMA if key != "VAULT_PATH"}
+    if name:
+        parser["ogresync"]["vault"] = name
+    for vault, section in vault_configs.items():
+        parser[f"vault:{vault}"] = {("path" if key == "VAULT_PATH" else key.lower()): format_config_value(key, value)
+                                    for key, value in section.items()}
+
+    write_file_atomically(path, parser.write)
+    st = os.stat(path)
+    _config_stat = (st.st_mtime_ns, st.st_size)
+
+def write_file_atomically(path, write, binary=False):
+    """
+    Calls write(file) on a temporary file next to path and then moves it over
+    path, so readers see either the old or the new content, never a partial one.
+    The file is opened as UTF-8 text, or in binary mode if binary is True.
+    """
+    import tempfile
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    name, ext = os.path.splitext(os.path.basename(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}-", suffix=ext, dir=os.path.dirname(path))
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# ------------------------------------------------
+# TRACING
+# ------------------------------------------------
+
+class _NullSpan:
+    """
+    Returned by SyncTracer.span() while tracing is off. Hot paths (commands,
+    steps) test tracer.enabled and use _NULL_SPAN directly, so without tracing
+    they do not even build the span's name and details.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class TraceSpan:
+    """
+    One timed region. Extra details (exit code, output size...) can be attached
+    with set() before the span closes.
+    """
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._record(self, time.perf_counter())
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+class SyncTracer:
+    """
+    Collects spans for one sync session and exports them in the Chrome trace
+    event format (open in chrome://tracing or https://ui.perfetto.dev).
+    Disabled by default; enable with trace = true in ogresync.ini.
     """
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        for k, v in config_data.items():
-            f.write(f"{k}={v}\n")
+
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def start(self):
+        with self._lock:
+            self._events = []
+            self._threads = {}
+            self._origin = time.perf_counter()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def span(self, name, category="sync", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return TraceSpan(self, name, category, args)
+
+    def _record(self, span, end):
+        thread = threading.current_thread()
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.start - self._origin) * 1e6, 1),
+            "dur": round((end - span.start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": span.args,
+        }
+        with self._lock:
+            self._events.append(event)
+            self._threads[thread.ident] = thread.name
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def totals(self, category):
+        """
+        Returns {span name: total seconds} for one category, in first-seen order.
+        """
+        totals = {}
+        for event in self.events():
+            if event["cat"] == category:
+                totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"] / 1e6
+        return totals
+
+    def export(self, path):
+        """
+        Writes the recorded spans to 'path' as Chrome-trace JSON.
+        """
+        import json
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        meta = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in threads.items()]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, f)
+
+tracer = SyncTracer()
 
 # ------------------------------------------------
 # HELPER FUNCTIONS
 # ------------------------------------------------
 
-def run_command(command, cwd=None, timeout=None):
+def load_gui_modules():
+    """
+    Imports tkinter into the module globals. Called before the first window is
+    built, so headless runs never pay for (or require) Tk.
+    """
+    global tk, ttk, scrolledtext, messagebox, filedialog, simpledialog
+    import tkinter as tk
+    from tkinter import ttk, scrolledtext, messagebox, filedialog, simpledialog
+
+class SyncCancelled(BaseException):
+    """
+    Raised inside a vault's sync when it was cancelled (Cancel button, SIGTERM) or
+    a step ran past its deadline. Derives from BaseException, like
+    KeyboardInterrupt, so the 'except Exception' fallbacks of the git helpers
+    do not swallow it.
+    """
+
+_job_context = threading.local()
+
+def current_sync_job():
+    """
+    Returns the VaultJob the calling worker thread runs for, or None.
+    """
+    return getattr(_job_context, "job", None)
+
+class uninterruptible:
+    """
+    Marks a block that must not be cut short, e.g. rewriting the work tree and
+    moving the branch, or waiting for the user to answer a dialog. Inside it,
+    cancel requests and step deadlines are held back; a pending cancel takes
+    effect at the next command after the block.
+    """
+    def __enter__(self):
+        self.job = current_sync_job()
+        if self.job is not None:
+            self.job.check()  # a cancel that is already pending stops before the block
+            self.job.shield(True)
+        return self
+
+    def __exit__(self, *exc):
+        if self.job is not None:
+            self.job.shield(False)
+        return False
+
+def stop_process(proc):
     """
-    Runs a shell command, returning (stdout, stderr, return_code).
-    Safe to call in a background thread.
+    Asks a child process (and anything it started, such as ssh) to exit with
+    SIGTERM, so git can remove its lock files. Works for subprocess.Popen and
+    asyncio processes alike.
     """
     try:
-        result = subprocess.run(
-            command,
-            cwd=cwd,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
-        return result.stdout.strip(), result.stderr.strip(), result.returncode
-    except subprocess.TimeoutExpired as e:
-        return "", str(e), 1
-    except Exception as e:
-        return "", str(e), 1
+        if os.name == "posix" and os.getpgid(proc.pid) == proc.pid:
+            import signal
+            os.killpg(proc.pid, signal.SIGTERM)
+        else:
+            proc.terminate()
+    except (OSError, ProcessLookupError):
+        pass
+
+def run_command(args, cwd=None, timeout=None, env=None, input=None, strip=True):
+    """
+    Runs a command given as an argument vector (e.g. ["git", "status"]) without a shell,
+    returning (stdout, stderr, return_code).
+    'env' holds variables to override on top of the current environment;
+    'input' is text written to the command's stdin; strip=False returns stdout
+    as written (for NUL-separated output whose fields may start or end with spaces).
+    Safe to call in a background thread. On a sync engine worker, the child is
+    registered with the vault's job so a cancel can stop it, and SyncCancelled
+    is raised instead of starting new commands once the job was cancelled.
+    """
+    job = current_sync_job()
+    if job is not None:
+        job.check()
+    env = {**os.environ, **env} if env else None
+    span = tracer.span(" ".join(args[:2]), "command", argv=args) if tracer.enabled else _NULL_SPAN
+    with span:
+        try:
+            proc = subprocess.Popen(
+                args,
+                cwd=cwd,
+                env=env,
+                stdin=subprocess.PIPE if input is not None else None,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                start_new_session=job is not None and os.name == "posix"
+            )
+        except Exception as e:
+            span.set(returncode=None, error=str(e))
+            return "", str(e), 1
+        if job is not None:
+            job.track(proc)
+        try:
+            stdout, stderr = proc.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            stop_process(proc)
+            try:
+                proc.communicate(timeout=PROCESS_STOP_GRACE)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+            span.set(returncode=None, error="timeout")
+            return "", str(e), 1
+        except Exception as e:
+            proc.kill()
+            proc.wait()
+            span.set(returncode=None, error=str(e))
+            return "", str(e), 1
+        finally:
+            if job is not None:
+                job.untrack(proc)
+        span.set(returncode=proc.returncode, stdout_bytes=len(stdout), stderr_bytes=len(stderr))
+        if job is not None:
+            job.check()  # a command stopped by cancel() reports the cancel, not its own failure
+        return stdout.strip() if strip else stdout, stderr.strip(), proc.returncode
+
+async def async_run_command(args, cwd=None, timeout=None, env=None, input=None, job=None):
+    """
+    asyncio counterpart of run_command() for the sync engine, built on
+    asyncio.create_subprocess_exec. Returns (stdout, stderr, return_code).
+    The child is registered with 'job' (so a cancel can stop it) and is stopped
+    if the coroutine is cancelled or 'timeout' seconds pass.
+    """
+    import asyncio
+    if job is not None:
+        job.check()
+    env = {**os.environ, **env} if env else None
+    span = tracer.span(" ".join(args[:2]), "command", argv=args) if tracer.enabled else _NULL_SPAN
+    with span:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                cwd=cwd,
+                env=env,
+                stdin=subprocess.PIPE if input is not None else None,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=os.name == "posix"
+            )
+        except Exception as e:
+            span.set(returncode=None, error=str(e))
+            return "", str(e), 1
+        if job is not None:
+            job.track(proc)
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                proc.communicate(input.encode("utf-8") if input is not None else None), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            stop_process(proc)
+            try:
+                await asyncio.wait_for(proc.wait(), PROCESS_STOP_GRACE)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            span.set(returncode=None, error="timeout")
+            return "", f"Command timed out after {timeout:.0f} s: {' '.join(args)}", 1
+        finally:
+            if job is not None:
+                job.untrack(proc)
+        stdout = stdout.decode("utf-8", errors="replace")
+        stderr = stderr.decode("utf-8", errors="replace")
+        span.set(returncode=proc.returncode, stdout_bytes=len(stdout), stderr_bytes=len(stderr))
+        return stdout.strip(), stderr.strip(), proc.returncode
     
 def ensure_github_known_host():
     """
@@ -98,7 +612,7 @@ def ensure_github_known_host():
 
     safe_update_log("Adding GitHub to known hosts (ssh-keyscan)...", 32)
     # Fetch GitHub's RSA key and append to known_hosts
-    scan_out, scan_err, rc = run_command("ssh-keyscan -t rsa github.com")
+    scan_out, scan_err, rc = run_command(["ssh-keyscan", "-t", "rsa", "github.com"])
     if rc == 0 and scan_out:
         # Ensure .ssh folder exists
         os.makedirs(os.path.expanduser("~/.ssh"), exist_ok=True)
@@ -109,9 +623,9 @@ def ensure_github_known_host():
         safe_update_log("Warning: Could not fetch GitHub host key automatically.", 32)
 
 
-def is_obsidian_running():
+def find_obsidian_processes():
     """
-    Checks if Obsidian is currently running.
+    Returns the running Obsidian processes, found by name.
     
     Windows: looks for "obsidian.exe".
     Linux: looks for "obsidian".
@@ -124,696 +638,4251 @@ def is_obsidian_running():
         process_name = "obsidian"
     elif sys.platform.startswith("darwin"):
         process_name = "Obsidian"
+    import psutil
+    found = []
     for proc in psutil.process_iter(attrs=["name"]):
         name = proc.info.get("name", "")
         if name and name.lower() == process_name.lower():
+            found.append(proc)
+    return found
+
+def is_obsidian_running():
+    """
+    Checks if Obsidian is currently running.
+    This scans the whole process table; prefer wait_for_obsidian_exit() for waiting.
+    """
+    return bool(find_obsidian_processes())
+
+def _live_process_tree(procs, launched=None):
+    """
+    Returns the processes in procs that are still alive, plus all of their live descendants.
+    'launched' is the Popen handle from open_obsidian(); it is reaped here once it exits.
+    """
+    import psutil
+    tree = {}
+    for proc in procs:
+        try:
+            if launched is not None and proc.pid == launched.pid and launched.poll() is not None:
+                continue
+            if proc.status() == psutil.STATUS_ZOMBIE:
+                continue
+            tree[proc.pid] = proc
+            for child in proc.children(recursive=True):
+                if child.status() != psutil.STATUS_ZOMBIE:
+                    tree[child.pid] = child
+        except psutil.Error:
+            continue
+    return list(tree.values())
+
+def _wait_for_process_exit(procs, timeout):
+    """
+    Blocks (without polling) until at least one process in procs exits or timeout passes.
+    Linux uses pidfds; other platforms use psutil.wait_procs, which waits for all of them.
+    Returns False if the processes cannot be waited on.
+    """
+    import psutil
+    if hasattr(os, "pidfd_open"):
+        fds = []
+        try:
+            for proc in procs:
+                fds.append(os.pidfd_open(proc.pid))
+            select.select(fds, [], [], timeout)
             return True
-    return False
+        except ProcessLookupError:
+            return True  # Already gone; the caller refreshes the tree.
+        except OSError:
+            pass  # Kernel without pidfd support; fall through to psutil.
+        finally:
+            for fd in fds:
+                os.close(fd)
+    try:
+        psutil.wait_procs(procs, timeout=timeout)
+        return True
+    except psutil.Error:
+        return False
+
+def wait_for_obsidian_exit(launched=None):
+    """
+    Blocks until the Obsidian session started by open_obsidian() has ended.
+
+    Follows the launched process and its descendants, so Flatpak/Snap wrappers
+    that hand off to a child are covered, and blocks on their exit instead of
+    scanning the process table. The tree is re-read whenever a process exits and
+    on a slowly growing interval (to pick up children spawned after launch).
+    Once the tree is gone, a single scan by name catches an instance the launcher
+    handed off to (e.g. Obsidian was already open). Only if nothing can be
+    tracked does it poll is_obsidian_running(), with exponential backoff.
+    """
+    import psutil
+    tracked = []
+    if launched is not None:
+        try:
+            tracked = [psutil.Process(launched.pid)]
+        except psutil.Error:
+            tracked = []
+
+    refresh_interval = 0.1
+    while True:
+        tracked = _live_process_tree(tracked, launched)
+        if not tracked:
+            tracked = find_obsidian_processes()
+            if not tracked:
+                return
+        if not _wait_for_process_exit(tracked, refresh_interval):
+            break
+        refresh_interval = min(refresh_interval * 2, 10.0)
+
+    delay = 0.05
+    while is_obsidian_running():
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+LOG_FLUSH_INTERVAL_MS = 50  # the log window is updated at most ~20 times per second
+MAX_LOG_LINES = 5000        # older lines are dropped from the log window beyond this
+
+_log_queue = queue.SimpleQueue()
+# A context variable rather than a thread-local: the sync engine runs several
+# vaults' coroutines on one thread, and each asyncio task has its own copy.
+_log_vault = contextvars.ContextVar("log_vault", default=None)
+_console_lock = threading.Lock()
+vault_progress_bars = {}  # vault label -> Progressbar (multi-vault window only)
+
+class VaultLogContext:
+    """
+    Labels the log messages of the current thread (or asyncio task) with a vault
+    name while several vaults are synced at once, e.g. "[Work] Pushing...".
+    """
+    def __init__(self, label):
+        self.label = label
+        self._token = None
+
+    def __enter__(self):
+        self._token = _log_vault.set(self.label)
+        return self
+
+    def __exit__(self, *exc):
+        _log_vault.reset(self._token)
+        return False
+
+def current_log_vault():
+    return _log_vault.get()
+
+def run_with_log_label(label, func, *args):
+    """
+    Thread target that runs func with the given vault label (see VaultLogContext).
+    """
+    with VaultLogContext(label):
+        return func(*args)
 
 def safe_update_log(message, progress=None):
-    if log_text and progress_bar and root.winfo_exists():
-        def _update():
+    """
+    Queues a log line (and optional progress value) for the log window, or prints
+    it if there is no window. Cheap and safe to call from any thread; the Tk thread
+    applies queued messages in batches (see _flush_log_queue).
+    """
+    vault = current_log_vault()
+    if log_text and progress_bar:
+        _log_queue.put((message, progress, vault))
+    else:
+        if console_log_json:
+            import json
+            line = json.dumps({"time": round(time.time(), 3), "vault": vault, "message": message, "progress": progress},
+                              ensure_ascii=False)
+        else:
+            line = f"[{vault}] {message}" if vault else message
+        with _console_lock:  # vault workers log concurrently; keep lines whole
+            print(line, flush=True)
+
+def _flush_log_queue():
+    """
+    Runs on the Tk thread every LOG_FLUSH_INTERVAL_MS: inserts all queued lines
+    with a single insert, applies only the latest progress value (per vault, when
+    there is a bar per vault) and trims the widget to MAX_LOG_LINES.
+    """
+    global log_text
+    lines = []
+    progress = None
+    vault_progress = {}
+    while True:
+        try:
+            message, value, vault = _log_queue.get_nowait()
+        except queue.Empty:
+            break
+        lines.append(f"[{vault}] {message}" if vault else message)
+        if value is not None and vault in vault_progress_bars:
+            vault_progress[vault] = value
+        elif value is not None:
+            progress = value
+    try:
+        for vault, value in vault_progress.items():
+            vault_progress_bars[vault]["value"] = value
+        if vault_progress:
+            progress = sum(bar["value"] for bar in vault_progress_bars.values()) / len(vault_progress_bars)
+        if lines:
             log_text.config(state='normal')
-            log_text.insert(tk.END, message + "\n")
+            log_text.insert(tk.END, "\n".join(lines[-MAX_LOG_LINES:]) + "\n")
+            excess = int(log_text.index("end-1c").split(".")[0]) - 1 - MAX_LOG_LINES
+            if excess > 0:
+                log_text.delete("1.0", f"{excess + 1}.0")
             log_text.config(state='disabled')
             log_text.yview_moveto(1)
-            if progress is not None:
-                progress_bar["value"] = progress
-        try:
-            root.after(0, _update)
-        except Exception as e:
-            print("Error scheduling UI update:", e)
-    else:
-        print(message)
+        if progress is not None:
+            progress_bar["value"] = progress
+        root.after(LOG_FLUSH_INTERVAL_MS, _flush_log_queue)
+    except tk.TclError:
+        # The window was closed; print any further messages instead of queueing them.
+        log_text = None
 
-def is_network_available():
+def start_log_pump():
     """
-    Checks if the network is available by trying to connect to github.com over HTTPS.
-    Returns True if successful, otherwise False.
+    Starts applying queued log messages to the current window's log widget.
     """
-    import socket
-    try:
-        socket.create_connection(("github.com", 443), timeout=5)
-        return True
-    except Exception:
-        return False
+    root.after(LOG_FLUSH_INTERVAL_MS, _flush_log_queue)
 
 def get_unpushed_commits(vault_path):
     """
-    Fetches the latest from origin and returns a string listing commits in HEAD that are not in origin/main.
+    Returns a string listing commits in HEAD that are not in origin/main.
+    Uses the remote-tracking ref from the last fetch (see plan_sync); it does not fetch.
     """
-    # Update remote tracking info first.
-    run_command("git fetch origin", cwd=vault_path)
-    unpushed, _, _ = run_command("git log origin/main..HEAD --oneline", cwd=vault_path)
-    return unpushed.strip()
+    return get_git_session(vault_path).unpushed_commits("origin/main", "HEAD")
 
 def open_obsidian(obsidian_path):
     """
-    Launches Obsidian in a cross-platform manner.
-    On Linux, if obsidian_path is a command string (e.g., from Flatpak), it is split properly;
-    otherwise, it launches using shell=True.
+    Launches Obsidian in a cross-platform manner and returns the Popen handle,
+    whose PID wait_for_obsidian_exit() follows.
+    On Linux, if obsidian_path is a command string (e.g., from Flatpak), it is split properly.
+    On macOS, an .app bundle is started through 'open -W' so the handle lives as long as the app.
     """ 
     if sys.platform.startswith("linux"):
+        import shlex
         cmd = shlex.split(obsidian_path)
-        subprocess.Popen(cmd)
+    elif sys.platform.startswith("darwin") and obsidian_path.rstrip("/").endswith(".app"):
+        cmd = ["open", "-W", "-a", obsidian_path]
     else:
-        subprocess.Popen([obsidian_path], shell=True)
+        cmd = [obsidian_path]
+    return subprocess.Popen(cmd)
+
+# ------------------------------------------------
+# PROMPTS (SYNC WORKERS -> WINDOW)
+# ------------------------------------------------
+# Sync workers never touch Tk. They post a typed Prompt through ask_user() and
+# wait on a future; prompt_backend answers it: TkPrompts shows a dialog from the
+# Tk thread, HeadlessPrompts answers with the prompt's default, and
+# ScriptedPrompts answers from a script (checks and benchmarks).
+
+PROMPT_POLL_INTERVAL_MS = 50
+
+class Prompt:
+    """
+    A question a sync worker asks the user. answers lists the valid replies;
+    default is used when nobody answers (no window, timeout, sync cancelled).
+    """
+    kind = "prompt"
+    answers = (None,)
+    default = None
+
+    def __init__(self, title, message, vault=None):
+        self.title = title
+        self.message = message
+        self.vault = vault if vault is not None else current_log_vault()
+
+    def validate(self, answer):
+        if answer not in self.answers:
+            raise ValueError(f"a {self.kind} prompt cannot be answered with {answer!r}")
+        return answer
+
+class NoticePrompt(Prompt):
+    """
+    Something the user must acknowledge before the sync goes on: answered
+    "ok", or None if it was not acknowledged.
+    """
+    kind = "notice"
+    answers = ("ok", None)
+
+class ConflictPrompt(Prompt):
+    """
+    Asks how to resolve conflicting files: "ours", "theirs", "manual", None to
+    leave the remote changes unapplied, or {path: "ours"|"theirs"} with a choice
+    for every file. sides(path), if given, returns the (local, remote) contents
+    of a file as bytes, None where that side deleted it, for a preview.
+    """
+    kind = "conflict"
+    answers = ("ours", "theirs", "manual", None)
+
+    def __init__(self, files, sides=None, vault=None):
+        self.files = list(files)
+        self.sides = sides
+        super().__init__("Merge Conflict Detected",
+                         f"Merge conflict detected in {len(self.files)} file(s).", vault)
+
+    def validate(self, answer):
+        if isinstance(answer, dict):
+            if set(answer) != set(self.files) or not set(answer.values()) <= {"ours", "theirs"}:
+                raise ValueError("per-file answers must choose 'ours' or 'theirs' for every conflicting file")
+            return answer
+        return super().validate(answer)
+
+class HeadlessPrompts:
+    """
+    Answers every prompt with its default; used without a window.
+    """
+
+    def submit(self, prompt, future):
+        future.set_result(prompt.default)
+
+class ScriptedPrompts:
+    """
+    Answers prompts from a script: answers maps a prompt kind to an answer or to
+    a function of the prompt; other kinds get their default. Every prompt is
+    recorded in asked, so a check can assert what the user would have seen.
+    """
+
+    def __init__(self, answers=None):
+        self.answers = dict(answers or {})
+        self.asked = []
+
+    def submit(self, prompt, future):
+        self.asked.append(prompt)
+        answer = self.answers.get(prompt.kind, prompt.default)
+        future.set_result(answer(prompt) if callable(answer) else answer)
+
+class TkPrompts:
+    """
+    Shows prompts as dialogs of the window. submit() may be called from any
+    thread; pump() runs on the Tk thread every PROMPT_POLL_INTERVAL_MS, opens
+    one dialog at a time and closes it when its prompt is withdrawn.
+    """
 
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._open = None  # (future, Toplevel) of the dialog on screen
 
-def conflict_resolution_dialog(conflict_files):
+    def submit(self, prompt, future):
+        self._queue.put((prompt, future))
+
+    def pump(self):
+        try:
+            if self._open is not None and self._open[0].done():
+                self._open[1].destroy()
+                self._open = None
+            while self._open is None:
+                try:
+                    prompt, future = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if not future.done():
+                    self._open = (future, PROMPT_DIALOGS[prompt.kind](prompt, self._answer(future)))
+            root.after(PROMPT_POLL_INTERVAL_MS, self.pump)
+        except tk.TclError:
+            pass  # the window was closed; waiting workers time out or are cancelled
+
+    @staticmethod
+    def _answer(future):
+        from concurrent.futures import InvalidStateError
+        def answer(value):
+            try:
+                future.set_result(value)
+            except InvalidStateError:
+                pass  # already answered, or withdrawn by the worker
+        return answer
+
+prompt_backend = HeadlessPrompts()
+
+def start_prompt_pump():
+    """
+    Routes prompts from sync workers to dialogs of the current window.
+    """
+    global prompt_backend
+    prompt_backend = TkPrompts()
+    root.after(PROMPT_POLL_INTERVAL_MS, prompt_backend.pump)
+
+def ask_user(prompt, timeout=None):
     """
-    Opens a modal dialog that lists conflicting files and offers three options:
-    "Keep Local Changes" (ours), "Keep Remote Changes" (theirs), or "Merge Manually".
-    Returns the user's choice as one of the strings: "ours", "theirs", or "manual".
+    Posts prompt to prompt_backend and waits for the answer. Returns the
+    prompt's default if nobody answered within timeout (PROMPT_TIMEOUT by
+    default; 0 waits forever) or if the calling vault's sync was cancelled.
+    Safe to call from any thread except the Tk thread when TkPrompts is active.
+    """
+    from concurrent.futures import Future, TimeoutError
+    if timeout is None:
+        timeout = get_config("PROMPT_TIMEOUT")
+    deadline = time.monotonic() + timeout if timeout else None
+    job = current_sync_job()
+    future = Future()
+    prompt_backend.submit(prompt, future)
+    while True:
+        try:
+            return prompt.validate(future.result(timeout=0.2))
+        except TimeoutError:
+            if job is not None and job.cancel_reason is not None:
+                reason = "the sync was cancelled"
+            elif deadline is not None and time.monotonic() >= deadline:
+                reason = f"no answer within {timeout:g} s"
+            else:
+                continue
+        if future.cancel():  # withdraws the dialog; an answer given meanwhile still counts
+            safe_update_log(f"'{prompt.title}' was not answered ({reason}).", None)
+            return prompt.default
+        return prompt.validate(future.result())
+
+def _prompt_window(prompt, answer, geometry):
+    """
+    A dialog window for prompt; closing it answers with the prompt's default.
     """
     top = tk.Toplevel(root)
-    top.title("Merge Conflict Detected")
-    top.geometry("400x220")
+    top.title(f"{prompt.title} ({prompt.vault})" if prompt.vault else prompt.title)
+    top.geometry(geometry)
+    top.protocol("WM_DELETE_WINDOW", lambda: answer(prompt.default))
     top.grab_set()  # Make modal
+    return top
+
+CONFLICT_PREVIEW_BYTES = 256 * 1024  # larger files are previewed up to this size
+CONFLICT_PREVIEW_CACHE = 32          # files whose versions the dialog keeps loaded
+CONFLICT_PREVIEW_DIFF_CELLS = 250000 # above (changed lines left x right), lines are paired without diffing
+
+def conflict_resolution_dialog(prompt, answer):
+    """
+    Opens a modal dialog listing the conflicting files, where the user picks
+    "Keep Local" (ours) or "Keep Remote" (theirs) for all files or for the
+    selected ones, or "Merge Manually". Selecting one file shows its local and
+    remote versions side by side; they are loaded on demand through
+    prompt.sides and cached. The list is a Listbox, which only draws the rows
+    in view, so thousands of files open as quickly as a few.
+    Calls answer() with "ours", "theirs", "manual" or {path: "ours"|"theirs"}
+    and returns the window, without waiting for it.
+    """
+    import functools
+    top = _prompt_window(prompt, answer, "900x560")
+    files = prompt.files
+    choices = {}
+    labels = {None: "   ?    ", "ours": " Local  ", "theirs": " Remote "}
+
+    tk.Label(top, text=f"{len(files)} file(s) were changed both here and on GitHub. "
+                       "Pick which version to keep for all files, or select files to compare "
+                       "the versions and choose per file.",
+             justify="left", wraplength=860).pack(pady=(10, 5), padx=10, anchor="w")
+
+    panes = ttk.PanedWindow(top, orient="horizontal")
+    panes.pack(fill="both", expand=True, padx=10)
+    list_frame = tk.Frame(panes)
+    listbox = tk.Listbox(list_frame, selectmode="extended", font="TkFixedFont", activestyle="none", width=40)
+    list_scroll = tk.Scrollbar(list_frame, command=listbox.yview)
+    listbox.config(yscrollcommand=list_scroll.set)
+    list_scroll.pack(side="right", fill="y")
+    listbox.pack(side="left", fill="both", expand=True)
+    listbox.insert(tk.END, *(labels[None] + path for path in files))
+    panes.add(list_frame, weight=1)
+
+    diff_frame = tk.Frame(panes)
+    texts = []
+    for column, heading in enumerate(("Local (your version)", "Remote (GitHub version)")):
+        tk.Label(diff_frame, text=heading, anchor="w").grid(row=0, column=column, sticky="we")
+        text = tk.Text(diff_frame, wrap="none", width=40, font="TkFixedFont", state="disabled")
+        text.tag_configure("changed", background="#ffe9a8")
+        text.tag_configure("missing", background="#e8e8e8")
+        text.grid(row=1, column=column, sticky="nsew")
+        texts.append(text)
+
+    def scroll_both(*args):
+        for text in texts:
+            text.yview(*args)
+
+    diff_scroll = tk.Scrollbar(diff_frame, command=scroll_both)
+    diff_scroll.grid(row=1, column=2, sticky="ns")
+    for text in texts:
+        text.config(yscrollcommand=lambda first, last: (diff_scroll.set(first, last),
+                                                        [t.yview_moveto(first) for t in texts]))
+    diff_frame.columnconfigure(0, weight=1)
+    diff_frame.columnconfigure(1, weight=1)
+    diff_frame.rowconfigure(1, weight=1)
+    panes.add(diff_frame, weight=3)
+
+    @functools.lru_cache(maxsize=CONFLICT_PREVIEW_CACHE)
+    def side_by_side(path):
+        return conflict_preview_rows(*prompt.sides(path)) if prompt.sides else [("(no preview)", "", "")]
+
+    def show(path):
+        rows = side_by_side(path)
+        for column, text in enumerate(texts):
+            text.config(state="normal")
+            text.delete("1.0", tk.END)
+            for row in rows:
+                tag = row[2]
+                if tag == "missing" and row[column]:
+                    tag = "changed"  # the line only this side has
+                text.insert(tk.END, row[column] + "\n", tag)
+            text.config(state="disabled")
 
-    label_text = ("Merge conflict detected in the following file(s):\n" +
-                  conflict_files + "\n\n" +
-                  "How would you like to resolve these conflicts?\n"
-                  "• Keep Local Changes (your version)\n"
-                  "• Keep Remote Changes (GitHub version)\n"
-                  "• Merge Manually (open and resolve the conflict manually)")
-    label = tk.Label(top, text=label_text, justify="left", wraplength=380)
-    label.pack(pady=10, padx=10)
+    def on_select(event=None):
+        selected = listbox.curselection()
+        if len(selected) == 1:
+            show(files[selected[0]])
 
-    resolution = {"choice": None}
+    def choose(side, indexes):
+        for index in indexes:
+            choices[files[index]] = side
+            listbox.delete(index)
+            listbox.insert(index, labels[side] + files[index])
+            listbox.selection_set(index)
+        apply_button.config(state="normal" if len(choices) == len(files) else "disabled")
 
-    def set_choice(choice):
-        resolution["choice"] = choice
-        top.destroy()
+    def apply_choices():
+        sides = set(choices.values())
+        answer(sides.pop() if len(sides) == 1 else dict(choices))
+
+    listbox.bind("<<ListboxSelect>>", on_select)
+
+    row_frame = tk.Frame(top)
+    row_frame.pack(fill="x", padx=10, pady=(5, 0))
+    tk.Label(row_frame, text="Selected files:").pack(side="left")
+    tk.Button(row_frame, text="Keep Local", width=12,
+              command=lambda: choose("ours", listbox.curselection())).pack(side="left", padx=5)
+    tk.Button(row_frame, text="Keep Remote", width=12,
+              command=lambda: choose("theirs", listbox.curselection())).pack(side="left", padx=5)
+    apply_button = tk.Button(row_frame, text="Apply Choices", width=14, state="disabled", command=apply_choices)
+    apply_button.pack(side="right")
 
     btn_frame = tk.Frame(top)
     btn_frame.pack(pady=10)
-    btn_local = tk.Button(btn_frame, text="Keep Local", width=15, command=lambda: set_choice("ours"))
-    btn_remote = tk.Button(btn_frame, text="Keep Remote", width=15, command=lambda: set_choice("theirs"))
-    btn_manual = tk.Button(btn_frame, text="Merge Manually", width=15, command=lambda: set_choice("manual"))
+    btn_local = tk.Button(btn_frame, text="Keep All Local", width=15, command=lambda: answer("ours"))
+    btn_remote = tk.Button(btn_frame, text="Keep All Remote", width=15, command=lambda: answer("theirs"))
+    btn_manual = tk.Button(btn_frame, text="Merge Manually", width=15, command=lambda: answer("manual"))
     btn_local.grid(row=0, column=0, padx=5)
     btn_remote.grid(row=0, column=1, padx=5)
     btn_manual.grid(row=0, column=2, padx=5)
 
-    top.wait_window()
-    return resolution["choice"]
+    if files:
+        listbox.selection_set(0)
+        on_select()
+    return top
 
-# ------------------------------------------------
-# GITHUB SETUP FUNCTIONS
-# ------------------------------------------------
-def is_git_repo(folder_path):
+def conflict_preview_rows(local, remote):
     """
-    Checks if a folder is already a Git repository.
-    Returns True if the folder is a Git repo, otherwise False.
+    Lines of the local and remote version of a file aligned for a side-by-side
+    view: [(local_line, remote_line, tag)], where tag is "" for equal lines,
+    "changed" for differing ones and "missing" where one side has no line.
+    Either version may be None (deleted on that side).
     """
-    out, err, rc = run_command("git rev-parse --is-inside-work-tree", cwd=folder_path)
-    return rc == 0
+    import difflib
 
-def initialize_git_repo(vault_path):
+    def lines(data):
+        if data is None:
+            return ["(deleted)"]
+        if b"\0" in data[:8000]:
+            return [f"(binary file, {len(data)} bytes)"]
+        text = data[:CONFLICT_PREVIEW_BYTES].decode("utf-8", errors="replace").splitlines()
+        if len(data) > CONFLICT_PREVIEW_BYTES:
+            text.append(f"... ({len(data) - CONFLICT_PREVIEW_BYTES} more bytes)")
+        return text
+
+    def changed(a, b):
+        return [(a[k] if k < len(a) else "", b[k] if k < len(b) else "",
+                 "changed" if k < len(a) and k < len(b) else "missing") for k in range(max(len(a), len(b)))]
+
+    left, right = lines(local), lines(remote)
+    # Only the part between the common head and tail is diffed, and only if it
+    # is small enough for difflib (quadratic in the worst case) to stay instant.
+    head = 0
+    while head < min(len(left), len(right)) and left[head] == right[head]:
+        head += 1
+    tail = 0
+    while tail < min(len(left), len(right)) - head and left[-1 - tail] == right[-1 - tail]:
+        tail += 1
+    middle_left, middle_right = left[head:len(left) - tail], right[head:len(right) - tail]
+    rows = [(line, line, "") for line in left[:head]]
+    if len(middle_left) * len(middle_right) > CONFLICT_PREVIEW_DIFF_CELLS:
+        rows += changed(middle_left, middle_right)
+    else:
+        matcher = difflib.SequenceMatcher(None, middle_left, middle_right, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                rows += [(line, line, "") for line in middle_left[i1:i2]]
+            else:
+                rows += changed(middle_left[i1:i2], middle_right[j1:j2])
+    rows += [(line, line, "") for line in left[len(left) - tail:]]
+    return rows
+
+def notice_dialog(prompt, answer):
     """
-    Initializes a Git repository in the selected vault folder if it's not already a repo.
-    Also sets the branch to 'main'.
+    A message with an OK button; the equivalent of messagebox.showinfo that
+    does not block the Tk thread.
     """
-    if not is_git_repo(vault_path):
-        safe_update_log("Initializing Git repository in vault...", 15)
-        out, err, rc = run_command("git init", cwd=vault_path)
-        if rc == 0:
-            run_command("git branch -M main", cwd=vault_path)
-            safe_update_log("Git repository initialized successfully.", 20)
-        else:
-            safe_update_log("Error initializing Git repository: " + err, 20)
-    else:
-        safe_update_log("Vault is already a Git repository.", 20)
+    top = _prompt_window(prompt, answer, "400x150")
+    tk.Label(top, text=prompt.message, justify="left", wraplength=380).pack(pady=10, padx=10)
+    tk.Button(top, text="OK", width=15, command=lambda: answer("ok")).pack(pady=10)
+    return top
 
-def set_github_remote(vault_path):
+PROMPT_DIALOGS = {"conflict": conflict_resolution_dialog, "notice": notice_dialog}
+MANUAL_MERGE_NOTICE = "Please resolve the conflicts in the affected files manually and then click OK."
+
+def describe_conflict_choice(choice):
+    if isinstance(choice, dict):
+        kept_local = sum(1 for side in choice.values() if side == "ours")
+        return (f"Resolving conflicts by your choice per file: {kept_local} local, "
+                f"{len(choice) - kept_local} remote...")
+    return f"Resolving conflicts by keeping {'local' if choice == 'ours' else 'remote'} changes..."
+
+def choose_conflict_resolution(paths, vault_path=None, sides=None):
     """
-    Prompts the user to link an existing GitHub repository.
-    If the user chooses not to link (or closes the dialog without providing a URL),
-    an error is shown indicating that linking a repository is required.
-    Returns True if the repository is linked successfully; otherwise, returns False.
+    Decides how to resolve conflicting remote changes according to the vault's CONFLICT_POLICY:
+    "ours"/"theirs" resolve without asking, "abort" leaves the remote changes
+    unapplied, and "ask" asks the user through ask_user() (without a window,
+    it behaves like "abort"); sides feeds the dialog's preview (see ConflictPrompt).
+    Returns "ours", "theirs", "manual", {path: "ours"|"theirs"} or None.
     """
-    # Check if a remote named 'origin' already exists
-    existing_remote_url, err, rc = run_command("git remote get-url origin", cwd=vault_path)
-    if rc == 0:
-        safe_update_log(f"A remote named 'origin' already exists: {existing_remote_url}", 25)
-        override = messagebox.askyesno(
-            "Existing Remote",
-            f"A remote 'origin' already points to:\n{existing_remote_url}\n\n"
-            "Do you want to override it with a new URL?"
-        )
-        if not override:
-            safe_update_log("Keeping the existing 'origin' remote. Skipping new remote configuration.", 25)
-            return True
+    policy = get_config("CONFLICT_POLICY", vault_path)
+    if policy in ("ours", "theirs"):
+        safe_update_log(f"Conflict policy '{policy}' applied to the conflicting file(s).", None)
+        return policy
+    if policy == "ask":
+        with uninterruptible():
+            return ask_user(ConflictPrompt(paths, sides))
+    return None
+
+# ------------------------------------------------
+# GIT SESSION (PERSISTENT HELPER PROCESSES)
+# ------------------------------------------------
+
+class GitSession:
+    """
+    Keeps long-lived git helper processes open for a whole sync session so that
+    read queries (resolving refs, reading commits and trees) are answered over a
+    pipe instead of forking a new git process for every call.
+
+      - 'git cat-file --batch-check' resolves revisions to object ids.
+      - 'git cat-file --batch' returns raw object contents.
+
+    Commands that write to the repository still run one-shot through run().
+    Helpers are started lazily and restarted if they die (e.g. the folder was
+    not a repository yet when first queried).
+    """
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self._lock = threading.Lock()
+        # Serializes commands that change the repository (live commits vs. the sync thread).
+        self.operation_lock = threading.RLock()
+        self._check_proc = None
+        self._batch_proc = None
+        # Number of commands this session ran that talk to the remote (fetch, push, ...).
+        self.remote_round_trips = 0
+        self.last_fetch = None  # time.monotonic() of the sync's last successful fetch of origin/main
+        self._custom_ssh_command = None
+
+    def _helper(self, attr, mode):
+        proc = getattr(self, attr)
+        if proc is None or proc.poll() is not None:
+            proc = subprocess.Popen(
+                ["git", "cat-file", mode],
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+            setattr(self, attr, proc)
+        return proc
+
+    def _query(self, attr, mode, rev):
+        """
+        Sends one revision to a cat-file helper and returns (header_fields, body).
+        header_fields is None if the helper is not running (not a repository);
+        it is an empty list if the revision does not exist.
+        """
+        with self._lock:
+            try:
+                proc = self._helper(attr, mode)
+                proc.stdin.write(rev.encode("utf-8") + b"\n")
+                proc.stdin.flush()
+                header = proc.stdout.readline()
+                if not header:
+                    return None, None
+                fields = header.decode("utf-8").split()
+                if len(fields) != 3:
+                    # "<rev> missing" / "<rev> ambiguous"
+                    return [], None
+                body = None
+                if mode == "--batch":
+                    body = proc.stdout.read(int(fields[2]))
+                    proc.stdout.read(1)  # trailing newline
+                return fields, body
+            except (OSError, ValueError):
+                setattr(self, attr, None)
+                return None, None
+
+    def is_repo(self):
+        """
+        Returns True if the session folder is inside a Git work tree.
+        An unborn HEAD still counts: the helper answers 'missing' instead of exiting.
+        """
+        fields, _ = self._query("_check_proc", "--batch-check", "HEAD")
+        return fields is not None
+
+    def resolve(self, rev):
+        """
+        Returns the object id that rev points to, or None if it does not exist.
+        """
+        fields, _ = self._query("_check_proc", "--batch-check", rev)
+        return fields[0] if fields else None
+
+    def read_object(self, rev):
+        """
+        Returns (object_type, raw_bytes) for rev, or (None, None) if it does not exist.
+        """
+        fields, body = self._query("_batch_proc", "--batch", rev)
+        if not fields:
+            return None, None
+        return fields[1], body
+
+    def read_commit(self, rev):
+        """
+        Parses a commit object and returns (tree_id, parent_ids, subject), or None.
+        """
+        obj_type, body = self.read_object(rev)
+        if obj_type != "commit":
+            return None
+        headers, _, message = body.decode("utf-8", errors="replace").partition("\n\n")
+        tree, parents = None, []
+        for line in headers.splitlines():
+            if line.startswith("tree "):
+                tree = line[5:]
+            elif line.startswith("parent "):
+                parents.append(line[7:])
+        subject = message.split("\n", 1)[0]
+        return tree, parents, subject
+
+    def read_tree(self, tree_id):
+        """
+        Parses a tree object into {name: (mode, object_id)}.
+        """
+        obj_type, body = self.read_object(tree_id)
+        entries = {}
+        if obj_type != "tree":
+            return entries
+        oid_len = len(tree_id) // 2  # 20 bytes for SHA-1, 32 for SHA-256
+        pos = 0
+        while pos < len(body):
+            space = body.index(b" ", pos)
+            nul = body.index(b"\0", space)
+            mode = body[pos:space].decode("ascii")
+            name = body[space + 1:nul].decode("utf-8", errors="surrogateescape")
+            entries[name] = (mode, body[nul + 1:nul + 1 + oid_len].hex())
+            pos = nul + 1 + oid_len
+        return entries
+
+    def _diff_trees(self, old_tree, new_tree, prefix, changes):
+        old_entries = self.read_tree(old_tree) if old_tree else {}
+        new_entries = self.read_tree(new_tree) if new_tree else {}
+        for name in sorted(set(old_entries) | set(new_entries)):
+            old = old_entries.get(name)
+            new = new_entries.get(name)
+            if old == new:
+                continue
+            path = prefix + name
+            old_is_tree = old is not None and old[0] == "40000"
+            new_is_tree = new is not None and new[0] == "40000"
+            if old_is_tree or new_is_tree:
+                # Only descend into subtrees whose ids differ.
+                self._diff_trees(old[1] if old_is_tree else None,
+                                 new[1] if new_is_tree else None,
+                                 path + "/", changes)
+                if old is not None and not old_is_tree:
+                    changes.append(("D", path))
+                if new is not None and not new_is_tree:
+                    changes.append(("A", path))
+            elif old is None:
+                changes.append(("A", path))
+            elif new is None:
+                changes.append(("D", path))
+            else:
+                changes.append(("M", path))
+
+    def diff_tree(self, rev="HEAD"):
+        """
+        Equivalent of 'git diff-tree --no-commit-id --name-status -r <rev>' answered
+        over the cat-file pipe. Returns a list of "<status>\\t<path>" lines.
+        Merge commits produce no output, as with diff-tree.
+        """
+        commit = self.read_commit(rev)
+        if commit is None:
+            return []
+        tree, parents, _ = commit
+        if len(parents) > 1:
+            return []
+        parent_tree = None
+        if parents:
+            parent_commit = self.read_commit(parents[0])
+            parent_tree = parent_commit[0] if parent_commit else None
+        return [f"{status}\t{path}" for status, path in self.diff_trees(parent_tree, tree)]
+
+    def diff_trees(self, old_tree, new_tree):
+        """
+        Compares two tree ids over the pipe and returns a sorted list of
+        (status, path) tuples, status being "A", "M" or "D".
+        """
+        changes = []
+        self._diff_trees(old_tree, new_tree, "", changes)
+        changes.sort(key=lambda change: change[1])
+        return changes
+
+    def unpushed_commits(self, upstream="origin/main", head="HEAD", limit=200):
+        """
+        Equivalent of 'git log <upstream>..<head> --oneline'.
+        The common cases (nothing to push, a short linear run of local commits) are
+        answered over the pipe; anything else falls back to running git log.
+        """
+        head_id = self.resolve(head)
+        upstream_id = self.resolve(upstream)
+        if head_id is None:
+            return ""
+        if head_id == upstream_id:
+            return ""
+        lines = []
+        current = head_id
+        while current != upstream_id and len(lines) < limit:
+            commit = self.read_commit(current)
+            if commit is None or len(commit[1]) != 1 or upstream_id is None:
+                # Merge, root commit or missing upstream: let git walk the graph.
+                break
+            lines.append(f"{current[:7]} {commit[2]}")
+            current = commit[1][0]
         else:
-            out, err, rc = run_command("git remote remove origin", cwd=vault_path)
-            if rc != 0:
-                safe_update_log(f"Error removing existing remote: {err}", 25)
+            if current == upstream_id:
+                return "\n".join(lines)
+        out, _, _ = self.run(["git", "log", f"{upstream}..{head}", "--oneline"])
+        return out.strip()
+
+    def stage_paths(self, paths):
+        """
+        Stages exactly the given vault-relative paths ('/'-separated), the
+        equivalent of 'git add -A -- <paths>' without git walking the vault. All
+        paths go to one 'git update-index --add --remove --replace -z --stdin':
+        files that are gone are removed from the index and new ones added, so a
+        rename is staged from its old and new path. Directories and untracked
+        ignored files are skipped; 'git check-ignore' only runs if some paths
+        are new files. Returns False (and logs git's error) if git failed; the
+        caller then stages with 'git add -A'.
+
+        update-index holds index.lock from start to exit and writes the index
+        only when it exits, so the process cannot outlive one commit.
+        """
+        import stat
+
+        def is_directory(path):
+            try:
+                return stat.S_ISDIR(os.lstat(os.path.join(self.repo_path, path)).st_mode)
+            except OSError:
                 return False
-            safe_update_log("Existing 'origin' remote removed.", 25)
 
-    # Prompt for linking a repository
-    # Instead of allowing a "No" option, we require linking.
-    use_existing_repo = messagebox.askyesno(
-        "GitHub Repository",
-        "A GitHub repository is required for synchronization.\n"
-        "Do you have an existing repository you would like to link?\n"
-        "(If not, please create a private repository on GitHub and then link to it.)"
-    )
-    if use_existing_repo:
-        repo_url = simpledialog.askstring(
-            "GitHub Repository",
-            "Enter your GitHub repository URL (e.g., git@github.com:username/repo.git):",
-            parent=root
-        )
-        if repo_url:
-            out, err, rc = run_command(f"git remote add origin {repo_url}", cwd=vault_path)
-            if rc == 0:
-                safe_update_log(f"Git remote 'origin' set to: {repo_url}", 25)
-                return True
-            else:
-                messagebox.showerror("Error", f"Error setting Git remote: {err}\nPlease try again.")
+        paths = [path for path in paths if not is_directory(path)]
+        if not paths:
+            return True
+        head = self.read_commit("HEAD")
+        in_head = tree_blobs(self, head[0], paths) if head else {}
+        new_files = [path for path in paths
+                     if path not in in_head and os.path.lexists(os.path.join(self.repo_path, path))]
+        if new_files:
+            out, err, rc = self.run(["git", "check-ignore", "-z", "--stdin"], input="\0".join(new_files) + "\0",
+                                    strip=False)
+            if rc not in (0, 1):  # 1: nothing is ignored
+                safe_update_log(f"⚠ Could not check which changed files are ignored, staging with 'git add -A': {err.strip()}", None)
                 return False
-        else:
-            messagebox.showerror("Error", "Repository URL not provided. You must link to a GitHub repository.")
+            ignored = set(out.split("\0")[:-1])  # every path ends with a NUL
+            paths = [path for path in paths if path not in ignored]
+        if not paths:
+            return True
+        _, err, rc = self.run(["git", "update-index", "--add", "--remove", "--replace", "-z", "--stdin"],
+                              input="\0".join(paths) + "\0")
+        if rc != 0:
+            safe_update_log(f"⚠ Could not stage the {len(paths)} changed file(s), staging with 'git add -A': {err.strip()}", None)
             return False
-    else:
-        messagebox.showerror("GitHub Repository Required", 
-                             "Linking a GitHub repository is required for synchronization.\n"
-                             "Please create a repository on GitHub (private is recommended) and then link to it.")
-        return False
+        return True
 
-def ensure_placeholder_file(vault_path):
+    def run(self, args, timeout=None, env=None, input=None, strip=True):
+        """
+        Runs a one-shot command (typically one that writes) in the repository.
+        """
+        return run_command(args, cwd=self.repo_path, timeout=timeout, env=env, input=input, strip=strip)
+
+    def remote(self, args, timeout=None):
+        """
+        Runs a command that talks to the remote and counts it as one round trip.
+        SSH connections reuse the session's master connection (see start_ssh_multiplexing)
+        unless the repository configures its own core.sshCommand.
+        """
+        self.remote_round_trips += 1
+        return self.run(args, timeout=timeout, env=self._remote_env())
+
+    def _remote_env(self):
+        if self._custom_ssh_command is None:
+            out, _, _ = self.run(["git", "config", "--get", "core.sshCommand"])
+            self._custom_ssh_command = bool(out)
+        return None if self._custom_ssh_command else ssh_multiplexing_env()
+
+    async def run_async(self, args, timeout=None, env=None, input=None, job=None):
+        """
+        run() for the sync engine (see async_run_command).
+        """
+        return await async_run_command(args, cwd=self.repo_path, timeout=timeout, env=env, input=input, job=job)
+
+    async def remote_async(self, args, timeout=None, job=None):
+        """
+        remote() for the sync engine (see async_run_command).
+        """
+        self.remote_round_trips += 1
+        return await self.run_async(args, timeout=timeout, env=self._remote_env(), job=job)
+
+    def close(self):
+        """
+        Closes the helper pipes; cat-file exits on end of input.
+        """
+        with self._lock:
+            for attr in ("_check_proc", "_batch_proc"):
+                proc = getattr(self, attr)
+                setattr(self, attr, None)
+                if proc is None:
+                    continue
+                try:
+                    proc.stdin.close()
+                    proc.wait(timeout=5)
+                except Exception:
+                    proc.kill()
+
+
+_git_sessions = {}
+_git_sessions_lock = threading.Lock()
+
+def get_git_session(repo_path):
     """
-    Creates a placeholder file (README.md) in the vault if it doesn't already exist.
-    This ensures that there's at least one file to commit.
+    Returns the shared GitSession for repo_path, creating it on first use.
     """
-    import os
-    placeholder_path = os.path.join(vault_path, "README.md")
-    if not os.path.exists(placeholder_path):
-        with open(placeholder_path, "w", encoding="utf-8") as f:
-            f.write("# Welcome to your Obsidian Vault\n\nThis placeholder file was generated automatically by Obsidian Sync to initialize the repository.")
-        safe_update_log("Placeholder file 'README.md' created, as the vault was empty.", 5)
-    else:
-        safe_update_log("Placeholder file 'README.md' already exists.", 5)
-
+    key = os.path.abspath(repo_path or ".")
+    with _git_sessions_lock:
+        session = _git_sessions.get(key)
+        if session is None:
+            session = GitSession(key)
+            _git_sessions[key] = session
+        return session
 
+def close_git_sessions():
+    """
+    Shuts down every open GitSession's helper processes.
+    """
+    with _git_sessions_lock:
+        sessions = list(_git_sessions.values())
+        _git_sessions.clear()
+    for session in sessions:
+        session.close()
 
+atexit.register(close_git_sessions)
 
 # ------------------------------------------------
-# WIZARD STEPS (Used Only if SETUP_DONE=0)
+# FILE STATE INDEX
 # ------------------------------------------------
 
-def find_obsidian_path():
+FILE_STATE_FILE = "file-state"     # in <git dir>/ogresync
+FILE_STATE_VERSION = 1
+FILE_STATE_RACY_NS = 2 * 10**9     # files modified this close to a scan are re-hashed next time
+_FILE_STATE_COLUMNS = (("sizes", "q"), ("mtimes", "q"), ("inodes", "Q"), ("modes", "q"))
+# Operations that leave a half-done state behind; the index is not trusted during them.
+_GIT_OPERATION_MARKERS = ("MERGE_HEAD", "CHERRY_PICK_HEAD", "REVERT_HEAD", "rebase-merge", "rebase-apply")
+
+def git_file_mode(st_mode):
     """
-    Attempts to locate Obsidian’s installation or launch command based on the OS.
-    
-    Windows:
-      - Checks common installation directories for "Obsidian.exe".
-    Linux:
-      - Checks if 'obsidian' is in PATH.
-      - Checks common Flatpak paths.
-      - Checks common Snap path.
-      - As a fallback, returns the Flatpak command string.
-    macOS:
-      - Checks the default /Applications folder.
-      - Checks PATH.
-    
-    If not found, it prompts the user to manually locate the executable.
-    
-    Returns the path or command string to launch Obsidian, or None.
+    Returns the mode git records for a file with this stat mode (as an int):
+    0o120000 for a symlink, 0o100755 for an executable file, 0o100644 otherwise.
     """
-    if sys.platform.startswith("win"):
-        possible_paths = [
-            os.path.expandvars(r"%LOCALAPPDATA%\Programs\Obsidian\Obsidian.exe"),
-            os.path.expandvars(r"%PROGRAMFILES%\Obsidian\Obsidian.exe"),
-            os.path.expandvars(r"%PROGRAMFILES(X86)%\Obsidian\Obsidian.exe")
-        ]
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
-        response = messagebox.askyesno("Obsidian Not Found",
-                                       "Obsidian was not detected in standard locations.\n"
-                                       "Would you like to locate the Obsidian executable manually?")
-        if response:
-            selected_path = filedialog.askopenfilename(
-                title="Select Obsidian Executable",
-                filetypes=[("Obsidian Executable", "*.exe")]
-            )
-            if selected_path:
-                return selected_path
-        return None
+    import stat
+    if stat.S_ISLNK(st_mode):
+        return 0o120000
+    if os.name != "nt" and st_mode & stat.S_IXUSR:
+        return 0o100755
+    return 0o100644
 
-    elif sys.platform.startswith("linux"):
-        # Option 1: Check if 'obsidian' is in PATH.
-        obsidian_cmd = shutil.which("obsidian")
-        if obsidian_cmd:
-            return obsidian_cmd
-        # Option 2: Check common Flatpak paths.
-        flatpak_paths = [
-            os.path.expanduser("~/.local/share/flatpak/exports/bin/obsidian"),
-            "/var/lib/flatpak/exports/bin/obsidian"
-        ]
-        for path in flatpak_paths:
-            if os.path.exists(path):
-                return path
-        # Option 3: Check Snap installation.
-        snap_path = "/snap/bin/obsidian"
-        if os.path.exists(snap_path):
-            return snap_path
-        # Option 4: Fallback to a command string.
-        # (You can modify this if you want to prompt the user instead.)
-        return "flatpak run md.obsidian.Obsidian"
+def scan_work_tree(vault_path):
+    """
+    Lists every file of the vault outside .git with its stat data, sorted by
+    path: [(path, size, mtime_ns, inode, mode)]. Paths are relative and use '/'.
+    Only stats files; nothing is read or hashed.
+    """
+    entries = []
+    pending = [""]
+    while pending:
+        rel = pending.pop()
+        try:
+            listing = os.scandir(os.path.join(vault_path, rel))
+        except OSError:
+            continue
+        with listing:
+            for entry in listing:
+                if entry.name == ".git":
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(rel + entry.name + "/")
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((rel + entry.name, st.st_size, st.st_mtime_ns, st.st_ino, git_file_mode(st.st_mode)))
+    entries.sort()
+    return entries
 
-    elif sys.platform.startswith("darwin"):
-        # macOS: Check default location in /Applications.
-        obsidian_app = "/Applications/Obsidian.app/Contents/MacOS/Obsidian"
-        if os.path.exists(obsidian_app):
-            return obsidian_app
-        # Option 2: Check if a command is available in PATH.
-        obsidian_cmd = shutil.which("obsidian")
-        if obsidian_cmd:
-            return obsidian_cmd
-        response = messagebox.askyesno("Obsidian Not Found",
-                                       "Obsidian was not detected in standard locations.\n"
-                                       "Would you like to locate the Obsidian application manually?")
-        if response:
-            selected_path = filedialog.askopenfilename(
-                title="Select Obsidian Application",
-                filetypes=[("Obsidian Application", "*.app")]
-            )
-            if selected_path:
-                return selected_path
+def hash_work_tree_file(full_path, mode, oid_length=40):
+    """
+    Returns the blob id git would give the file (SHA-1, or SHA-256 for 64-digit
+    ids), or None if it cannot be read. Symlinks hash their target, as in git.
+    """
+    import hashlib
+    digest = hashlib.new("sha1" if oid_length == 40 else "sha256")
+    try:
+        if mode == 0o120000:
+            target = os.fsencode(os.readlink(full_path))
+            digest.update(b"blob %d\0" % len(target))
+            digest.update(target)
+            return digest.hexdigest()
+        with open(full_path, "rb") as f:
+            digest.update(b"blob %d\0" % os.fstat(f.fileno()).st_size)
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    except OSError:
         return None
+    return digest.hexdigest()
+
+def tree_blobs(session, tree, paths=None):
+    """
+    Returns {path: (mode, object_id)} for the files of a tree: all of them, or
+    only those in paths (reading just the directories they are in). Modes are ints.
+    """
+    blobs = {}
+    if paths is None:
+        pending = [(tree, "")]
+        while pending:
+            tree_id, prefix = pending.pop()
+            for name, (mode, oid) in session.read_tree(tree_id).items():
+                if mode == "40000":
+                    pending.append((oid, prefix + name + "/"))
+                elif mode != "160000":
+                    blobs[prefix + name] = (int(mode, 8), oid)
+        return blobs
+    directories = {"": session.read_tree(tree)}
+    for path in paths:
+        parent, _, name = path.rpartition("/")
+        if parent not in directories:
+            parent_id = session.resolve(f"{tree}:{parent}")
+            directories[parent] = session.read_tree(parent_id) if parent_id else {}
+        entry = directories[parent].get(name)
+        if entry is not None and entry[0] not in ("40000", "160000"):
+            blobs[path] = (int(entry[0], 8), entry[1])
+    return blobs
 
+def _is_ignore_file(path):
+    return path.rpartition("/")[2] == ".gitignore"
 
-def select_vault_path():
+def _same_file_mode(work_tree_mode, tree_mode):
+    if os.name == "nt" and tree_mode == 0o100755:
+        return work_tree_mode == 0o100644  # no executable bit on Windows (core.fileMode = false)
+    return work_tree_mode == tree_mode
+
+
+class FileStateIndex:
     """
-    Asks user to select Obsidian Vault folder. Returns path or None if canceled.
+    Ogresync's record of the vault's files as of the end of the last sync: size,
+    mtime_ns, inode, git file mode and blob id per path, for the tree HEAD had
+    then. A file whose stat data still matches is known to have that content
+    without reading it, so changes are found by one stat pass over the vault
+    and hashing only the files that were touched.
+
+    Columns are arrays (100k files take about 8 MB and load in milliseconds).
+    Files that were in the vault but not committed (ignored) have no blob id.
+    The table is stored in <git dir>/ogresync/file-state and never committed.
     """
-    selected = filedialog.askdirectory(title="Select Obsidian Vault Folder")
-    return selected if selected else None
 
-def is_git_installed():
+    def __init__(self, tree, settings, paths, columns, oids, oid_bytes):
+        self.tree = tree
+        self.settings = settings
+        self.paths = paths
+        self.sizes, self.mtimes, self.inodes, self.modes = columns
+        self.oids = oids
+        self.oid_bytes = oid_bytes
+        self.rows = {path: row for row, path in enumerate(paths)}
+
+    @classmethod
+    def build(cls, tree, settings, entries, oids):
+        """
+        Creates an index from scan entries (see scan_work_tree) and their blob
+        ids (hex, or None for files that are not committed).
+        """
+        from array import array
+        oid_bytes = len(tree) // 2
+        columns = tuple(array(code, [entry[i] for entry in entries])
+                        for i, (_, code) in enumerate(_FILE_STATE_COLUMNS, start=1))
+        packed = b"".join(bytes.fromhex(oid) if oid else bytes(oid_bytes) for oid in oids)
+        return cls(tree, settings, [entry[0] for entry in entries], columns, packed, oid_bytes)
+
+    def stat(self, row):
+        return self.sizes[row], self.mtimes[row], self.inodes[row], self.modes[row]
+
+    def oid(self, row):
+        """
+        Returns the blob id recorded for a row, or None for an uncommitted file.
+        """
+        raw = self.oids[row * self.oid_bytes:(row + 1) * self.oid_bytes]
+        return raw.hex() if any(raw) else None
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by save(), or returns None if there is none or it
+        cannot be used (other version, other byte order, damaged).
+        """
+        import json
+        from array import array
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                if header.get("version") != FILE_STATE_VERSION or header.get("byteorder") != sys.byteorder:
+                    return None
+                count, oid_bytes = header["count"], header["oid_bytes"]
+                columns = []
+                for _, code in _FILE_STATE_COLUMNS:
+                    column = array(code)
+                    column.frombytes(f.read(count * column.itemsize))
+                    columns.append(column)
+                oids = f.read(count * oid_bytes)
+                names = f.read()
+        except (OSError, ValueError, KeyError, TypeError, EOFError):
+            return None
+        paths = names.decode("utf-8", errors="surrogateescape").split("\0") if count else []
+        if len(paths) != count or len(oids) != count * oid_bytes or any(len(c) != count for c in columns):
+            return None
+        return cls(header["tree"], header["settings"], paths, tuple(columns), oids, oid_bytes)
+
+    def save(self, path):
+        import json
+        header = {"version": FILE_STATE_VERSION, "byteorder": sys.byteorder, "tree": self.tree,
+                  "settings": self.settings, "count": len(self.paths), "oid_bytes": self.oid_bytes}
+
+        def write(f):
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for column in (self.sizes, self.mtimes, self.inodes, self.modes):
+                f.write(column.tobytes())
+            f.write(self.oids)
+            f.write("\0".join(self.paths).encode("utf-8", errors="surrogateescape"))
+
+        write_file_atomically(path, write, binary=True)
+
+
+class WorkTreeChanges:
     """
-    Returns True if Git is installed, else False.
+    What detect_work_tree_changes() found: the tree HEAD points to, the scan
+    the answer is based on and the sorted paths whose content differs from
+    that tree (new, modified or deleted files). paths is None if the file state
+    index could not tell, e.g. on the first sync; git has to scan then.
     """
-    out, err, rc = run_command("git --version")
-    return rc == 0
 
-def test_ssh_connection_sync():
+    def __init__(self, tree, scan, scanned_at, index_path, index=None, paths=None):
+        self.tree = tree
+        self.scan = scan
+        self.scanned_at = scanned_at
+        self.index_path = index_path
+        self.index = index
+        self.paths = paths
+
+    @property
+    def clean(self):
+        return self.paths is not None and not self.paths
+
+
+def file_state_path(session):
     """
-    Synchronously tests SSH to GitHub. Returns True if OK, False otherwise.
+    Returns where the vault's file state index lives (<git dir>/ogresync/file-state).
     """
-    out, err, rc = run_command("ssh -T git@github.com")
-    print("DEBUG: SSH OUT:", out)
-    print("DEBUG: SSH ERR:", err)
-    print("DEBUG: SSH RC:", rc)
-    if "successfully authenticated" in (out + err).lower():
-        return True
+    git_dir = os.path.join(session.repo_path, ".git")
+    if not os.path.isdir(git_dir):
+        out, _, rc = session.run(["git", "rev-parse", "--absolute-git-dir"])
+        if rc != 0:
+            return None
+        git_dir = out
+    return os.path.join(git_dir, "ogresync", FILE_STATE_FILE)
+
+def file_state_settings(index_path):
+    """
+    Size and mtime of the git settings that decide which files are ignored but
+    are not part of the vault (info/exclude, repository and global config, global
+    ignore file). If any of them changes, the index is rebuilt.
+    """
+    git_dir = os.path.dirname(os.path.dirname(index_path))
+    xdg_config = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    settings = []
+    for path in (os.path.join(git_dir, "info", "exclude"), os.path.join(git_dir, "config"),
+                 os.path.expanduser("~/.gitconfig"), os.path.join(xdg_config, "git", "config"),
+                 os.path.join(xdg_config, "git", "ignore")):
+        try:
+            st = os.stat(path)
+            settings.append([st.st_size, st.st_mtime_ns])
+        except OSError:
+            settings.append(None)
+    return settings
+
+def detect_work_tree_changes(session):
+    """
+    Finds the files whose content differs from HEAD's tree using the file state
+    index: one stat pass over the vault, then only files whose stat data changed,
+    that are new, or that commits since the last sync touched are hashed and
+    compared with HEAD; if a .gitignore changed, so are the files that were
+    ignored. Always returns a WorkTreeChanges; its paths are None if the index
+    is missing, disabled or out of date (see file_state_settings).
+    """
+    scanned_at = time.time_ns()
+    scan = scan_work_tree(session.repo_path)
+    head = session.read_commit("HEAD")
+    index_path = file_state_path(session)
+    changes = WorkTreeChanges(head[0] if head else None, scan, scanned_at, index_path)
+    if head is None or index_path is None or not get_config("FILE_STATE_INDEX"):
+        return changes
+    git_dir = os.path.dirname(os.path.dirname(index_path))
+    if any(os.path.exists(os.path.join(git_dir, marker)) for marker in _GIT_OPERATION_MARKERS):
+        return changes
+    index = FileStateIndex.load(index_path)
+    if (index is None or index.oid_bytes != len(changes.tree) // 2
+            or index.settings != file_state_settings(index_path)):
+        return changes
+    changes.index = index
+
+    # Paths changed by commits since the index was written (pulls, live sync).
+    moved = set()
+    if index.tree != changes.tree:
+        moved = {path for _, path in session.diff_trees(index.tree, changes.tree)}
+    suspects, uncommitted = {}, {}
+    for path, size, mtime, inode, mode in scan:
+        row = index.rows.get(path)
+        if row is None or path in moved:
+            suspects[path] = mode
+        elif index.oid(row) is None:
+            uncommitted[path] = mode
+            if index.stat(row) != (size, mtime, inode, mode) and _is_ignore_file(path):
+                suspects[path] = mode
+        elif index.stat(row) != (size, mtime, inode, mode):
+            suspects[path] = mode
+    scanned = {entry[0] for entry in scan}
+    changed = [path for row, path in enumerate(index.paths)
+               if path not in scanned and path not in moved and index.oid(row) is not None]  # deleted
+    missing = [path for path in moved if path not in scanned]
+    if any(_is_ignore_file(path) for path in (*suspects, *changed, *moved)):
+        # A .gitignore was edited, added, deleted or pulled: files that were
+        # ignored (no blob id) may not be any more, so they are compared too.
+        suspects.update(uncommitted)
+    head_blobs = tree_blobs(session, changes.tree, list(suspects) + missing)
+    changed += [path for path in missing if path in head_blobs]  # in HEAD, gone from the vault
+    oid_length = len(changes.tree)
+    for path, mode in suspects.items():
+        blob = head_blobs.get(path)
+        if blob is None or not _same_file_mode(mode, blob[0]):
+            changed.append(path)
+        elif hash_work_tree_file(os.path.join(session.repo_path, path), mode, oid_length) != blob[1]:
+            changed.append(path)
+    changes.paths = sorted(set(changed))
+    return changes
+
+def record_file_state(session, changes):
+    """
+    Writes the file state index after this sync's commit (or after finding
+    nothing to commit): the stat data from the scan in changes, taken before
+    staging, with the blob ids HEAD now has for those paths. Rows whose stat
+    data and blob are unchanged are copied; only the rest are looked up in
+    HEAD's tree. Files modified too close to the scan are marked to be hashed
+    next time, because a later edit could keep the same mtime.
+    """
+    if changes.index_path is None or not get_config("FILE_STATE_INDEX"):
+        return False
+    head = session.read_commit("HEAD")
+    if head is None:
+        return False
+    tree, index = head[0], changes.index
+    if index is not None and index.oid_bytes != len(tree) // 2:
+        index = None
+    moved = set()
+    if index is not None and index.tree != tree:
+        moved = {path for _, path in session.diff_trees(index.tree, tree)}
+    oids, lookup = [], []
+    for entry in changes.scan:
+        row = index.rows.get(entry[0]) if index is not None else None
+        if row is not None and entry[0] not in moved and index.stat(row) == entry[1:]:
+            oids.append(index.oid(row))
+        else:
+            oids.append(None)
+            lookup.append(len(oids) - 1)
+    blobs = tree_blobs(session, tree, None if index is None else [changes.scan[i][0] for i in lookup])
+    entries = list(changes.scan)
+    racy_after = changes.scanned_at - FILE_STATE_RACY_NS
+    for i in lookup:
+        path, size, mtime, inode, mode = entries[i]
+        blob = blobs.get(path)
+        if blob is not None:
+            oids[i] = blob[1]
+            if not _same_file_mode(mode, blob[0]):
+                mtime = -1
+        if mtime >= racy_after:
+            mtime = -1
+        entries[i] = (path, size, mtime, inode, mode)
+    try:
+        FileStateIndex.build(tree, file_state_settings(changes.index_path), entries, oids).save(changes.index_path)
+    except OSError as e:
+        safe_update_log(f"⚠ Could not save the file state index: {e}", None)
+        return False
+    return True
+
+# ------------------------------------------------
+# NETWORK REACHABILITY
+# ------------------------------------------------
+
+DEFAULT_REMOTE_ENDPOINT = ("github.com", 443)
+NETWORK_ONLINE_TTL = 30.0   # seconds a successful probe is reused
+NETWORK_OFFLINE_TTL = 10.0  # seconds a failed probe short-circuits further checks
+NETWORK_PROBE_TIMEOUT = 5.0
+
+_remote_endpoints = {}       # vault path -> (host, port), or None for a local/unprobeable remote
+_reachability_cache = {}     # (host, port) -> (checked_at, reachable)
+_reachability_lock = threading.Lock()
+
+def parse_remote_url(url):
+    """
+    Returns (scheme, host, port) for the server a Git remote URL connects to, or
+    None if the remote is a local path / file:// URL that needs no network.
+    Handles ssh://, git://, http(s):// and scp-like 'user@host:path' forms. SSH
+    remotes have scheme "ssh" and port None unless the URL gives one, because
+    the SSH configuration decides (see resolve_ssh_endpoint).
+    """
+    from urllib.parse import urlsplit
+    url = url.strip()
+    default_ports = {"ssh": None, "git+ssh": None, "ssh+git": None, "git": 9418, "http": 80, "https": 443}
+    if "://" in url:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in default_ports or not parts.hostname:
+            return None
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        return ("ssh" if "ssh" in scheme else scheme), parts.hostname, port or default_ports[scheme]
+    # scp-like syntax: [user@]host:path (a single letter before ':' is a Windows drive).
+    head, sep, _ = url.partition(":")
+    if sep and "/" not in head and "\\" not in head:
+        host = head.rpartition("@")[2]
+        if len(host) > 1:
+            return "ssh", host, None
+    return None
+
+def resolve_ssh_endpoint(host, port=None):
+    """
+    Asks OpenSSH where a connection to host really goes ('ssh -G'), so Host
+    aliases and HostName/Port settings in ~/.ssh/config are followed. Returns
+    (host, port), or None if the connection goes through a ProxyCommand or
+    ProxyJump and cannot be probed directly; git's own fetch decides then.
+    Without an ssh client, the host as written and port 22 are used.
+    """
+    out, _, rc = run_command(["ssh", "-G"] + (["-p", str(port)] if port else []) + [host])
+    if rc != 0:
+        return host, port or 22
+    options = {}
+    for line in out.splitlines():
+        key, _, value = line.partition(" ")
+        options.setdefault(key.lower(), value.strip())
+    if options.get("proxycommand", "none") != "none" or options.get("proxyjump", "none") != "none":
+        return None
+    try:
+        port = int(options.get("port", port or 22))
+    except ValueError:
+        port = port or 22
+    return options.get("hostname") or host, port
+
+def get_remote_endpoint(vault_path):
+    """
+    Returns the (host, port) that 'origin' points to (cached per vault),
+    None for a local remote or one that cannot be probed, or
+    DEFAULT_REMOTE_ENDPOINT if origin is not set.
+    """
+    key = os.path.abspath(vault_path)
+    with _reachability_lock:
+        if key in _remote_endpoints:
+            return _remote_endpoints[key]
+    url, _, rc = run_command(["git", "remote", "get-url", "origin"], cwd=vault_path)
+    if rc != 0 or not url:
+        endpoint = DEFAULT_REMOTE_ENDPOINT
+    else:
+        remote = parse_remote_url(url)
+        if remote is None:
+            endpoint = None
+        elif remote[0] == "ssh":
+            endpoint = resolve_ssh_endpoint(remote[1], remote[2])
+        else:
+            endpoint = remote[1:]
+    with _reachability_lock:
+        _remote_endpoints[key] = endpoint
+    return endpoint
+
+def probe_endpoint(host, port, timeout=NETWORK_PROBE_TIMEOUT):
+    """
+    Happy-eyeballs style TCP probe: connects to the first IPv6 and the first IPv4
+    address of host in parallel and returns True as soon as either succeeds.
+    """
+    import queue
+    import socket
+    deadline = time.monotonic() + timeout
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError:
+        return False
+    candidates = {}
+    for family, socktype, proto, _, addr in infos:
+        candidates.setdefault(family, (family, socktype, proto, addr))
+
+    results = queue.Queue()
+
+    def attempt(family, socktype, proto, addr):
+        try:
+            with socket.socket(family, socktype, proto) as sock:
+                sock.settimeout(max(deadline - time.monotonic(), 0.1))
+                sock.connect(addr)
+            results.put(True)
+        except OSError:
+            results.put(False)
+
+    for candidate in candidates.values():
+        threading.Thread(target=attempt, args=candidate, daemon=True).start()
+    for _ in candidates:
+        try:
+            if results.get(timeout=max(deadline - time.monotonic(), 0)):
+                return True
+        except queue.Empty:
+            break
     return False
 
-def re_test_ssh():
+def is_network_available(vault_path=None):
+    """
+    Checks whether the vault's 'origin' remote (github.com:443 if no vault is given)
+    can be reached. Results are cached: a success for NETWORK_ONLINE_TTL seconds and a
+    failure for NETWORK_OFFLINE_TTL seconds, so the checks in one sync session share a
+    probe and an offline machine does not wait on repeated timeouts.
+    Returns True if reachable (or the remote is local or behind an SSH proxy), otherwise False.
+    """
+    endpoint = get_remote_endpoint(vault_path) if vault_path else DEFAULT_REMOTE_ENDPOINT
+    if endpoint is None:
+        return True
+    now = time.monotonic()
+    with _reachability_lock:
+        cached = _reachability_cache.get(endpoint)
+    if cached is not None:
+        checked_at, reachable = cached
+        ttl = NETWORK_ONLINE_TTL if reachable else NETWORK_OFFLINE_TTL
+        if now - checked_at < ttl:
+            return reachable
+    with tracer.span("network probe", "network", host=endpoint[0], port=endpoint[1]) as span:
+        reachable = probe_endpoint(*endpoint)
+        span.set(reachable=reachable)
+    with _reachability_lock:
+        _reachability_cache[endpoint] = (time.monotonic(), reachable)
+    return reachable
+
+def is_known_offline(vault_path=None):
+    """
+    Returns True if a probe for the vault's remote failed within NETWORK_OFFLINE_TTL.
+    Never probes, so it is safe to call in tight loops.
+    """
+    endpoint = get_remote_endpoint(vault_path) if vault_path else DEFAULT_REMOTE_ENDPOINT
+    with _reachability_lock:
+        cached = _reachability_cache.get(endpoint)
+    if cached is None:
+        return False
+    checked_at, reachable = cached
+    return not reachable and time.monotonic() - checked_at < NETWORK_OFFLINE_TTL
+
+def invalidate_network_cache():
+    """
+    Forgets cached remote endpoints and probe results (e.g. after the remote URL changed).
+    """
+    with _reachability_lock:
+        _remote_endpoints.clear()
+        _reachability_cache.clear()
+
+# ------------------------------------------------
+# SSH CONNECTION SHARING
+# ------------------------------------------------
+
+SSH_CONTROL_PERSIST = "120"  # seconds an idle master connection is kept after the last client
+
+_ssh_control_dir = None
+_ssh_control_lock = threading.Lock()
+
+def ssh_multiplexing_supported():
+    """
+    Returns True if a session-scoped OpenSSH ControlMaster can be used.
+    OpenSSH for Windows has no ControlMaster support, and a GIT_SSH/GIT_SSH_COMMAND
+    provided by the user is left alone.
+    """
+    if sys.platform.startswith("win"):
+        return False
+    if os.environ.get("GIT_SSH_COMMAND") or os.environ.get("GIT_SSH"):
+        return False
+    import shutil
+    return shutil.which("ssh") is not None
+
+def start_ssh_multiplexing():
+    """
+    Creates the control socket directory for this session, so the first SSH
+    connection becomes a master that later fetch/pull/push/ls-remote calls reuse.
+    Returns True if multiplexing is active.
+    """
+    global _ssh_control_dir
+    import tempfile
+    with _ssh_control_lock:
+        if _ssh_control_dir is None and ssh_multiplexing_supported():
+            # Unix socket paths are limited to ~104 bytes; macOS's $TMPDIR is too long.
+            base = "/tmp" if os.path.isdir("/tmp") else None
+            _ssh_control_dir = tempfile.mkdtemp(prefix="ogresync-ssh-", dir=base)
+        return _ssh_control_dir is not None
+
+def ssh_multiplexing_options():
+    """
+    Returns the ssh -o options that attach to (or start) the session's master connection.
+    """
+    if _ssh_control_dir is None:
+        return []
+    return ["-o", "ControlMaster=auto",
+            "-o", f"ControlPath={os.path.join(_ssh_control_dir, '%C')}",
+            "-o", f"ControlPersist={SSH_CONTROL_PERSIST}"]
+
+def ssh_multiplexing_env():
+    """
+    Returns a GIT_SSH_COMMAND override that makes git reuse the master connection,
+    or an empty dict if multiplexing is not active.
+    """
+    import shlex
+    options = ssh_multiplexing_options()
+    if not options:
+        return {}
+    return {"GIT_SSH_COMMAND": " ".join(["ssh"] + [shlex.quote(option) for option in options])}
+
+def stop_ssh_multiplexing():
+    """
+    Closes every master connection opened during the session and removes the sockets.
+    """
+    global _ssh_control_dir
+    import shutil
+    with _ssh_control_lock:
+        control_dir, _ssh_control_dir = _ssh_control_dir, None
+    if control_dir is None:
+        return
+    for name in os.listdir(control_dir):
+        # The host argument is required by ssh but unused with an explicit socket path.
+        run_command(["ssh", "-o", f"ControlPath={os.path.join(control_dir, name)}",
+                     "-O", "exit", "ogresync-master"], timeout=10)
+    shutil.rmtree(control_dir, ignore_errors=True)
+
+# ------------------------------------------------
+# SYNC PLANNING
+# ------------------------------------------------
+
+class SyncPlan:
+    """
+    Where the local 'main' stands relative to origin/main after one fetch.
+
+      remote_reachable: the fetch talked to the remote successfully.
+      remote_exists:    origin has a 'main' branch.
+      ahead / behind:   commits only on HEAD / only on origin/main.
+    """
+
+    def __init__(self, remote_reachable, remote_exists, ahead=0, behind=0, error=""):
+        self.remote_reachable = remote_reachable
+        self.remote_exists = remote_exists
+        self.ahead = ahead
+        self.behind = behind
+        self.error = error
+
+    @property
+    def needs_pull(self):
+        return self.remote_exists and self.behind > 0
+
+    @property
+    def needs_push(self):
+        return self.remote_reachable and (self.ahead > 0 or not self.remote_exists)
+
+
+def is_network_error(err):
+    """
+    Returns True if git's error output points to a connectivity problem.
+    """
+    lowered = err.lower()
+    return ("could not resolve hostname" in lowered or "network" in lowered or
+            "could not read from remote repository" in lowered or
+            "connection timed out" in lowered or "connection refused" in lowered)
+
+def count_ahead_behind(session):
+    """
+    Computes (ahead, behind) of HEAD versus origin/main from local refs only.
+    """
+    head_id = session.resolve("HEAD")
+    upstream_id = session.resolve("origin/main")
+    if head_id is None or upstream_id is None:
+        return 0, 0
+    if head_id == upstream_id:
+        return 0, 0
+    out, _, rc = session.run(["git", "rev-list", "--left-right", "--count", "HEAD...origin/main"])
+    if rc != 0:
+        return 0, 0
+    ahead, behind = out.split()
+    return int(ahead), int(behind)
+
+def plan_sync(session, fetch=True):
+    """
+    Fetches origin/main once (if fetch is True) and returns a SyncPlan computed
+    from the fetched refs, so pull and push can be skipped when there is nothing
+    to do. With fetch=False the plan is recomputed locally from the last fetch.
+    """
+    fetch_result = session.remote(["git", "fetch", "origin", "main"]) if fetch else None
+    return plan_from_fetch(session, fetch_result)
+
+def plan_from_fetch(session, fetch_result):
+    """
+    Computes the SyncPlan from the (stdout, stderr, return_code) of 'git fetch
+    origin main', or from the last fetch if fetch_result is None.
+    """
+    remote_reachable = True
+    remote_exists = session.resolve("origin/main") is not None
+    error = ""
+    if fetch_result is not None:
+        out, err, rc = fetch_result
+        if rc == 0:
+            remote_exists = True
+        elif "couldn't find remote ref" in err.lower():
+            remote_exists = False
+        else:
+            remote_reachable = False
+            error = err
+    ahead, behind = count_ahead_behind(session) if remote_exists else (0, 0)
+    return SyncPlan(remote_reachable, remote_exists, ahead, behind, error)
+
+def rebase_onto_remote(session, progress):
+    """
+    Rebases local commits onto the already fetched origin/main (no network access).
+    On conflicts, asks the user how to resolve them. Used by integrate_remote_changes()
+    when Git is too old to merge in memory.
+
+    Without the in-memory merge, uncommitted edits could only be kept by stashing
+    them, so nothing is done while the vault has any; the remote changes are then
+    merged after this session's commit.
+    Returns True if HEAD now contains origin/main.
+    """
+    head_commit = session.read_commit("HEAD")
+    if head_commit is None or snapshot_work_tree(session) != head_commit[0]:
+        safe_update_log("Remote changes will be merged after this session's commit: this Git version "
+                        "cannot merge them while the vault has uncommitted edits.", progress)
+        return False
+    incoming = session.unpushed_commits(upstream="HEAD", head="origin/main")
+    with uninterruptible():  # a rebase must be finished or aborted, never left half-done
+        return _rebase_onto_remote(session, incoming, progress)
+
+def _rebase_onto_remote(session, incoming, progress):
+    out, err, rc = session.run(["git", "rebase", "origin/main"], env=NON_INTERACTIVE_GIT_ENV)
+    if rc == 0:
+        safe_update_log("Remote changes have been applied. Your vault is updated with the latest changes from GitHub.", progress)
+        for line in incoming.splitlines():
+            safe_update_log(f"✓ Pulled: {line}", progress)
+        return True
+    if "CONFLICT" not in (out + err):
+        safe_update_log(f"❌ Applying remote changes failed: {err}", progress)
+        session.run(["git", "rebase", "--abort"])
+        return False
+
+    safe_update_log("❌ A merge conflict was detected while applying remote changes.", progress)
+    # While rebasing, stage 2 ('--ours') is the remote side being rebased onto
+    # and stage 3 ('--theirs') is the local commit being replayed.
+    conflicts = unmerged_entries(session)
+    entries, unresolved = resolve_conflicts_by_rules(session, conflicts, conflict_rules(session.repo_path), "HEAD",
+                                                     local=3, remote=2, local_rev="ORIG_HEAD", remote_rev="HEAD",
+                                                     work_tree_times=False)
+    apply_resolutions_to_index(session, entries)
+    log_rule_resolutions(conflicts, unresolved, progress)
+    choice = "rules"
+    if unresolved:
+        choice = choose_conflict_resolution(sorted(unresolved), session.repo_path,
+                                            conflict_sides(session, conflicts, local=3, remote=2))
+    if choice in ("ours", "theirs") or isinstance(choice, dict):
+        safe_update_log(describe_conflict_choice(choice), progress)
+        apply_resolutions_to_index(session, choice_entries(conflicts, unresolved, choice, local=3, remote=2))
+    elif choice == "rules":
+        pass
+    elif choice == "manual":
+        safe_update_log("Please resolve the conflicts manually. After resolving, click OK to continue.", progress)
+        if ask_user(NoticePrompt("Manual Merge", MANUAL_MERGE_NOTICE), timeout=0) != "ok":
+            safe_update_log("The manual merge was not completed. Aborting rebase.", progress)
+            session.run(["git", "rebase", "--abort"])
+            return False
+    else:
+        safe_update_log("No valid conflict resolution chosen. Aborting rebase.", progress)
+        session.run(["git", "rebase", "--abort"])
+        return False
+    session.run(["git", "add", "-A"])
+    _, err_rebase, rc_rebase = session.run(["git", "rebase", "--continue"], env=NON_INTERACTIVE_GIT_ENV)
+    if rc_rebase != 0:
+        safe_update_log(f"Error continuing rebase: {err_rebase}", progress)
+        session.run(["git", "rebase", "--abort"])
+        return False
+    return True
+
+# ------------------------------------------------
+# IN-MEMORY MERGE
+# ------------------------------------------------
+
+class MergePrediction:
+    """
+    Result of merging two commits in memory with 'git merge-tree --write-tree'.
+
+      tree:      id of the merged tree (conflicted files contain conflict markers).
+      conflicts: {path: {stage: (mode, object_id)}}, where stage 1 is the merge base,
+                 2 is the local side and 3 is the remote side. A missing stage means
+                 that side deleted the file.
+    """
+
+    def __init__(self, tree, conflicts):
+        self.tree = tree
+        self.conflicts = conflicts
+
+    @property
+    def clean(self):
+        return not self.conflicts
+
+
+def predict_merge(session, ours="HEAD", theirs="origin/main"):
+    """
+    Merges ours and theirs without touching the index or the work tree and returns
+    a MergePrediction, or None if this Git is too old for 'merge-tree --write-tree'
+    (2.38+) or the merge could not be attempted.
+    """
+    out, _, rc = session.run(["git", "merge-tree", "--write-tree", "-z", "--no-messages", ours, theirs])
+    if rc not in (0, 1) or not out:
+        return None
+    fields = out.split("\0")
+    conflicts = {}
+    for field in fields[1:]:
+        if not field:
+            break  # end of the conflicted-file section
+        info, _, path = field.partition("\t")
+        mode, oid, stage = info.split()
+        conflicts.setdefault(path, {})[int(stage)] = (mode, oid)
+    return MergePrediction(fields[0], conflicts)
+
+def index_info(entries, object_id):
+    """
+    Formats {path: (mode, object_id) or None} as input for 'git update-index
+    --index-info'; None removes the path. object_id is any id of the repository,
+    used for the length of the all-zero id (SHA-1 or SHA-256).
+    """
+    zero_id = "0" * len(object_id or "0" * 40)
+    lines = []
+    for path, entry in entries.items():
+        if entry is None:
+            lines.append(f"0 {zero_id}\t{path}")
+        else:
+            mode, oid = entry
+            lines.append(f"{mode} {oid}\t{path}")
+    return "\n".join(lines) + "\n"
+
+def write_resolved_tree(session, tree, entries):
+    """
+    Replaces paths in a (merged) tree with the given {path: (mode, object_id) or
+    None} entries, using a temporary index, and returns the new tree id.
+    """
+    import tempfile
+    with tempfile.TemporaryDirectory(prefix="ogresync-index-") as tmp:
+        env = {"GIT_INDEX_FILE": os.path.join(tmp, "index")}
+        _, err, rc = session.run(["git", "read-tree", tree], env=env)
+        if rc == 0:
+            _, err, rc = session.run(["git", "update-index", "--index-info"], env=env,
+                                     input=index_info(entries, tree))
+        if rc == 0:
+            tree, err, rc = session.run(["git", "write-tree"], env=env)
+        if rc != 0:
+            safe_update_log(f"❌ Could not build the resolved tree: {err}", None)
+            return None
+    return tree
+
+def create_merge_commit(session, tree, progress):
+    """
+    Records tree as a merge of HEAD and origin/main and returns the new commit id,
+    without touching the branch, the index or the work tree.
+    """
+    commit, err, rc = session.run(["git", "commit-tree", tree, "-p", "HEAD", "-p", "origin/main",
+                                   "-m", "Merge remote changes (auto-sync)"])
+    if rc != 0:
+        safe_update_log(f"❌ Recording the merge failed: {err}", progress)
+        return None
+    return commit
+
+def snapshot_work_tree(session):
+    """
+    Returns the id of the tree that 'git add -A' would commit right now, without
+    changing the real index or the work tree. If the file state index shows no
+    changes, that is HEAD's tree. Otherwise a copy of the index is used so that
+    unchanged files are recognised from their cached stat data instead of re-hashed.
+    """
+    import shutil
+    import tempfile
+    changes = detect_work_tree_changes(session)
+    if changes.clean:
+        return changes.tree
+    index_path, err, rc = session.run(["git", "rev-parse", "--git-path", "index"])
+    if rc != 0:
+        return None
+    index_path = os.path.join(session.repo_path, index_path)
+    with tempfile.TemporaryDirectory(prefix="ogresync-index-") as tmp:
+        env = {"GIT_INDEX_FILE": os.path.join(tmp, "index")}
+        if os.path.exists(index_path):
+            shutil.copyfile(index_path, env["GIT_INDEX_FILE"])
+        _, err, rc = session.run(["git", "add", "-A"], env=env)
+        if rc == 0:
+            tree, err, rc = session.run(["git", "write-tree"], env=env)
+    return tree if rc == 0 else None
+
+def update_work_tree(session, target, progress):
+    """
+    Moves HEAD and the index to target while keeping uncommitted edits, without
+    stashing. The uncommitted work tree is merged with target in memory (base: HEAD)
+    and only the paths that result changes are written to the vault. If the remote
+    changes touch files with uncommitted edits, nothing is changed and False is
+    returned; the edits are committed after the session and merged then.
+    """
+    work_tree = snapshot_work_tree(session)
+    head_commit = session.read_commit("HEAD")
+    if work_tree is None or head_commit is None:
+        safe_update_log("❌ Could not read the current state of the vault.", progress)
+        return False
+    if work_tree == head_commit[0]:
+        # No uncommitted edits: a plain fast-forward checkout.
+        with uninterruptible():
+            _, err, rc = session.run(["git", "merge", "--ff-only", target])
+        if rc != 0:
+            safe_update_log(f"❌ Updating the vault failed: {err}", progress)
+        return rc == 0
+
+    snapshot, err, rc = session.run(["git", "commit-tree", work_tree, "-p", "HEAD",
+                                     "-m", "Ogresync work tree snapshot"])
+    prediction = predict_merge(session, snapshot, target) if rc == 0 else None
+    if prediction is None:
+        safe_update_log(f"❌ Could not merge remote changes with your uncommitted edits: {err}", progress)
+        return False
+    if not prediction.clean:
+        safe_update_log("Remote changes touch files you have edited but not committed yet. "
+                        "They will be merged after this session's commit:", progress)
+        for path in sorted(prediction.conflicts):
+            safe_update_log(f"  ⚠ {path}", None)
+        return False
+
+    changes = session.diff_trees(work_tree, prediction.tree)
+    deleted = [path for status, path in changes if status == "D"]
+    written = [path for status, path in changes if status != "D"]
+    # From the first file written until the branch moves, a cancel would leave
+    # the vault half-updated.
+    with uninterruptible():
+        return _apply_work_tree_changes(session, prediction.tree, target, deleted, written, progress)
+
+def _apply_work_tree_changes(session, tree, target, deleted, written, progress):
+    for path in deleted:
+        full_path = os.path.join(session.repo_path, path)
+        try:
+            os.remove(full_path)
+            parent = os.path.dirname(full_path)
+            while parent != session.repo_path and not os.listdir(parent):
+                os.rmdir(parent)
+                parent = os.path.dirname(parent)
+        except OSError:
+            pass
+    if written:
+        _, err, rc = session.run(["git", "--literal-pathspecs", "restore", f"--source={tree}",
+                                  "--worktree", "--pathspec-from-file=-", "--pathspec-file-nul"],
+                                 input="\0".join(written))
+        if rc != 0:
+            safe_update_log(f"❌ Writing remote changes to the vault failed: {err}", progress)
+            return False
+    # Point HEAD and the index at target; the work tree already holds target plus the local edits.
+    _, err, rc = session.run(["git", "reset", "-q", target])
+    if rc != 0:
+        safe_update_log(f"❌ Updating the branch failed: {err}", progress)
+    return rc == 0
+
+
+def integrate_remote_changes(session, plan, progress, prompt=True):
+    """
+    Brings the fetched origin/main into the local branch without a network round trip.
+
+      - Nothing local to keep: the target is origin/main itself.
+      - Diverged: the merge is computed in memory first, so the exact conflicting
+        paths are known before the work tree is touched. A clean merge (or one the
+        user resolves wholesale as local/remote) becomes the target;
+        only "Merge Manually" runs a real merge in the work tree.
+
+    The target is then applied by update_work_tree(), which never stashes and only
+    rewrites the paths that change. With prompt=False (e.g. while Obsidian is open)
+    conflicts are left for later instead of asking the user.
+
+    Falls back to rebase_onto_remote() on Git versions without merge-tree --write-tree,
+    which leaves the remote changes for later while there are uncommitted edits.
+    Returns True if HEAD now contains origin/main.
+    """
+    incoming = session.unpushed_commits(upstream="HEAD", head="origin/main")
+    if plan.ahead == 0:
+        target = session.resolve("origin/main")
+    else:
+        prediction = predict_merge(session)
+        if prediction is None:
+            return rebase_onto_remote(session, progress)
+        tree = prediction.tree
+        if not prediction.clean:
+            entries, unresolved = resolve_conflicts_by_rules(session, prediction.conflicts,
+                                                             conflict_rules(session.repo_path), tree)
+            log_rule_resolutions(prediction.conflicts, unresolved, progress)
+            if unresolved and not prompt:
+                safe_update_log(f"Remote changes conflict with local changes in {len(unresolved)} file(s); "
+                                "they will be resolved after Obsidian closes.", progress)
+                return False
+            if unresolved:
+                paths = sorted(unresolved)
+                safe_update_log(f"❌ Remote changes conflict with local changes in {len(paths)} file(s):", progress)
+                for path in paths:
+                    safe_update_log(f"  ⚠ {path}", None)
+                choice = choose_conflict_resolution(paths, session.repo_path,
+                                                    conflict_sides(session, prediction.conflicts))
+                if choice in ("ours", "theirs") or isinstance(choice, dict):
+                    safe_update_log(describe_conflict_choice(choice), progress)
+                    entries.update(choice_entries(prediction.conflicts, paths, choice))
+                elif choice == "manual":
+                    return merge_manually(session, progress, entries)
+                else:
+                    safe_update_log("No valid conflict resolution chosen. Remote changes were not applied.", progress)
+                    return False
+            tree = write_resolved_tree(session, tree, entries)
+        target = create_merge_commit(session, tree, progress) if tree else None
+        if target is None:
+            return False
+    if not update_work_tree(session, target, progress):
+        return False
+    safe_update_log("Remote changes have been applied. Your vault is updated with the latest changes from GitHub.", progress)
+    for line in incoming.splitlines():
+        safe_update_log(f"✓ Pulled: {line}", progress)
+    return True
+
+def merge_manually(session, progress, resolved=None):
+    """
+    Runs a real merge of origin/main that leaves conflict markers in the work tree,
+    waits for the user to resolve them and then records the merge commit.
+    resolved holds entries already decided by conflict rules; they are applied
+    before the user is asked.
+    """
+    with uninterruptible():
+        return _merge_manually(session, progress, resolved)
+
+def _merge_manually(session, progress, resolved):
+    session.run(["git", "merge", "--no-ff", "--no-commit", "origin/main"])
+    apply_resolutions_to_index(session, resolved)
+    safe_update_log("Please resolve the conflicts manually. After resolving, click OK to continue.", progress)
+    if ask_user(NoticePrompt("Manual Merge", MANUAL_MERGE_NOTICE), timeout=0) != "ok":
+        safe_update_log("The manual merge was not completed. Remote changes were not applied.", progress)
+        session.run(["git", "merge", "--abort"])
+        return False
+    session.run(["git", "add", "-A"])
+    _, err, rc = session.run(["git", "commit", "--no-edit"], env=NON_INTERACTIVE_GIT_ENV)
+    if rc != 0:
+        safe_update_log(f"Error completing the manual merge: {err}", progress)
+        session.run(["git", "merge", "--abort"])
+        return False
+    return True
+
+# ------------------------------------------------
+# MARKDOWN MERGE DRIVER
+# ------------------------------------------------
+# Git runs 'Ogresync merge-driver ... -- %O %A %B %P' for every *.md file that both
+# sides changed (registered per vault by install_merge_driver()). Edits to
+# different lines of a note merge cleanly even when they are adjacent, both
+# sides appending to a note keeps both additions, and YAML frontmatter is
+# merged key by key. Only edits to the same lines are left as conflicts.
+
+MERGE_DRIVER_NAME = "ogresync-md"
+MERGE_DRIVER_PATTERNS = ("*.md",)
+MERGE_MARKER_SIZE = 7
+
+def _changed_regions(base, other):
+    """
+    Returns the edits that turn base into other as (base_start, base_end, lines),
+    in base order; base_start == base_end is a pure insertion.
+    """
+    import difflib
+    matcher = difflib.SequenceMatcher(None, base, other, autojunk=False)
+    return [(i1, i2, other[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+def _regions_overlap(first, second):
+    """
+    True if two edits of the same base touch the same lines. An insertion only
+    overlaps an edit that replaces lines on both sides of it; two insertions at
+    the same place are not an overlap (both are kept).
+    """
+    a1, a2 = first[:2]
+    b1, b2 = second[:2]
+    if a1 == a2 and b1 == b2:
+        return False
+    if a1 == a2:
+        return b1 < a1 < b2
+    if b1 == b2:
+        return a1 < b1 < a2
+    return a1 < b2 and b1 < a2
+
+def _merge_insertions(ours, theirs):
+    """
+    Both sides inserted lines at the same place, e.g. both appended to a daily
+    note: keeps ours, then whatever theirs added beyond a shared prefix or suffix.
+    """
+    if theirs[:len(ours)] == ours or theirs[-len(ours):] == ours:
+        return list(theirs)
+    if ours[:len(theirs)] == theirs or ours[-len(theirs):] == theirs:
+        return list(ours)
+    return list(ours) + list(theirs)
+
+def _merge_chunk(base, ours, theirs):
+    """
+    Merges one chunk in which both sides changed something. Returns the merged
+    lines, or None if the two sides edited the same lines.
+    """
+    if not base:
+        return _merge_insertions(ours, theirs)
+    edits = [(*region, 0) for region in _changed_regions(base, ours)]
+    edits += [(*region, 1) for region in _changed_regions(base, theirs)]
+    for ours_edit in (edit for edit in edits if edit[3] == 0):
+        for theirs_edit in (edit for edit in edits if edit[3] == 1):
+            if _regions_overlap(ours_edit, theirs_edit):
+                return None
+    merged, pos = [], 0
+    edits.sort(key=lambda edit: (edit[0], edit[1], edit[3]))
+    i = 0
+    while i < len(edits):
+        start, end, lines, _ = edits[i]
+        if (i + 1 < len(edits) and start == end and edits[i + 1][:2] == (start, end)):
+            lines = _merge_insertions(lines, edits[i + 1][2])
+            i += 1
+        merged += base[pos:start]
+        merged += lines
+        pos = end
+        i += 1
+    merged += base[pos:]
+    return merged
+
+def _sync_regions(base, ours, theirs):
+    """
+    Yields (base_start, base_end, ours_start, ours_end, theirs_start, theirs_end)
+    for runs of lines that are unchanged on both sides, ending with an empty run
+    at the end of all three.
+    """
+    import difflib
+    ours_blocks = difflib.SequenceMatcher(None, base, ours, autojunk=False).get_matching_blocks()
+    theirs_blocks = difflib.SequenceMatcher(None, base, theirs, autojunk=False).get_matching_blocks()
+    i = j = 0
+    while i < len(ours_blocks) and j < len(theirs_blocks):
+        o_base, o_start, o_len = ours_blocks[i]
+        t_base, t_start, t_len = theirs_blocks[j]
+        start, end = max(o_base, t_base), min(o_base + o_len, t_base + t_len)
+        if start < end:
+            yield (start, end, o_start + start - o_base, o_start + end - o_base,
+                   t_start + start - t_base, t_start + end - t_base)
+        if o_base + o_len < t_base + t_len:
+            i += 1
+        else:
+            j += 1
+    yield (len(base), len(base), len(ours), len(ours), len(theirs), len(theirs))
+
+def _conflict_lines(ours, theirs, labels, marker_size):
+    """
+    A conflict hunk in git's format; a missing final newline on either side is
+    added so the markers stay on their own lines.
+    """
+    def block(lines):
+        return [*lines[:-1], lines[-1] if lines[-1].endswith("\n") else lines[-1] + "\n"] if lines else []
+    return ([f"{'<' * marker_size} {labels[0]}\n", *block(ours), f"{'=' * marker_size}\n",
+             *block(theirs), f"{'>' * marker_size} {labels[1]}\n"])
+
+def merge_lines(base, ours, theirs, labels=("ours", "theirs"), marker_size=MERGE_MARKER_SIZE, union=False):
+    """
+    Three-way merge of three lists of lines (with line endings). Returns
+    (merged_lines, conflict_count); conflicts are written with git's markers,
+    or with union=True resolved by keeping the lines of both sides.
+    """
+    merged, conflicts = [], 0
+    base_pos = ours_pos = theirs_pos = 0
+    for b1, b2, o1, o2, t1, t2 in _sync_regions(base, ours, theirs):
+        base_chunk, ours_chunk, theirs_chunk = base[base_pos:b1], ours[ours_pos:o1], theirs[theirs_pos:t1]
+        if ours_chunk == base_chunk:
+            merged += theirs_chunk
+        elif theirs_chunk == base_chunk or ours_chunk == theirs_chunk:
+            merged += ours_chunk
+        else:
+            chunk = _merge_chunk(base_chunk, ours_chunk, theirs_chunk)
+            if chunk is None and union:
+                merged += _merge_insertions(ours_chunk, theirs_chunk)
+            elif chunk is None:
+                merged += _conflict_lines(ours_chunk, theirs_chunk, labels, marker_size)
+                conflicts += 1
+            else:
+                merged += chunk
+        merged += base[b1:b2]
+        base_pos, ours_pos, theirs_pos = b2, o2, t2
+    return merged, conflicts
+
+def split_frontmatter(lines):
+    """
+    Splits a note into (frontmatter_lines, body_lines) if it starts with a YAML
+    block between '---' lines; frontmatter_lines include both delimiters.
+    Returns None if the note has no frontmatter.
+    """
+    if not lines or lines[0].rstrip("\r\n") != "---":
+        return None
+    for i in range(1, len(lines)):
+        if lines[i].rstrip("\r\n") in ("---", "..."):
+            return lines[:i + 1], lines[i + 1:]
+    return None
+
+def _frontmatter_entries(lines):
+    """
+    Groups frontmatter lines into {key: lines} (in order) by top-level key; the
+    continuation lines of a block value belong to its key. Returns None for
+    anything this simple reader does not understand, which is then merged line
+    by line instead.
+    """
+    import re
+    entries = {}
+    key = None
+    for line in lines:
+        match = re.match(r"([^\s#'\"-][^:]*):(?:\s|$)", line)
+        if match:
+            key = match.group(1)
+            if key in entries:
+                return None
+            entries[key] = [line]
+        elif key is not None and (line[:1] in (" ", "\t", "-") or not line.strip()):
+            entries[key].append(line)
+        else:
+            return None
+    return entries
+
+def _frontmatter_list(lines):
+    """
+    Items of a list value, written either as 'key: [a, b]' or as '- a' lines
+    below the key; None for any other value.
+    """
+    import re
+    head, _, value = lines[0].partition(":")
+    value = value.strip()
+    if len(lines) == 1 and value.startswith("[") and value.endswith("]"):
+        return [item.strip() for item in value[1:-1].split(",") if item.strip()]
+    items = [re.match(r"\s*- (.*)", line) for line in lines[1:] if line.strip()]
+    if not value and all(items):
+        return [match.group(1).strip() for match in items]
+    return None
+
+def _merge_frontmatter_lists(base, ours, theirs, ours_lines):
+    """
+    Merges list values such as tags or aliases: items added on either side are
+    kept, items removed on either side are dropped. Written in ours' style.
+    """
+    removed = {item for item in base if item not in ours or item not in theirs}
+    items = [item for item in ours if item not in removed]
+    items += [item for item in theirs if item not in items and item not in removed]
+    key, _, value = ours_lines[0].partition(":")
+    newline = "\r\n" if ours_lines[0].endswith("\r\n") else "\n"
+    if value.strip().startswith("["):
+        return [f"{key}: [{', '.join(items)}]{newline}"]
+    indent = ours_lines[1][:len(ours_lines[1]) - len(ours_lines[1].lstrip())] if len(ours_lines) > 1 else "  "
+    return [f"{key}:{newline}"] + [f"{indent}- {item}{newline}" for item in items]
+
+def merge_frontmatter(base, ours, theirs, labels, marker_size):
+    """
+    Merges the lines between the frontmatter delimiters key by key, so that
+    changes to different keys never conflict even when the keys are adjacent.
+    Returns (merged_lines, conflict_count), or None if a side cannot be read.
+    """
+    entries = [_frontmatter_entries(lines) for lines in (base, ours, theirs)]
+    if None in entries:
+        return None
+    base_entries, ours_entries, theirs_entries = entries
+    keys = list(ours_entries) + [key for key in theirs_entries if key not in ours_entries]
+    keys += [key for key in base_entries if key not in keys]
+    merged, conflicts = [], 0
+    for key in keys:
+        b, o, t = base_entries.get(key), ours_entries.get(key), theirs_entries.get(key)
+        if o == t or t == b:
+            merged += o or []
+        elif o == b:
+            merged += t or []
+        else:
+            lists = [_frontmatter_list(value) if value else None for value in (b, o, t)]
+            if o and t and lists[1] is not None and lists[2] is not None:
+                merged += _merge_frontmatter_lists(lists[0] or [], lists[1], lists[2], o)
+            else:
+                merged += _conflict_lines(o or [], t or [], labels, marker_size)
+                conflicts += 1
+    return merged, conflicts
+
+def merge_markdown(base, ours, theirs, labels=("ours", "theirs"), marker_size=MERGE_MARKER_SIZE):
+    """
+    Three-way merge of a Markdown note given as three strings. Returns
+    (merged_text, conflict_count); with conflicts, merged_text contains git's
+    conflict markers around the lines both sides edited.
+    """
+    # The lines are merged with a newline at the end of every side, so that a
+    # side appending to the last line does not conflict with the newline. The
+    # final newline is then merged like a line of its own: a side that added
+    # or removed it wins over one that left it as in base.
+    base_closed, ours_closed, theirs_closed = (not text or text.endswith("\n") for text in (base, ours, theirs))
+    closed = theirs_closed if ours_closed == base_closed else ours_closed
+    sides = [(text if not text or text.endswith("\n") else text + "\n").splitlines(keepends=True)
+             for text in (base, ours, theirs)]
+    parts = [split_frontmatter(lines) for lines in sides]
+    frontmatter = None
+    if not sides[0] and sides[1] and sides[2] and sides[1] != sides[2]:
+        # Both sides added the note (add/add): as with 'git merge-file', different
+        # contents conflict instead of being joined; only common lines at the
+        # start and end stay outside the markers.
+        ours_lines, theirs_lines = sides[1], sides[2]
+        head = 0
+        while head < min(len(ours_lines), len(theirs_lines)) and ours_lines[head] == theirs_lines[head]:
+            head += 1
+        tail = 0
+        while (tail < min(len(ours_lines), len(theirs_lines)) - head
+               and ours_lines[-1 - tail] == theirs_lines[-1 - tail]):
+            tail += 1
+        merged = [*ours_lines[:head],
+                  *_conflict_lines(ours_lines[head:len(ours_lines) - tail],
+                                   theirs_lines[head:len(theirs_lines) - tail], labels, marker_size),
+                  *ours_lines[len(ours_lines) - tail:]]
+        return "".join(merged), 1
+    if None not in parts:
+        (base_fm, base_body), (ours_fm, ours_body), (theirs_fm, theirs_body) = parts
+        frontmatter = merge_frontmatter(base_fm[1:-1], ours_fm[1:-1], theirs_fm[1:-1], labels, marker_size)
+    if frontmatter is not None:
+        body, conflicts = merge_lines(base_body, ours_body, theirs_body, labels, marker_size)
+        merged = [ours_fm[0], *frontmatter[0], ours_fm[-1], *body]
+        conflicts += frontmatter[1]
+    else:
+        merged, conflicts = merge_lines(*sides, labels, marker_size)
+    text = "".join(merged)
+    if not closed and text.endswith("\n") and not conflicts:
+        text = text[:-2] if text.endswith("\r\n") else text[:-1]
+    return text, conflicts
+
+def run_merge_driver(base_path, ours_path, theirs_path, path=None, marker_size=MERGE_MARKER_SIZE):
+    """
+    Entry point for git: merges the three versions, writes the result over
+    ours_path and returns 0 if it is clean or 1 if conflicts remain. Notes that
+    are not UTF-8 are handed to 'git merge-file' unchanged.
+    """
+    texts = []
+    try:
+        for file_path in (base_path, ours_path, theirs_path):
+            with open(file_path, "rb") as f:
+                texts.append(f.read().decode("utf-8"))
+    except UnicodeDecodeError:
+        result = subprocess.run(["git", "merge-file", f"--marker-size={marker_size}", "-L", "ours", "-L", "base",
+                                 "-L", "theirs", ours_path, base_path, theirs_path])
+        return 1 if result.returncode else 0
+    except OSError as e:
+        print(f"Ogresync merge driver: {e}", file=sys.stderr)
+        return 2
+    merged, conflicts = merge_markdown(*texts, marker_size=marker_size)
+    with open(ours_path, "wb") as f:
+        f.write(merged.encode("utf-8"))
+    return 1 if conflicts else 0
+
+def merge_driver_command():
+    """
+    The driver line for .git/config; git substitutes %O (base), %A (ours, also
+    the output), %B (theirs), %P (path in the vault) and %L (conflict marker
+    size) and runs it with sh. '--' keeps a path starting with '-' from being
+    read as an option.
+    """
+    import shlex
+    if getattr(sys, "frozen", False):
+        program = [sys.executable]
+    else:
+        program = [sys.executable, os.path.abspath(__file__)]
+    program = [path.replace("\\", "/") for path in program]  # Git for Windows runs drivers with sh
+    return " ".join(shlex.quote(part) for part in program) + " merge-driver --marker-size=%L -- %O %A %B %P"
+
+def install_merge_driver(vault_path):
+    """
+    Registers the Markdown merge driver for the vault: the driver command in
+    .git/config and '*.md merge=ogresync-md' in .git/info/attributes. Both stay
+    local to this machine, so nothing is committed to the vault, and a device
+    without Ogresync keeps using git's own merge. Cheap when already installed;
+    it runs before every sync so the command follows Ogresync if it moves.
+    With merge_driver = false, the attribute lines are removed instead.
+    """
+    git_dir, err, rc = run_command(["git", "rev-parse", "--git-common-dir"], cwd=vault_path)
+    if rc != 0:
+        return False
+    attributes_path = os.path.join(vault_path, git_dir, "info", "attributes")
+    try:
+        with open(attributes_path, encoding="utf-8") as f:
+            attributes = f.read().splitlines()
+    except OSError:
+        attributes = []
+    wanted = [f"{pattern} merge={MERGE_DRIVER_NAME}" for pattern in MERGE_DRIVER_PATTERNS]
+    if get_config("MERGE_DRIVER", vault_path):
+        missing = [line for line in wanted if line not in attributes]
+        updated = attributes + missing
+        command = merge_driver_command()
+        key = f"merge.{MERGE_DRIVER_NAME}.driver"
+        current, _, rc = run_command(["git", "config", "--get", key], cwd=vault_path)
+        if rc != 0 or current != command:
+            run_command(["git", "config", f"merge.{MERGE_DRIVER_NAME}.name", "Ogresync Markdown merge"], cwd=vault_path)
+            _, err, rc = run_command(["git", "config", key, command], cwd=vault_path)
+            if rc != 0:
+                safe_update_log(f"⚠ Could not register the Markdown merge driver: {err}", None)
+                return False
+    else:
+        updated = [line for line in attributes if line not in wanted]
+    if updated != attributes:
+        write_file_atomically(attributes_path, lambda f: f.write("".join(line + "\n" for line in updated)))
+    return True
+
+# ------------------------------------------------
+# CONFLICT RULES
+# ------------------------------------------------
+# Rules pick a resolution for each conflicting file by its path, so files like
+# .obsidian/workspace.json (changed by every session) never reach the dialog.
+# Configured as conflict_rules in ogresync.ini, one "glob = strategy" per line;
+# a vault's own rules are tried before the global ones and the first match wins.
+
+CONFLICT_STRATEGIES = ("ours", "theirs", "union", "newest-mtime", "keep-both")
+
+class ConflictRules:
+    """
+    Compiled glob -> strategy rules. A glob without '/' matches the file name
+    anywhere in the vault (like .gitignore); one with '/' matches the whole path
+    from the vault root, and its '*' also matches across folders.
+    """
+
+    def __init__(self, rules):
+        import fnmatch
+        import re
+        self.rules = tuple(rules)
+        self._compiled = []
+        for pattern, strategy in self.rules:
+            regex = re.compile(fnmatch.translate(pattern.lstrip("/")))
+            self._compiled.append((regex.match, "/" in pattern.rstrip("/"), strategy))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def strategy_for(self, path):
+        name = path.rsplit("/", 1)[-1]
+        for match, full_path, strategy in self._compiled:
+            if match(path if full_path else name):
+                return strategy
+        return None
+
+def conflict_rules(vault_path):
+    """
+    The conflict rules for a vault: its own conflict_rules first, then the global ones.
+    """
+    global_rules = get_config("CONFLICT_RULES")
+    vault_rules = get_config("CONFLICT_RULES", vault_path)
+    return ConflictRules(vault_rules + global_rules if vault_rules != global_rules else global_rules)
+
+def side_entries(conflicts, paths, stage):
+    """
+    Resolves paths by taking one side (stage 2 or 3) as it is. Returns
+    {path: (mode, object_id)}, with None where that side deleted the file.
+    """
+    return {path: conflicts[path].get(stage) for path in paths}
+
+def choice_entries(conflicts, paths, choice, local=2, remote=3):
+    """
+    Entries for the user's answer to a ConflictPrompt: "ours" or "theirs" for
+    every path, or a {path: "ours"|"theirs"} choice per file.
+    """
+    if not isinstance(choice, dict):
+        choice = dict.fromkeys(paths, choice)
+    return {path: conflicts[path].get(local if choice[path] == "ours" else remote) for path in paths}
+
+def conflict_sides(session, conflicts, local=2, remote=3):
+    """
+    A sides(path) function for ConflictPrompt: reads the local and remote
+    version of a conflicting file from the object database (what 'git show
+    :2:path' / ':3:path' would print), without touching the work tree.
+    """
+    def sides(path):
+        stages = conflicts[path]
+        return tuple(session.read_object(stages[stage][1])[1] if stage in stages else None
+                     for stage in (local, remote))
+    return sides
+
+def unmerged_entries(session):
+    """
+    The conflicts of a merge or rebase that stopped in the work tree, in the
+    same {path: {stage: (mode, object_id)}} form as MergePrediction.conflicts.
+    """
+    out, _, rc = session.run(["git", "ls-files", "-u", "-z"])
+    conflicts = {}
+    for field in out.split("\0") if rc == 0 else []:
+        if field:
+            info, _, path = field.partition("\t")
+            mode, oid, stage = info.split()
+            conflicts.setdefault(path, {})[int(stage)] = (mode, oid)
+    return conflicts
+
+def log_rule_resolutions(conflicts, unresolved, progress):
+    """
+    Summarises which conflicting files the conflict rules resolved.
+    """
+    resolved = len(conflicts) - len(unresolved)
+    if resolved:
+        safe_update_log(f"Conflict rules resolved {resolved} of {len(conflicts)} conflicting file(s).", progress)
+
+def remote_change_times(session, local_rev, remote_rev):
+    """
+    Returns {path: commit time} for the newest commit in remote_rev (and not in
+    local_rev) that changed each path, from a single 'git log'.
+    """
+    out, _, rc = session.run(["git", "log", "-z", "--format=%x01%ct", "--name-only", "--no-renames",
+                              remote_rev, "--not", local_rev])
+    times, current = {}, 0
+    if rc != 0:
+        return times
+    for field in out.split("\0"):
+        field = field.lstrip("\n")
+        if field.startswith("\x01"):
+            current = int(field[1:])
+        elif field:
+            times.setdefault(field, current)
+    return times
+
+def keep_both_path(session, tree, path, taken):
+    """
+    A free path next to path for the remote copy, e.g. 'Note (remote conflict 2026-01-31).md'.
+    """
+    stem, ext = os.path.splitext(path)
+    label = f"remote conflict {time.strftime('%Y-%m-%d')}"
+    candidate, n = f"{stem} ({label}){ext}", 2
+    while candidate in taken or session.resolve(f"{tree}:{candidate}") is not None:
+        candidate, n = f"{stem} ({label} {n}){ext}", n + 1
+    return candidate
+
+def union_blobs(session, conflicts, paths, local, remote):
+    """
+    Merges each path's text line by line, keeping both sides' lines where they
+    conflict, and stores the results as blobs with one 'git hash-object'.
+    Returns {path: (mode, object_id)}; binary or non-UTF-8 files are left out.
+    """
+    import tempfile
+    texts = {}
+    for path in paths:
+        stages = conflicts[path]
+        sides = []
+        for stage in (1, local, remote):
+            if stage not in stages:
+                sides.append(b"")
+                continue
+            _, body = session.read_object(stages[stage][1])
+            sides.append(body)
+        if any(body is None or b"\0" in body for body in sides):
+            continue
+        try:
+            base, ours, theirs = (body.decode("utf-8").splitlines(keepends=True) for body in sides)
+        except UnicodeDecodeError:
+            continue
+        texts[path] = "".join(merge_lines(base, ours, theirs, union=True)[0])
+    if not texts:
+        return {}
+    with tempfile.TemporaryDirectory(prefix="ogresync-union-") as tmp:
+        files = []
+        for i, text in enumerate(texts.values()):
+            files.append(os.path.join(tmp, str(i)))
+            with open(files[-1], "wb") as f:
+                f.write(text.encode("utf-8"))
+        out, err, rc = session.run(["git", "hash-object", "-w", "--no-filters", "--stdin-paths"],
+                                   input="\n".join(files) + "\n")
+    if rc != 0:
+        safe_update_log(f"⚠ Could not store merged files: {err}", None)
+        return {}
+    return {path: (conflicts[path][local][0], oid) for path, oid in zip(texts, out.split())}
+
+def resolve_conflicts_by_rules(session, conflicts, rules, tree, local=2, remote=3, local_rev="HEAD",
+                               remote_rev="origin/main", work_tree_times=True):
+    """
+    Applies the conflict rules to every conflicting path in one batch.
+
+      conflicts: {path: {stage: (mode, object_id)}} as in MergePrediction; local and
+                 remote name the stages of each side (a rebase swaps them).
+      tree:      the merged tree, used to find free names for keep-both copies.
+
+    Strategies: ours/theirs take one side; union keeps the lines of both sides
+    where they conflict; newest-mtime keeps the local file if it was modified
+    after the newest remote commit that changed it; keep-both keeps the local
+    file and stores the remote version next to it. If one side deleted the
+    file, union, newest-mtime and keep-both keep the side that still has it.
+    newest-mtime compares the local file's modification time, or with
+    work_tree_times=False (the work tree holds conflict markers) the time of
+    the newest local commit that changed it.
+
+    Returns (entries, unresolved): entries maps paths (including keep-both
+    copies) to (mode, object_id), or None to delete; unresolved lists the paths
+    no rule matched or that could not be resolved (e.g. union of binary files).
+    """
+    by_strategy = {strategy: [] for strategy in CONFLICT_STRATEGIES}
+    unresolved = []
+    for path in conflicts:
+        strategy = rules.strategy_for(path) if rules else None
+        if strategy is None:
+            unresolved.append(path)
+        elif strategy in ("ours", "theirs") or (local in conflicts[path] and remote in conflicts[path]):
+            by_strategy[strategy].append(path)
+        else:
+            # Deleted on one side: keep the side that still has the file.
+            by_strategy["ours" if local in conflicts[path] else "theirs"].append(path)
+
+    entries = side_entries(conflicts, by_strategy["ours"], local)
+    entries.update(side_entries(conflicts, by_strategy["theirs"], remote))
+    if by_strategy["newest-mtime"]:
+        remote_times = remote_change_times(session, local_rev, remote_rev)
+        local_times = None if work_tree_times else remote_change_times(session, remote_rev, local_rev)
+        for path in by_strategy["newest-mtime"]:
+            try:
+                local_time = (os.stat(os.path.join(session.repo_path, path)).st_mtime if local_times is None
+                              else local_times.get(path, 0))
+            except OSError:
+                local_time = 0
+            newest = local if local_time >= remote_times.get(path, 0) else remote
+            entries[path] = conflicts[path][newest]
+    for path in by_strategy["keep-both"]:
+        entries[path] = conflicts[path][local]
+        entries[keep_both_path(session, tree, path, entries)] = conflicts[path][remote]
+    if by_strategy["union"]:
+        merged = union_blobs(session, conflicts, by_strategy["union"], local, remote)
+        entries.update(merged)
+        unresolved += [path for path in by_strategy["union"] if path not in merged]
+    return entries, unresolved
+
+def apply_resolutions_to_index(session, entries):
+    """
+    Writes resolved entries into the real index and the work tree, e.g. during a
+    merge or rebase that stopped on conflicts.
+    """
+    if not entries:
+        return True
+    _, err, rc = session.run(["git", "update-index", "--index-info"],
+                             input=index_info(entries, session.resolve("HEAD")))
+    if rc != 0:
+        safe_update_log(f"❌ Applying conflict rules failed: {err}", None)
+        return False
+    for path, entry in entries.items():
+        if entry is None:
+            try:
+                os.remove(os.path.join(session.repo_path, path))
+            except OSError:
+                pass
+    written = [path for path, entry in entries.items() if entry is not None]
+    if written:
+        session.run(["git", "checkout-index", "-f", "-z", "--stdin"], input="\0".join(written))
+    return True
+
+# ------------------------------------------------
+# GITHUB SETUP FUNCTIONS
+# ------------------------------------------------
+def is_git_repo(folder_path):
+    """
+    Checks if a folder is already a Git repository.
+    Returns True if the folder is a Git repo, otherwise False.
+    """
+    return get_git_session(folder_path).is_repo()
+
+def initialize_git_repo(vault_path):
+    """
+    Initializes a Git repository in the selected vault folder if it's not already a repo.
+    Also sets the branch to 'main' and installs the Markdown merge driver.
+    """
+    if not is_git_repo(vault_path):
+        safe_update_log("Initializing Git repository in vault...", 15)
+        out, err, rc = run_command(["git", "init"], cwd=vault_path)
+        if rc == 0:
+            run_command(["git", "branch", "-M", "main"], cwd=vault_path)
+            safe_update_log("Git repository initialized successfully.", 20)
+        else:
+            safe_update_log("Error initializing Git repository: " + err, 20)
+    else:
+        safe_update_log("Vault is already a Git repository.", 20)
+    install_merge_driver(vault_path)
+
+def set_github_remote(vault_path):
+    """
+    Prompts the user to link an existing GitHub repository.
+    If the user chooses not to link (or closes the dialog without providing a URL),
+    an error is shown indicating that linking a repository is required.
+    Returns True if the repository is linked successfully; otherwise, returns False.
+    """
+    # Check if a remote named 'origin' already exists
+    existing_remote_url, err, rc = run_command(["git", "remote", "get-url", "origin"], cwd=vault_path)
+    if rc == 0:
+        safe_update_log(f"A remote named 'origin' already exists: {existing_remote_url}", 25)
+        override = messagebox.askyesno(
+            "Existing Remote",
+            f"A remote 'origin' already points to:\n{existing_remote_url}\n\n"
+            "Do you want to override it with a new URL?"
+        )
+        if not override:
+            safe_update_log("Keeping the existing 'origin' remote. Skipping new remote configuration.", 25)
+            return True
+        else:
+            out, err, rc = run_command(["git", "remote", "remove", "origin"], cwd=vault_path)
+            if rc != 0:
+                safe_update_log(f"Error removing existing remote: {err}", 25)
+                return False
+            safe_update_log("Existing 'origin' remote removed.", 25)
+
+    # Prompt for linking a repository
+    # Instead of allowing a "No" option, we require linking.
+    use_existing_repo = messagebox.askyesno(
+        "GitHub Repository",
+        "A GitHub repository is required for synchronization.\n"
+        "Do you have an existing repository you would like to link?\n"
+        "(If not, please create a private repository on GitHub and then link to it.)"
+    )
+    if use_existing_repo:
+        repo_url = simpledialog.askstring(
+            "GitHub Repository",
+            "Enter your GitHub repository URL (e.g., git@github.com:username/repo.git):",
+            parent=root
+        )
+        if repo_url:
+            out, err, rc = run_command(["git", "remote", "add", "origin", repo_url], cwd=vault_path)
+            if rc == 0:
+                invalidate_network_cache()
+                safe_update_log(f"Git remote 'origin' set to: {repo_url}", 25)
+                return True
+            else:
+                messagebox.showerror("Error", f"Error setting Git remote: {err}\nPlease try again.")
+                return False
+        else:
+            messagebox.showerror("Error", "Repository URL not provided. You must link to a GitHub repository.")
+            return False
+    else:
+        messagebox.showerror("GitHub Repository Required", 
+                             "Linking a GitHub repository is required for synchronization.\n"
+                             "Please create a repository on GitHub (private is recommended) and then link to it.")
+        return False
+
+def ensure_placeholder_file(vault_path):
+    """
+    Creates a placeholder file (README.md) in the vault if it doesn't already exist.
+    This ensures that there's at least one file to commit.
+    """
+    import os
+    placeholder_path = os.path.join(vault_path, "README.md")
+    if not os.path.exists(placeholder_path):
+        with open(placeholder_path, "w", encoding="utf-8") as f:
+            f.write("# Welcome to your Obsidian Vault\n\nThis placeholder file was generated automatically by Obsidian Sync to initialize the repository.")
+        safe_update_log("Placeholder file 'README.md' created, as the vault was empty.", 5)
+    else:
+        safe_update_log("Placeholder file 'README.md' already exists.", 5)
+
+
+
+
+# ------------------------------------------------
+# WIZARD STEPS (Used Only if SETUP_DONE=0)
+# ------------------------------------------------
+
+def find_obsidian_path():
+    """
+    Attempts to locate Obsidian’s installation or launch command based on the OS.
+    
+    Windows:
+      - Checks common installation directories for "Obsidian.exe".
+    Linux:
+      - Checks if 'obsidian' is in PATH.
+      - Checks common Flatpak paths.
+      - Checks common Snap path.
+      - As a fallback, returns the Flatpak command string.
+    macOS:
+      - Checks the default /Applications folder.
+      - Checks PATH.
+    
+    If not found, it prompts the user to manually locate the executable.
+    
+    Returns the path or command string to launch Obsidian, or None.
+    """
+    import shutil
+    if sys.platform.startswith("win"):
+        possible_paths = [
+            os.path.expandvars(r"%LOCALAPPDATA%\Programs\Obsidian\Obsidian.exe"),
+            os.path.expandvars(r"%PROGRAMFILES%\Obsidian\Obsidian.exe"),
+            os.path.expandvars(r"%PROGRAMFILES(X86)%\Obsidian\Obsidian.exe")
+        ]
+        for path in possible_paths:
+            if os.path.exists(path):
+                return path
+        response = messagebox.askyesno("Obsidian Not Found",
+                                       "Obsidian was not detected in standard locations.\n"
+                                       "Would you like to locate the Obsidian executable manually?")
+        if response:
+            selected_path = filedialog.askopenfilename(
+                title="Select Obsidian Executable",
+                filetypes=[("Obsidian Executable", "*.exe")]
+            )
+            if selected_path:
+                return selected_path
+        return None
+
+    elif sys.platform.startswith("linux"):
+        # Option 1: Check if 'obsidian' is in PATH.
+        obsidian_cmd = shutil.which("obsidian")
+        if obsidian_cmd:
+            return obsidian_cmd
+        # Option 2: Check common Flatpak paths.
+        flatpak_paths = [
+            os.path.expanduser("~/.local/share/flatpak/exports/bin/obsidian"),
+            "/var/lib/flatpak/exports/bin/obsidian"
+        ]
+        for path in flatpak_paths:
+            if os.path.exists(path):
+                return path
+        # Option 3: Check Snap installation.
+        snap_path = "/snap/bin/obsidian"
+        if os.path.exists(snap_path):
+            return snap_path
+        # Option 4: Fallback to a command string.
+        # (You can modify this if you want to prompt the user instead.)
+        return "flatpak run md.obsidian.Obsidian"
+
+    elif sys.platform.startswith("darwin"):
+        # macOS: Check default location in /Applications.
+        obsidian_app = "/Applications/Obsidian.app/Contents/MacOS/Obsidian"
+        if os.path.exists(obsidian_app):
+            return obsidian_app
+        # Option 2: Check if a command is available in PATH.
+        obsidian_cmd = shutil.which("obsidian")
+        if obsidian_cmd:
+            return obsidian_cmd
+        response = messagebox.askyesno("Obsidian Not Found",
+                                       "Obsidian was not detected in standard locations.\n"
+                                       "Would you like to locate the Obsidian application manually?")
+        if response:
+            selected_path = filedialog.askopenfilename(
+                title="Select Obsidian Application",
+                filetypes=[("Obsidian Application", "*.app")]
+            )
+            if selected_path:
+                return selected_path
+        return None
+
+
+def select_vault_path():
+    """
+    Asks user to select Obsidian Vault folder. Returns path or None if canceled.
+    """
+    selected = filedialog.askdirectory(title="Select Obsidian Vault Folder")
+    return selected if selected else None
+
+def is_git_installed():
+    """
+    Returns True if Git is installed, else False.
+    """
+    out, err, rc = run_command(["git", "--version"])
+    return rc == 0
+
+def test_ssh_connection_sync():
+    """
+    Synchronously tests SSH to GitHub. Returns True if OK, False otherwise.
+    If start_ssh_multiplexing() was called, this also warms the master connection
+    that the following push reuses.
+    """
+    out, err, rc = run_command(["ssh", *ssh_multiplexing_options(), "-T", "git@github.com"])
+    print("DEBUG: SSH OUT:", out)
+    print("DEBUG: SSH ERR:", err)
+    print("DEBUG: SSH RC:", rc)
+    if "successfully authenticated" in (out + err).lower():
+        return True
+    return False
+
+def re_test_ssh():
+    """
+    Re-tests the SSH connection in a background thread.
+    If successful, automatically performs an initial commit/push if none exists yet.
+    """
+    def _test_thread():
+        start_ssh_multiplexing()
+        try:
+            _run_ssh_test()
+        finally:
+            stop_ssh_multiplexing()
+            close_git_sessions()
+
+    def _run_ssh_test():
+        safe_update_log("Re-testing SSH connection to GitHub...", 35)
+        ensure_github_known_host()  # ensures no prompt for 'yes/no'
+
+        if test_ssh_connection_sync():
+            safe_update_log("SSH connection successful!", 40)
+            
+            # Perform the initial commit/push if there are no local commits yet
+            perform_initial_commit_and_push(config_data["VAULT_PATH"])
+
+            # Mark setup as done
+            config_data["SETUP_DONE"] = True
+            save_config()
+
+            safe_update_log("Setup complete! You can now close this window or start sync.", 100)
+        else:
+            safe_update_log("SSH connection still failed. Check your GitHub key or generate a new one.", 40)
+
+    threading.Thread(target=_test_thread, daemon=True).start()
+
+
+def perform_initial_commit_and_push(vault_path):
+    """
+    Checks if the local repository has any commits.
+    If not, creates an initial commit and pushes it to the remote 'origin' on the 'main' branch.
+    """
+    session = get_git_session(vault_path)
+    if session.resolve("HEAD") is None:
+        # HEAD does not resolve => no commits (unborn branch)
+        safe_update_log("No local commits detected. Creating initial commit...", 50)
+
+        # Stage all files (there is no commit yet, so no known change set)
+        session.run(["git", "add", "."])
+
+        # Commit
+        out_commit, err_commit, rc_commit = session.run(["git", "commit", "-m", "Initial commit"])
+        if rc_commit == 0:
+            # Push and set upstream
+            out_push, err_push, rc_push = session.remote(["git", "push", "-u", "origin", "main"])
+            if rc_push == 0:
+                safe_update_log("Initial commit pushed to remote repository successfully.", 60)
+            else:
+                safe_update_log(f"Error pushing initial commit: {err_push}", 60)
+        else:
+            safe_update_log(f"Error committing files: {err_commit}", 60)
+    else:
+        # We already have at least one commit in this repo
+        safe_update_log("Local repository already has commits. Skipping initial commit step.", 50)
+
+
+# -- SSH Key Generation in Background
+
+def generate_ssh_key():
+    """
+    Prompts for the user's email and starts a background thread for SSH key generation.
+    """
+    user_email = simpledialog.askstring(
+        "SSH Key Generation",
+        "Enter your email address for the SSH key:",
+        parent=root
+    )
+    if not user_email:
+        messagebox.showerror("Email Required", "No email address provided. SSH key generation canceled.")
+        return
+
+    threading.Thread(target=generate_ssh_key_async, args=(user_email,), daemon=True).start()
+
+
+def generate_ssh_key_async(user_email):
+    """
+    Runs in a background thread to:
+      1) Generate an SSH key if it doesn't already exist.
+      2) Copy the public key to the clipboard.
+      3) Show an info dialog on the main thread.
+      4) After the user closes the dialog, open GitHub's SSH settings in the browser.
+    """
+    import pyperclip
+    import webbrowser
+    key_path_private = SSH_KEY_PATH.replace("id_rsa.pub", "id_rsa")
+
+    # 1) Generate key if it doesn't exist
+    if not os.path.exists(SSH_KEY_PATH):
+        safe_update_log("Generating SSH key...", 25)
+        out, err, rc = run_command(["ssh-keygen", "-t", "rsa", "-b", "4096", "-C", user_email, "-f", key_path_private, "-N", ""])
+        if rc != 0:
+            safe_update_log(f"SSH key generation failed: {err}", 25)
+            return
+        safe_update_log("SSH key generated successfully.", 30)
+    else:
+        safe_update_log("SSH key already exists. Overwriting is not performed here.", 30)
+
+    # 2) Read the public key and attempt to copy to the clipboard
+    try:
+        with open(SSH_KEY_PATH, "r", encoding="utf-8") as key_file:
+            public_key = key_file.read().strip()
+        pyperclip.copy(public_key)
+        # Verify that clipboard contains the expected key
+        copied = pyperclip.paste().strip()
+        if copied != public_key:
+            raise Exception("Clipboard copy failed: content mismatch.")
+        safe_update_log("Public key successfully copied to clipboard.", 35)
+    except Exception as e:
+        safe_update_log(f"Error copying SSH key to clipboard: {e}", 35)
+        # 3) Fallback: show a dialog with manual instructions and the public key
+        messagebox.showinfo(
+            "Manual SSH Key Copy Required",
+            "Automatic copying of your SSH key failed.\n\n"
+            "Please open a terminal and run:\n\n"
+            "   cat ~/.ssh/id_rsa.pub\n\n"
+            "Then copy the output manually and add it to your GitHub account."
+        )
+
+    # 4) Show final info dialog and open GitHub's SSH keys page
+    def show_dialog_then_open_browser():
+        messagebox.showinfo(
+            "SSH Key Generated",
+            "Your SSH key has been generated and copied to the clipboard (if successful).\n\n"
+            "If automatic copying failed, please manually copy the key as described.\n\n"
+            "Click OK to open GitHub's SSH keys page to add your key."
+        )
+        webbrowser.open("https://github.com/settings/keys")
+    
+    root.after(0, show_dialog_then_open_browser)
+
+
+def copy_ssh_key():
+    """
+    Copies the SSH key to clipboard and opens GitHub SSH settings.
+    """
+    import pyperclip
+    import webbrowser
+    if os.path.exists(SSH_KEY_PATH):
+        with open(SSH_KEY_PATH, "r", encoding="utf-8") as key_file:
+            ssh_key = key_file.read().strip()
+            pyperclip.copy(ssh_key)
+        webbrowser.open("https://github.com/settings/keys")
+        messagebox.showinfo("SSH Key Copied",
+                            "Your SSH key has been copied to the clipboard.\n"
+                            "Paste it into GitHub.")
+    else:
+        messagebox.showerror("Error", "No SSH key found. Generate one first.")
+
+# ------------------------------------------------
+# LIVE SYNC (WHILE OBSIDIAN IS OPEN)
+# ------------------------------------------------
+
+# inotify(7) event bits used by VaultWatcher.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+VAULT_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                    IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+
+
+class VaultWatcher:
+    """
+    Reports which files in a vault changed, ignoring the .git directory.
+
+    Uses inotify on Linux (one watch per directory, added as directories appear)
+    and falls back to comparing (mtime, size) snapshots every poll_interval
+    seconds elsewhere or if inotify is unavailable.
+
+    wait() returns a set of vault-relative paths ('/'-separated), an empty set
+    on timeout, or None if events were lost and the change set is unknown.
+    """
+
+    def __init__(self, vault_path, poll_interval=2.0):
+        self.vault_path = os.path.abspath(vault_path)
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._watches = {}
+        self._snapshot = None
+        self._last_poll = 0.0
+        if sys.platform.startswith("linux"):
+            self._start_inotify()
+        if self._fd is None:
+            self._snapshot = self._scan()
+            self._last_poll = time.monotonic()
+
+    @property
+    def backend(self):
+        return "inotify" if self._fd is not None else "polling"
+
+    def _start_inotify(self):
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        self._libc = libc
+        self._fd = fd
+        self._add_tree("")
+
+    def _add_watch(self, rel_dir):
+        full = os.path.join(self.vault_path, rel_dir) if rel_dir else self.vault_path
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(full), VAULT_WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = rel_dir
+
+    def _add_tree(self, rel_dir):
+        """
+        Watches rel_dir and every directory below it; returns the files found there.
+        """
+        files = set()
+        full = os.path.join(self.vault_path, rel_dir) if rel_dir else self.vault_path
+        self._add_watch(rel_dir)
+        for dirpath, dirnames, filenames in os.walk(full):
+            dirnames[:] = [d for d in dirnames if d != ".git"]
+            rel = os.path.relpath(dirpath, self.vault_path).replace(os.sep, "/")
+            rel = "" if rel == "." else rel
+            if rel != rel_dir:
+                self._add_watch(rel)
+            for name in filenames:
+                files.add(f"{rel}/{name}" if rel else name)
+        return files
+
+    def _scan(self):
+        snapshot = {}
+        for dirpath, dirnames, filenames in os.walk(self.vault_path):
+            dirnames[:] = [d for d in dirnames if d != ".git"]
+            rel = os.path.relpath(dirpath, self.vault_path).replace(os.sep, "/")
+            for name in filenames:
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                snapshot[name if rel == "." else f"{rel}/{name}"] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def _wait_polling(self, timeout):
+        remaining = self._last_poll + self.poll_interval - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(remaining, 0))
+        current = self._scan()
+        self._last_poll = time.monotonic()
+        previous, self._snapshot = self._snapshot, current
+        return {path for path in set(previous) | set(current)
+                if previous.get(path) != current.get(path)}
+
+    def _wait_inotify(self, timeout):
+        import struct
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self._fd, 64 * 1024)
+        changed = set()
+        pos = 0
+        while pos + 16 <= len(data):
+            wd, mask, _cookie, length = struct.unpack_from("iIII", data, pos)
+            name = data[pos + 16:pos + 16 + length].rstrip(b"\0").decode("utf-8", errors="surrogateescape")
+            pos += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            rel_dir = self._watches.get(wd)
+            if rel_dir is None or not name:
+                continue
+            path = f"{rel_dir}/{name}" if rel_dir else name
+            if path == ".git" or path.startswith(".git/"):
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed |= self._add_tree(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    # Files below a removed directory are not reported individually.
+                    return None
+                continue
+            changed.add(path)
+        return changed
+
+    def wait(self, timeout):
+        if self._fd is not None:
+            return self._wait_inotify(timeout)
+        return self._wait_polling(timeout)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class LiveSync:
+    """
+    Commits and pushes vault changes in the background while Obsidian is open.
+
+    A commit is made once saves have been quiet for 'debounce' seconds, or at the
+    latest 'max_latency' seconds after the first unsaved change, so a burst of
+    saves becomes one small commit. The post-close commit/push in sync_thread
+    then acts as a final flush.
+    """
+
+    def __init__(self, vault_path, debounce=5.0, max_latency=60.0):
+        self.vault_path = vault_path
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.commits = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=run_with_log_label, args=(current_log_vault(), self._run), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching and waits for an in-flight commit/push to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        watcher = VaultWatcher(self.vault_path)
+        safe_update_log(f"Live sync enabled ({watcher.backend}); changes are committed as you edit.", None)
+        pending = False
+        changed_paths = set()  # None once the watcher lost track
+        first_change = last_change = 0.0
+        try:
+            while not self._stop.is_set():
+                timeout = 0.5
+                if pending:
+                    now = time.monotonic()
+                    timeout = min(timeout, self.debounce - (now - last_change),
+                                  self.max_latency - (now - first_change))
+                changes = watcher.wait(max(timeout, 0))
+                now = time.monotonic()
+                if changes is None or changes:
+                    if not pending:
+                        first_change = now
+                    pending = True
+                    last_change = now
+                    changed_paths = None if changes is None or changed_paths is None else changed_paths | changes
+                if pending and (now - last_change >= self.debounce or
+                                now - first_change >= self.max_latency):
+                    pending = False
+                    self._flush(changed_paths)
+                    changed_paths = set()
+        finally:
+            watcher.close()
+
+    def _flush(self, paths=None):
+        """
+        Commits and pushes the changes to paths, or everything if the watcher
+        could not tell which files changed (paths is None).
+        """
+        session = get_git_session(self.vault_path)
+        with session.operation_lock:
+            if paths is None or not session.stage_paths(sorted(paths)):
+                session.run(["git", "add", "-A"])
+            out, err, rc = session.run(["git", "commit", "-m", "Live sync commit"])
+            if rc != 0:
+                if "nothing to commit" not in (out + err).lower():
+                    safe_update_log(f"Live sync commit failed: {err}", None)
+                return
+            self.commits += 1
+            safe_update_log(f"Live sync: committed {len(session.diff_tree('HEAD'))} changed file(s).", None)
+            if not is_network_available(self.vault_path):
+                return
+            out, err, rc = session.remote(["git", "push", "origin", "main"])
+            if rc != 0 and ("rejected" in err or "fetch first" in err):
+                # GitHub has newer commits: merge them without stashing (safe while
+                # Obsidian has files open) unless they conflict, then push again.
+                plan = plan_sync(session)
+                if plan.needs_pull and integrate_remote_changes(session, plan, None, prompt=False):
+                    out, err, rc = session.remote(["git", "push", "origin", "main"])
+            if rc == 0:
+                safe_update_log("Live sync: pushed to GitHub.", None)
+            elif "rejected" in err or "fetch first" in err:
+                safe_update_log("Live sync: GitHub has newer changes; they will be merged after Obsidian closes.", None)
+            else:
+                safe_update_log(f"Live sync: push failed, will retry after Obsidian closes: {err}", None)
+
+PREFETCH_MAX_INTERVAL = 900.0  # seconds between prefetches when nothing is arriving
+PREFETCH_FRESHNESS = 15.0      # a fetch this recent (step 2 or a prefetch) replaces the post-close fetch
+
+
+def get_object_store_size(session):
+    """
+    Returns the size in bytes of the repository's loose objects and packs.
+    """
+    out, _, rc = session.run(["git", "count-objects", "-v"])
+    if rc != 0:
+        return 0
+    sizes = dict(line.split(": ", 1) for line in out.splitlines() if ": " in line)
+    return (int(sizes.get("size", 0)) + int(sizes.get("size-pack", 0))) * 1024
+
+
+class RemotePrefetcher:
+    """
+    Fetches origin/main in the background while Obsidian is open, so the post-close
+    phase only has to apply objects that are already downloaded.
+
+    The interval starts at 'interval' seconds, doubles (up to PREFETCH_MAX_INTERVAL)
+    while nothing new arrives or the remote is unreachable, and drops back to the
+    start value as soon as a fetch brings in new objects.
+    """
+
+    def __init__(self, vault_path, interval=60.0):
+        self.vault_path = vault_path
+        self.min_interval = interval
+        self.fetches = 0
+        self.bytes_fetched = 0
+        self.last_fetch = None  # time.monotonic() of the last successful fetch
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=run_with_log_label, args=(current_log_vault(), self._run), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def last_fetch_age(self):
+        """
+        Seconds since the last successful prefetch, or None if none succeeded.
+        """
+        return None if self.last_fetch is None else time.monotonic() - self.last_fetch
+
+    def describe(self):
+        age = self.last_fetch_age()
+        age_text = "never" if age is None else f"{age:.0f} s ago"
+        return (f"Prefetch: {self.fetches} fetch(es), {self.bytes_fetched / 1024:.1f} KiB downloaded, "
+                f"last fetch {age_text}.")
+
+    def _run(self):
+        interval = self.min_interval
+        while not self._stop.wait(interval):
+            if not is_network_available(self.vault_path):
+                interval = min(interval * 2, PREFETCH_MAX_INTERVAL)
+                continue
+            session = get_git_session(self.vault_path)
+            with session.operation_lock:
+                before_id = session.resolve("origin/main")
+                before_size = get_object_store_size(session)
+                _, err, rc = session.remote(["git", "fetch", "origin", "main"])
+                fetched = get_object_store_size(session) - before_size
+                after_id = session.resolve("origin/main")
+            if rc != 0:
+                interval = min(interval * 2, PREFETCH_MAX_INTERVAL)
+                continue
+            self.fetches += 1
+            self.last_fetch = time.monotonic()
+            if after_id != before_id:
+                self.bytes_fetched += max(fetched, 0)
+                safe_update_log(f"Prefetched new changes from GitHub ({max(fetched, 0) / 1024:.1f} KiB). {self.describe()}", None)
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, PREFETCH_MAX_INTERVAL)
+
+# ------------------------------------------------
+# AUTO-SYNC (Used if SETUP_DONE=1)
+# ------------------------------------------------
+
+def export_sync_trace():
+    """
+    Logs how long each sync step took and writes the session's trace to
+    TRACE_DIR as trace-<timestamp>.json.
+    """
+    steps = tracer.totals("step")
+    if steps:
+        safe_update_log("Timing: " + ", ".join(f"{name.partition(': ')[2]} {seconds:.2f} s"
+                                               for name, seconds in steps.items()), None)
+    commands = tracer.totals("command")
+    if commands:
+        slowest = sorted(commands.items(), key=lambda item: item[1], reverse=True)[:3]
+        safe_update_log("Slowest commands: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in slowest), None)
+    trace_dir = get_config("TRACE_DIR") or os.path.join(get_config_dir(), "traces")
+    path = os.path.join(trace_dir, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+    try:
+        tracer.export(path)
+        safe_update_log(f"Trace written to {os.path.abspath(path)}", None)
+    except OSError as e:
+        safe_update_log(f"❌ Could not write trace file: {e}", None)
+
+def auto_sync():
+    """
+    This function is executed if setup is complete.
+    It performs the following steps:
+      1. Ensures that the vault has at least one commit (creating an initial commit if necessary, 
+         including generating a placeholder file if the vault is empty).
+      2. Checks network connectivity.
+         - If online, it fetches origin/main once and compares it with the local branch
+           (pushing the initial commit if the remote branch does not exist yet).
+         - If offline, it skips remote operations.
+      3. If the remote has new commits, merges the fetched origin/main (predicting conflicts
+         in memory and prompting for resolution if required) and updates only the changed
+         paths in the vault, leaving uncommitted local edits in place.
+      4. Opens Obsidian for editing and waits until it is closed.
+      5. Upon Obsidian closure, stages and commits any changes.
+      6. If online, fetches once more (unless the last fetch is only seconds old)
+         and merges any new remote commits.
+      7. Pushes only if the local branch is ahead of origin/main.
+      8. Displays a final synchronization completion message.
+    Every configured vault is synced (see sync_vaults): steps 1-3 and 5-8 run for
+    the vaults in parallel, around a single Obsidian session. The session runs in
+    a background thread, which is returned.
+    """
+    vault_paths = configured_vault_paths()
+    obsidian_path = config_data["OBSIDIAN_PATH"]
+
+    if not vault_paths or not obsidian_path:
+        safe_update_log("Vault path or Obsidian path not set. Please run setup again.", 0)
+        return None
+
+    thread = threading.Thread(target=sync_vaults, args=(vault_paths, obsidian_path), daemon=True)
+    thread.start()
+    return thread
+
+def configured_vault_paths():
+    """
+    Returns the vault folders to sync: every [vault:NAME] section, or VAULT_PATH.
+    """
+    paths = [path for _, path in get_vaults()]
+    if not paths and config_data["VAULT_PATH"]:
+        paths = [config_data["VAULT_PATH"]]
+    return paths
+
+def vault_label(vault_path):
+    """
+    Returns the name a vault is shown under: its [vault:NAME] section, or its folder name.
+    """
+    target = os.path.abspath(vault_path)
+    for name, path in get_vaults():
+        if os.path.abspath(path) == target:
+            return name
+    return vault_name(vault_path)
+
+def vault_labels(vault_paths):
+    """
+    Returns {vault_path: label} with distinct labels; vaults sharing a folder
+    name are numbered ("Notes", "Notes (2)").
+    """
+    labels, seen = {}, {}
+    for path in vault_paths:
+        label = vault_label(path)
+        seen[label] = seen.get(label, 0) + 1
+        labels[path] = label if seen[label] == 1 else f"{label} ({seen[label]})"
+    return labels
+
+MAX_SYNC_WORKERS = 4  # vaults whose git work runs at the same time
+
+# Seconds each step may run before that vault's sync is stopped. Time spent in
+# uninterruptible blocks (conflict dialogs, work tree updates) does not count.
+STEP_DEADLINES = {
+    "Step 1: ensure commit": 120.0,
+    "Step 2: check remote": 300.0,
+    "Step 3: pull": 600.0,
+    "Step 5: commit": 300.0,
+    "Step 6: pull again": 600.0,
+    "Step 7: push": 600.0,
+}
+
+active_sync = None  # the SyncEngine that is running, if any (see cancel_sync)
+
+def sync_vault(vault_path, obsidian_path=None):
+    """
+    Runs one sync session for a single vault (the steps listed in auto_sync) and
+    blocks until it is finished. With obsidian_path=None, Obsidian is not opened
+    and the session only pulls, commits and pushes (headless sync).
+    Returns True if the session completed, False if it stopped on an error.
+    """
+    return sync_vaults([vault_path], obsidian_path)[vault_path]
+
+def sync_vaults(vault_paths, obsidian_path=None, max_workers=None):
+    """
+    Runs one sync session over several vaults and blocks until it is finished
+    (see SyncEngine). Returns {vault_path: True if that vault completed}.
+    """
+    return SyncEngine(vault_paths, obsidian_path, max_workers).run()
+
+def cancel_sync(reason="Sync cancelled."):
+    """
+    Stops the running sync session, if any (Cancel button, SIGTERM).
+    Safe to call from any thread. Returns True if a session was running.
+    """
+    engine = active_sync
+    if engine is None:
+        return False
+    engine.cancel(reason)
+    return True
+
+class VaultJob:
+    """
+    One vault's pass through the sync engine. Blocking steps run on the engine's
+    worker threads and git commands as asyncio subprocesses; the job enforces
+    STEP_DEADLINES and keeps track of the vault's running child processes so
+    cancel() can stop them.
+    """
+
+    def __init__(self, engine, vault_path, label):
+        self.engine = engine
+        self.vault_path = vault_path
+        self.label = label
+        self.session = get_git_session(vault_path)
+        self.cancel_reason = None
+        self._procs = set()
+        self._shield_depth = 0
+        self._shield_started = 0.0
+        self._shielded_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """
+        Raises SyncCancelled if the job was cancelled, except inside an uninterruptible block.
+        """
+        with self._lock:
+            if self.cancel_reason is not None and not self._shield_depth:
+                raise SyncCancelled(self.cancel_reason)
+
+    def cancel(self, reason):
+        """
+        Marks the job as cancelled and sends SIGTERM to its running commands,
+        unless an uninterruptible block is running. Safe to call from any thread.
+        """
+        with self._lock:
+            if self.cancel_reason is None:
+                self.cancel_reason = reason
+            procs = [] if self._shield_depth else list(self._procs)
+        for proc in procs:
+            stop_process(proc)
+
+    def track(self, proc):
+        with self._lock:
+            self._procs.add(proc)
+
+    def untrack(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    def shield(self, active):
+        """
+        Enters (active=True) or leaves an uninterruptible block.
+        """
+        with self._lock:
+            if active:
+                if not self._shield_depth:
+                    self._shield_started = time.monotonic()
+                self._shield_depth += 1
+            else:
+                self._shield_depth -= 1
+                if not self._shield_depth:
+                    self._shielded_seconds += time.monotonic() - self._shield_started
+
+    def _shield_state(self):
+        with self._lock:
+            ongoing = time.monotonic() - self._shield_started if self._shield_depth else 0.0
+            return self._shielded_seconds + ongoing, self._shield_depth > 0
+
+    def run(self, func, *args):
+        """
+        Runs a blocking function on a worker thread, with this job's log label and
+        cancel tracking. Returns an asyncio future.
+        """
+        import asyncio
+        return asyncio.get_running_loop().run_in_executor(self.engine.executor, self._call, func, args)
+
+    def _call(self, func, args):
+        _job_context.job = self
+        try:
+            with VaultLogContext(self.label):
+                return func(*args)
+        finally:
+            _job_context.job = None
+
+    async def command(self, args, remote=False):
+        """
+        Runs a git command in the vault as an asyncio subprocess.
+        """
+        if remote:
+            result = await self.session.remote_async(args, job=self)
+        else:
+            result = await self.session.run_async(args, job=self)
+        self.check()  # a command stopped by cancel() reports the cancel, not its own failure
+        return result
+
+    async def step(self, name, awaitable):
+        """
+        Awaits one pipeline step under its STEP_DEADLINES entry. When the deadline
+        passes, the job is cancelled and the step is left to unwind, so none of the
+        vault's commands are still running when SyncCancelled reaches the caller.
+        """
+        import asyncio
+        try:
+            self.check()
+        except SyncCancelled:
+            awaitable.close()  # the step's coroutine never started
+            raise
+        deadline = STEP_DEADLINES[name]
+        task = asyncio.ensure_future(awaitable)
+        with tracer.span(name, "step", vault=self.label) if tracer.enabled else _NULL_SPAN:
+            started = time.monotonic()
+            shielded_before, _ = self._shield_state()
+            while not task.done():
+                shielded, in_shield = self._shield_state()
+                left = deadline - (time.monotonic() - started - (shielded - shielded_before))
+                if left <= 0 and not in_shield:
+                    self.cancel(f"{name} did not finish within {deadline:g} s.")
+                    await asyncio.wait({task})
+                    break
+                await asyncio.wait({task}, timeout=min(max(left, 0.05), 1.0))
+            return task.result()
+
+class SyncEngine:
+    """
+    Runs one sync session over one or more vaults on an asyncio event loop.
+
+    Each vault's steps run in order as coroutines: blocking work goes to a
+    thread pool and git commit/fetch/push run through asyncio subprocesses.
+    Within a vault, the network probe runs while the local repository is
+    checked; different vaults overlap each other, up to max_workers at a time.
+    Obsidian is opened once, after every vault has been pulled.
+
+    cancel() (Cancel button, SIGTERM, Ctrl+C) stops the session from any thread.
+    Running commands are stopped with SIGTERM, but uninterruptible blocks such
+    as a work tree update are finished first, so the vault is never left
+    half-updated.
+    """
+
+    def __init__(self, vault_paths, obsidian_path=None, max_workers=None):
+        self.vault_paths = list(vault_paths)
+        self.obsidian_path = obsidian_path
+        self.workers = max(1, min(max_workers or MAX_SYNC_WORKERS, len(self.vault_paths)))
+        self.cancel_reason = None
+        self.executor = None
+        self._jobs = []
+        self._loop = None
+        self._cancelled = None  # asyncio.Event, created on the loop
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_reason is not None
+
+    def run(self):
+        """
+        Runs the session to the end and returns {vault_path: True if that vault completed}.
+        """
+        global active_sync
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        tracing = get_config("TRACE")
+        if tracing:
+            tracer.start()
+        start_ssh_multiplexing()
+        # Two threads per vault: a step can run next to the vault's network probe.
+        self.executor = ThreadPoolExecutor(max_workers=2 * self.workers, thread_name_prefix="vault-sync")
+        active_sync = self
+        try:
+            with tracer.span("sync session", "session", vaults=len(self.vault_paths)):
+                return asyncio.run(self._main())
+        finally:
+            active_sync = None
+            self.executor.shutdown(wait=True)
+            stop_ssh_multiplexing()
+            close_git_sessions()
+            if tracing:
+                tracer.stop()
+                export_sync_trace()
+
+    def cancel(self, reason="Sync cancelled."):
+        """
+        Stops the session. Safe to call from any thread (or a signal handler).
+        """
+        with self._lock:
+            if self.cancel_reason is None:
+                self.cancel_reason = reason
+            jobs = list(self._jobs)
+            loop = self._loop
+        for job in jobs:
+            job.cancel(reason)
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._cancelled.set)
+            except RuntimeError:
+                pass  # the loop has already finished
+
+    async def _main(self):
+        import asyncio
+        labelled = len(self.vault_paths) > 1
+        labels = vault_labels(self.vault_paths) if labelled else dict.fromkeys(self.vault_paths)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._cancelled = asyncio.Event()
+            self._jobs = [VaultJob(self, path, labels[path]) for path in self.vault_paths]
+        if self.cancelled:
+            self.cancel(self.cancel_reason)
+        self._install_signal_handlers()
+        slots = asyncio.Semaphore(self.workers)
+
+        async def run(job, phase, *args):
+            async with slots:
+                with VaultLogContext(job.label):
+                    try:
+                        return await phase(job, *args)
+                    except SyncCancelled as e:
+                        safe_update_log(f"⏹ Sync stopped: {e} The vault was left in a consistent state; "
+                                        "the remaining changes will be synced next time.", None)
+                    except Exception as e:
+                        safe_update_log(f"❌ Unexpected error: {e}", None)
+                    return False
+
+        pulled = await asyncio.gather(*(run(job, pull_vault_changes) for job in self._jobs))
+        active = [job for job, ok in zip(self._jobs, pulled) if ok]
+
+        prefetchers = {}
+        if self.obsidian_path is None:
+            safe_update_log("Headless sync: Obsidian will not be opened.", 40)
+        elif active and not self.cancelled:
+            prefetchers = await self._obsidian_session(active, labels)
+            if prefetchers is None:
+                return dict.fromkeys(self.vault_paths, False)
+
+        pushed = await asyncio.gather(*(run(job, push_vault_changes, self.obsidian_path,
+                                            prefetchers.get(job.vault_path)) for job in active))
+
+        results = dict.fromkeys(self.vault_paths, False)
+        results.update((job.vault_path, ok) for job, ok in zip(active, pushed))
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, queue_unpushed_vaults, self.vault_paths)
+        except Exception as e:
+            safe_update_log(f"Could not update the push queue: {e}", None)
+        if labelled:
+            safe_update_log(f"Synchronized {sum(results.values())} of {len(results)} vault(s).", None)
+        return results
+
+    def _install_signal_handlers(self):
+        """
+        Turns SIGTERM and Ctrl+C into cancel() while the loop runs on the main
+        thread (headless runs). Not available on Windows, where Ctrl+C still
+        raises KeyboardInterrupt.
+        """
+        import asyncio
+        import signal
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.cancel, f"Received {sig.name}.")
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    async def _obsidian_session(self, jobs, labels):
+        """
+        Step 4 for all vaults at once: waits until Obsidian is closed or the sync
+        is cancelled. Returns {vault_path: RemotePrefetcher}, or None if Obsidian
+        could not be started or its session could not be followed (then nothing
+        may be committed, as Obsidian could still be open).
+        """
+        import asyncio
+        vault_paths = [job.vault_path for job in jobs]
+        with tracer.span("Step 4: Obsidian session", "step"):
+            session = open_obsidian_session(self.obsidian_path, vault_paths, labels)
+            if session is None:
+                return None
+            obsidian_proc, live_syncs, prefetchers = session
+            closed = self._wait_in_thread(wait_for_obsidian_exit, obsidian_proc)
+            cancelled = asyncio.ensure_future(self._cancelled.wait())
+            await asyncio.wait({closed, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+            cancelled.cancel()
+            failure = closed.exception() if closed.done() else None
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, close_obsidian_session, vault_paths, labels, live_syncs, prefetchers)
+        if failure is not None:
+            safe_update_log(f"❌ Could not wait for Obsidian to close: {failure}. Stopping the sync so nothing is "
+                            "committed while Obsidian may still be open; your changes will be synced next time.", None)
+            return None
+        return prefetchers
+
+    def _wait_in_thread(self, func, *args):
+        """
+        Runs func on a daemon thread and returns a future for its result. Used for
+        waits that cannot be interrupted (Obsidian staying open), so a cancelled
+        session does not wait for them on exit.
+        """
+        loop = self._loop
+        future = loop.create_future()
+
+        def settle(method, value):
+            if not future.done():
+                method(value)
+
+        def target():
+            try:
+                result = func(*args)
+            except BaseException as e:
+                outcome = (future.set_exception, e)
+            else:
+                outcome = (future.set_result, result)
+            try:
+                loop.call_soon_threadsafe(settle, *outcome)
+            except RuntimeError:
+                pass  # the loop has already finished
+
+        threading.Thread(target=target, daemon=True).start()
+        return future
+
+def open_obsidian_session(obsidian_path, vault_paths, labels):
+    """
+    Launches Obsidian and starts live sync and prefetching for each vault as
+    configured. Returns (obsidian_process, live_syncs, prefetchers), or None if
+    Obsidian could not be started.
+    """
+    safe_update_log("Launching Obsidian. Please edit your vault and close Obsidian when finished.", 40)
+    try:
+        obsidian_proc = open_obsidian(obsidian_path)
+    except Exception as e:
+        safe_update_log(f"Error launching Obsidian: {e}", 40)
+        return None
+    live_syncs = {}
+    prefetchers = {}
+    for vault_path in vault_paths:
+        with VaultLogContext(labels[vault_path]):
+            if get_config("LIVE_SYNC", vault_path):
+                live_syncs[vault_path] = LiveSync(vault_path,
+                                                  debounce=get_config("LIVE_SYNC_DEBOUNCE", vault_path),
+                                                  max_latency=get_config("LIVE_SYNC_MAX_LATENCY", vault_path))
+                live_syncs[vault_path].start()
+            if get_config("PREFETCH", vault_path):
+                prefetchers[vault_path] = RemotePrefetcher(vault_path, interval=get_config("PREFETCH_INTERVAL", vault_path))
+                prefetchers[vault_path].start()
+    safe_update_log("Waiting for Obsidian to close...", 45)
+    return obsidian_proc, live_syncs, prefetchers
+
+def close_obsidian_session(vault_paths, labels, live_syncs, prefetchers):
     """
-    Re-tests the SSH connection in a background thread.
-    If successful, automatically performs an initial commit/push if none exists yet.
+    Stops the live sync and prefetch threads started by open_obsidian_session().
     """
-    def _test_thread():
-        safe_update_log("Re-testing SSH connection to GitHub...", 35)
-        ensure_github_known_host()  # ensures no prompt for 'yes/no'
+    for vault_path in vault_paths:
+        with VaultLogContext(labels[vault_path]):
+            if vault_path in prefetchers:
+                prefetchers[vault_path].stop()
+                safe_update_log(prefetchers[vault_path].describe(), 50)
+            if vault_path in live_syncs:
+                live_syncs[vault_path].stop()
+                safe_update_log(f"Live sync made {live_syncs[vault_path].commits} commit(s) during this session. Running final flush...", 50)
 
-        if test_ssh_connection_sync():
-            safe_update_log("SSH connection successful!", 40)
-            
-            # Perform the initial commit/push if there are no local commits yet
-            perform_initial_commit_and_push(config_data["VAULT_PATH"])
+async def pull_vault_changes(job):
+    """
+    Steps 1-3 for one vault. The network probe of step 2 runs while step 1
+    checks the local repository. Returns False if the vault cannot be synced.
+    """
+    import asyncio
+    session, vault_path = job.session, job.vault_path
 
-            # Mark setup as done
-            config_data["SETUP_DONE"] = "1"
-            save_config()
+    # Step 1: Ensure a local commit exists
+    async def ensure_commit():
+        await job.run(install_merge_driver, vault_path)
+        if await job.run(session.resolve, "HEAD") is not None:
+            safe_update_log("Local repository already contains commits.", 5)
+            return True
+        safe_update_log("No existing commits found in your vault. Verifying if the vault is empty...", 5)
+        await job.run(ensure_placeholder_file, vault_path)
+        safe_update_log("Creating an initial commit to initialize the repository...", 5)
+        await job.command(["git", "add", "-A"])
+        out_commit, err_commit, rc_commit = await job.command(["git", "commit", "-m", "Initial commit (auto-sync)"])
+        if rc_commit != 0:
+            safe_update_log(f"❌ Error creating initial commit: {err_commit}", 5)
+            return False
+        safe_update_log("Initial commit created successfully.", 5)
+        return True
 
-            safe_update_log("Setup complete! You can now close this window or start sync.", 100)
+    # Step 2: Check network connectivity and fetch origin/main once
+    async def check_remote(network_available):
+        if not network_available:
+            safe_update_log("No internet connection detected. Skipping remote sync operations and proceeding in offline mode.", 10)
+            return None
+        safe_update_log("Internet connection detected. Fetching the latest state from GitHub...", 10)
+        fetched = await job.command(["git", "fetch", "origin", "main"], remote=True)
+        if fetched[2] == 0:
+            session.last_fetch = time.monotonic()
+        plan = await job.run(plan_from_fetch, session, fetched)
+        if not plan.remote_reachable:
+            safe_update_log(f"❌ Unable to reach GitHub: {plan.error}. Proceeding in offline mode.", 10)
+            return None
+        if not plan.remote_exists:
+            safe_update_log("Remote branch 'main' not found. Pushing initial commit to create the remote branch...", 10)
+            out_push, err_push, rc_push = await job.command(["git", "push", "-u", "origin", "main"], remote=True)
+            if rc_push != 0:
+                safe_update_log(f"❌ Error pushing initial commit: {err_push}", 15)
+                return None
+            safe_update_log("Initial commit has been successfully pushed to GitHub.", 15)
         else:
-            safe_update_log("SSH connection still failed. Check your GitHub key or generate a new one.", 40)
+            safe_update_log(f"Remote branch 'main' found ({plan.behind} new remote commit(s), {plan.ahead} local commit(s) not yet pushed).", 10)
+        return plan
 
-    threading.Thread(target=_test_thread, daemon=True).start()
+    # Step 3: If the remote moved, apply the remote commits. Uncommitted local edits
+    # stay in place; only the paths changed remotely are rewritten.
+    async def pull(plan):
+        if plan is not None and plan.needs_pull:
+            safe_update_log("Applying the latest updates from GitHub...", 20)
+            await job.run(integrate_remote_changes, session, plan, 30)
+        elif plan is not None:
+            safe_update_log("Your vault is already up to date with GitHub. Skipping pull.", 30)
+        else:
+            safe_update_log("Skipping pull operation due to offline mode.", 20)
 
+    committed, network_available = await asyncio.gather(
+        job.step("Step 1: ensure commit", ensure_commit()), job.run(is_network_available, vault_path))
+    if not committed:
+        return False
+    plan = await job.step("Step 2: check remote", check_remote(network_available))
+    await job.step("Step 3: pull", pull(plan))
+    return True
 
-def perform_initial_commit_and_push(vault_path):
+async def push_vault_changes(job, obsidian_path, prefetcher):
     """
-    Checks if the local repository has any commits.
-    If not, creates an initial commit and pushes it to the remote 'origin' on the 'main' branch.
+    Steps 5-8 for one vault. Returns True if the vault is fully synced.
     """
-    out, err, rc = run_command("git rev-parse HEAD", cwd=vault_path)
-    if rc != 0:
-        # rc != 0 implies 'git rev-parse HEAD' failed => no commits (unborn branch)
-        safe_update_log("No local commits detected. Creating initial commit...", 50)
+    session, vault_path = job.session, job.vault_path
 
-        # Stage all files
-        run_command("git add .", cwd=vault_path)
+    # Step 5: Commit changes after Obsidian closes. Committing first leaves a clean
+    # work tree, so new remote changes can be applied without stashing. The file
+    # state index tells what changed: nothing (git is not run at all) or which
+    # paths to stage. Only without it does 'git add -A' scan the whole vault.
+    async def commit():
+        safe_update_log("Obsidian has been closed. Committing any local changes..." if obsidian_path else "Committing any local changes...", 50)
+        changes = await job.run(detect_work_tree_changes, session)
+        if changes.clean:
+            safe_update_log("No changes detected during this session. Nothing to commit.", 55)
+            await job.run(record_file_state, session, changes)
+            return True
+        if changes.paths is None or not await job.run(session.stage_paths, changes.paths):
+            await job.command(["git", "add", "-A"])
+        out, err, rc = await job.command(["git", "commit", "-m", "Auto sync commit"])
+        if rc != 0 and "nothing to commit" in (out + err).lower():
+            safe_update_log("No changes detected during this session. Nothing to commit.", 55)
+        elif rc != 0:
+            safe_update_log(f"❌ Commit operation failed: {err}", 55)
+            return False
+        else:
+            safe_update_log("Local changes have been committed successfully.", 55)
+            for line in await job.run(session.diff_tree, "HEAD"):
+                safe_update_log(f"✓ {line}", None)
+        await job.run(record_file_state, session, changes)
+        return True
 
-        # Commit
-        out_commit, err_commit, rc_commit = run_command('git commit -m "Initial commit"', cwd=vault_path)
-        if rc_commit == 0:
-            # Push and set upstream
-            out_push, err_push, rc_push = run_command("git push -u origin main", cwd=vault_path)
-            if rc_push == 0:
-                safe_update_log("Initial commit pushed to remote repository successfully.", 60)
+    # Step 6: Fetch once more (unless step 2 or a prefetch just did, as in a headless
+    # sync without an Obsidian session) and apply any remote changes made while
+    # Obsidian was open; their objects are usually already downloaded.
+    # Returns (ok, plan); plan is None when offline.
+    async def pull_again():
+        if not await job.run(is_network_available, vault_path):
+            return True, None
+        ages = [time.monotonic() - session.last_fetch] if session.last_fetch is not None else []
+        if prefetcher is not None and prefetcher.last_fetch_age() is not None:
+            ages.append(prefetcher.last_fetch_age())
+        fresh = bool(ages) and min(ages) < PREFETCH_FRESHNESS
+        fetched = None if fresh else await job.command(["git", "fetch", "origin", "main"], remote=True)
+        plan = await job.run(plan_from_fetch, session, fetched)
+        if not plan.remote_reachable:
+            safe_update_log(f"❌ Unable to reach GitHub: {plan.error}", 60)
+            return True, None
+        if plan.needs_pull:
+            safe_update_log("Applying new updates from GitHub before pushing...", 60)
+            if not await job.run(integrate_remote_changes, session, plan, 60):
+                safe_update_log("Push skipped because the remote changes could not be applied. Your changes remain committed locally.", 70)
+                return False, None
+            plan = await job.run(plan_from_fetch, session, None)
+        return True, plan
+
+    # Step 7: Push if anything is ahead of origin/main
+    async def push(plan):
+        if plan is None:
+            safe_update_log("Offline mode: Changes have been committed locally. They will be automatically pushed when an internet connection is available.", 70)
+            return True
+        if not plan.needs_push:
+            safe_update_log("No new commits to push.", 70)
+            return True
+        safe_update_log("Pushing all unpushed commits to GitHub...", 65)
+        for line in (await job.run(get_unpushed_commits, vault_path)).splitlines():
+            safe_update_log(f"↑ {line}", None)
+        out, err, rc = await job.command(["git", "push", "origin", "main"], remote=True)
+        if rc != 0:
+            if is_network_error(err):
+                safe_update_log("❌ Unable to push changes due to network issues. Your changes remain locally committed and will be pushed once connectivity is restored.", 70)
             else:
-                safe_update_log(f"Error pushing initial commit: {err_push}", 60)
-        else:
-            safe_update_log(f"Error committing files: {err_commit}", 60)
-    else:
-        # We already have at least one commit in this repo
-        safe_update_log("Local repository already has commits. Skipping initial commit step.", 50)
+                safe_update_log(f"❌ Push operation failed: {err}", 70)
+            return False
+        safe_update_log("✅ All changes have been successfully pushed to GitHub.", 70)
+        return True
 
+    if not await job.step("Step 5: commit", commit()):
+        return False
+    ok, plan = await job.step("Step 6: pull again", pull_again())
+    if not ok or not await job.step("Step 7: push", push(plan)):
+        return False
 
-# -- SSH Key Generation in Background
+    # Step 8: Final message
+    safe_update_log(f"Synchronization complete ({session.remote_round_trips} remote round trip(s)). You may now close this window.", 100)
+    return True
 
-def generate_ssh_key():
-    """
-    Prompts for the user's email and starts a background thread for SSH key generation.
-    """
-    user_email = simpledialog.askstring(
-        "SSH Key Generation",
-        "Enter your email address for the SSH key:",
-        parent=root
-    )
-    if not user_email:
-        messagebox.showerror("Email Required", "No email address provided. SSH key generation canceled.")
-        return
+# ------------------------------------------------
+# OFFLINE PUSH QUEUE
+# ------------------------------------------------
 
-    threading.Thread(target=generate_ssh_key_async, args=(user_email,), daemon=True).start()
+PUSH_QUEUE_FILE = "push-queue.json"    # in get_config_dir()
+PUSH_QUEUE_LOCK_FILE = "push-queue.lock"
+PUSH_AGENT_PID_FILE = "push-agent.pid"
+PUSH_AGENT_LOCK_FILE = "push-agent.lock"    # locked by the running agent for its lifetime
+PUSH_AGENT_LOG_FILE = "push-agent.log"
+PUSH_RETRY_BASE = 15.0    # seconds before the first retry after a failed push
+PUSH_RETRY_MAX = 1800.0   # longest wait between retries
 
+_push_queue_lock = threading.Lock()
 
-def generate_ssh_key_async(user_email):
+def lock_file(file, blocking=True):
     """
-    Runs in a background thread to:
-      1) Generate an SSH key if it doesn't already exist.
-      2) Copy the public key to the clipboard.
-      3) Show an info dialog on the main thread.
-      4) After the user closes the dialog, open GitHub's SSH settings in the browser.
+    Takes an exclusive lock on a file opened in binary mode: flock() on POSIX,
+    msvcrt.locking() of its first byte on Windows. The lock is held by this
+    open file, so another open of the same file conflicts with it even in the
+    same process. With blocking=False, returns False at once if the lock is
+    held elsewhere.
     """
-    key_path_private = SSH_KEY_PATH.replace("id_rsa.pub", "id_rsa")
-
-    # 1) Generate key if it doesn't exist
-    if not os.path.exists(SSH_KEY_PATH):
-        safe_update_log("Generating SSH key...", 25)
-        out, err, rc = run_command(f'ssh-keygen -t rsa -b 4096 -C "{user_email}" -f "{key_path_private}" -N ""')
-        if rc != 0:
-            safe_update_log(f"SSH key generation failed: {err}", 25)
-            return
-        safe_update_log("SSH key generated successfully.", 30)
-    else:
-        safe_update_log("SSH key already exists. Overwriting is not performed here.", 30)
+    if os.name == "nt":
+        import msvcrt
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                # LK_LOCK gives up after about 10 s; keep waiting
+    import fcntl
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
 
-    # 2) Read the public key and attempt to copy to the clipboard
+def unlock_file(file):
+    """
+    Releases a lock taken with lock_file() and closes the file.
+    """
     try:
-        with open(SSH_KEY_PATH, "r", encoding="utf-8") as key_file:
-            public_key = key_file.read().strip()
-        pyperclip.copy(public_key)
-        # Verify that clipboard contains the expected key
-        copied = pyperclip.paste().strip()
-        if copied != public_key:
-            raise Exception("Clipboard copy failed: content mismatch.")
-        safe_update_log("Public key successfully copied to clipboard.", 35)
-    except Exception as e:
-        safe_update_log(f"Error copying SSH key to clipboard: {e}", 35)
-        # 3) Fallback: show a dialog with manual instructions and the public key
-        messagebox.showinfo(
-            "Manual SSH Key Copy Required",
-            "Automatic copying of your SSH key failed.\n\n"
-            "Please open a terminal and run:\n\n"
-            "   cat ~/.ssh/id_rsa.pub\n\n"
-            "Then copy the output manually and add it to your GitHub account."
-        )
+        if os.name == "nt":
+            import msvcrt
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        # POSIX: closing the file releases the flock.
+    finally:
+        file.close()
 
-    # 4) Show final info dialog and open GitHub's SSH keys page
-    def show_dialog_then_open_browser():
-        messagebox.showinfo(
-            "SSH Key Generated",
-            "Your SSH key has been generated and copied to the clipboard (if successful).\n\n"
-            "If automatic copying failed, please manually copy the key as described.\n\n"
-            "Click OK to open GitHub's SSH keys page to add your key."
-        )
-        webbrowser.open("https://github.com/settings/keys")
-    
-    root.after(0, show_dialog_then_open_browser)
+class push_queue_lock:
+    """
+    Serializes read-modify-write cycles of the push queue between threads and
+    between processes (the window and the push agent), with an exclusive lock
+    on push-queue.lock (see lock_file).
+    """
+    def __enter__(self):
+        _push_queue_lock.acquire()
+        try:
+            os.makedirs(get_config_dir(), exist_ok=True)
+            self.file = open(os.path.join(get_config_dir(), PUSH_QUEUE_LOCK_FILE), "a+b")
+        except OSError:
+            _push_queue_lock.release()
+            raise
+        try:
+            lock_file(self.file)
+        except BaseException:
+            self.file.close()
+            _push_queue_lock.release()
+            raise
+        return self
 
+    def __exit__(self, *exc):
+        try:
+            unlock_file(self.file)
+        finally:
+            _push_queue_lock.release()
+        return False
 
-def copy_ssh_key():
+def load_push_queue():
     """
-    Copies the SSH key to clipboard and opens GitHub SSH settings.
+    Returns {vault_path: entry} for vaults with commits waiting to be pushed.
+    An entry records when the vault was queued and the last push error.
     """
-    if os.path.exists(SSH_KEY_PATH):
-        with open(SSH_KEY_PATH, "r", encoding="utf-8") as key_file:
-            ssh_key = key_file.read().strip()
-            pyperclip.copy(ssh_key)
-        webbrowser.open("https://github.com/settings/keys")
-        messagebox.showinfo("SSH Key Copied",
-                            "Your SSH key has been copied to the clipboard.\n"
-                            "Paste it into GitHub.")
-    else:
-        messagebox.showerror("Error", "No SSH key found. Generate one first.")
+    import json
+    try:
+        with open(os.path.join(get_config_dir(), PUSH_QUEUE_FILE), encoding="utf-8") as f:
+            return json.load(f).get("vaults", {})
+    except (OSError, ValueError):
+        return {}
 
-# ------------------------------------------------
-# AUTO-SYNC (Used if SETUP_DONE=1)
-# ------------------------------------------------
+def update_push_queue(add=(), remove=(), error=None):
+    """
+    Adds and removes vaults in the persistent push queue. The file is re-read
+    first, under push_queue_lock, so concurrent writers (the window and the
+    push agent) keep each other's entries, and written atomically. Returns the
+    new queue.
+    """
+    import json
+    with push_queue_lock():
+        vaults = load_push_queue()
+        before = json.dumps(vaults, sort_keys=True)
+        for vault_path in add:
+            entry = vaults.setdefault(os.path.abspath(vault_path), {"queued_at": round(time.time())})
+            if error is not None:
+                entry["last_error"] = error
+        for vault_path in remove:
+            vaults.pop(os.path.abspath(vault_path), None)
+        if json.dumps(vaults, sort_keys=True) == before:
+            return vaults
+        write_file_atomically(os.path.join(get_config_dir(), PUSH_QUEUE_FILE),
+                              lambda f: json.dump({"vaults": vaults}, f, indent=2))
+    return vaults
 
-def auto_sync():
+def queue_unpushed_vaults(vault_paths):
     """
-    This function is executed if setup is complete.
-    It performs the following steps:
-      1. Ensures that the vault has at least one commit (creating an initial commit if necessary, 
-         including generating a placeholder file if the vault is empty).
-      2. Checks network connectivity.
-         - If online, it verifies that the remote branch ('main') exists (pushing the initial commit if needed)
-           and pulls the latest updates from GitHub (using rebase and prompting for conflict resolution if required).
-         - If offline, it skips remote operations.
-      3. Stashes any local changes before pulling.
-      4. Reapplies stashed changes.
-      5. Opens Obsidian for editing and waits until it is closed.
-      6. Upon Obsidian closure, stages and commits any changes.
-      7. If online, pushes any unpushed commits to GitHub.
-      8. Displays a final synchronization completion message.
+    Called at the end of a sync session: queues the vaults that still have commits
+    GitHub does not have ('git log origin/main..HEAD' is not empty), removes the
+    others, and starts the push agent if anything is waiting.
     """
-    vault_path = config_data["VAULT_PATH"]
-    obsidian_path = config_data["OBSIDIAN_PATH"]
+    waiting, done = [], []
+    for vault_path in vault_paths:
+        session = get_git_session(vault_path)
+        has_upstream = session.resolve("origin/main") is not None
+        (waiting if has_upstream and session.unpushed_commits() else done).append(vault_path)
+    queue = update_push_queue(add=waiting, remove=done)
+    if queue and get_config("PUSH_AGENT"):
+        start_push_agent()
 
-    if not vault_path or not obsidian_path:
-        safe_update_log("Vault path or Obsidian path not set. Please run setup again.", 0)
+def push_agent_running():
+    """
+    Returns True while a push agent runs. The agent holds the lock on
+    push-agent.lock for its lifetime and the OS drops it when the agent exits,
+    however it exits, so the lock is tried without waiting; the pid file is
+    only informational (it can be stale, or name a pid reused by another
+    process).
+    """
+    try:
+        lock = open(os.path.join(get_config_dir(), PUSH_AGENT_LOCK_FILE), "a+b")
+    except OSError:
+        return False
+    if lock_file(lock, blocking=False):
+        unlock_file(lock)
+        return False
+    lock.close()
+    return True
+
+def start_push_agent():
+    """
+    Starts 'Ogresync push-agent' as a detached background process, unless one is
+    already running. It outlives this window and exits once the queue is empty.
+    If two sessions start an agent at the same time, the one that does not get
+    push-agent.lock exits at once (see run_push_agent).
+    """
+    if push_agent_running():
         return
+    if getattr(sys, "frozen", False):
+        args = [sys.executable, "push-agent"]
+    else:
+        args = [sys.executable, os.path.abspath(__file__), "push-agent"]
+    os.makedirs(get_config_dir(), exist_ok=True)
+    options = {}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    with open(os.path.join(get_config_dir(), PUSH_AGENT_LOG_FILE), "a", encoding="utf-8") as log:
+        subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=log, stderr=log, close_fds=True, **options)
+    safe_update_log("Unpushed commits will be pushed in the background as soon as GitHub is reachable.", None)
 
-    def sync_thread():
-        # Step 1: Ensure a local commit exists
-        out, err, rc = run_command("git rev-parse HEAD", cwd=vault_path)
-        if rc != 0:
-            safe_update_log("No existing commits found in your vault. Verifying if the vault is empty...", 5)
-            ensure_placeholder_file(vault_path)
-            safe_update_log("Creating an initial commit to initialize the repository...", 5)
-            run_command("git add -A", cwd=vault_path)
-            out_commit, err_commit, rc_commit = run_command('git commit -m "Initial commit (auto-sync)"', cwd=vault_path)
-            if rc_commit == 0:
-                safe_update_log("Initial commit created successfully.", 5)
-            else:
-                safe_update_log(f"❌ Error creating initial commit: {err_commit}", 5)
-                return
-        else:
-            safe_update_log("Local repository already contains commits.", 5)
+class ConnectivityWatcher:
+    """
+    Reports changes to the network configuration: links going up or down and
+    addresses or routes being added or removed. On Linux it listens on a netlink
+    route socket; elsewhere wait() just sleeps, and callers rely on periodic
+    reachability probes instead.
+    """
+    # rtnetlink multicast groups (linux/rtnetlink.h)
+    RTMGRP_LINK = 0x1
+    RTMGRP_IPV4_IFADDR = 0x10
+    RTMGRP_IPV4_ROUTE = 0x40
+    RTMGRP_IPV6_IFADDR = 0x100
+    RTMGRP_IPV6_ROUTE = 0x400
+    SETTLE_TIME = 1.0  # changes arrive in bursts (link, address, DHCP route)
 
-        # Step 2: Check network connectivity
-        network_available = is_network_available()
-        if not network_available:
-            safe_update_log("No internet connection detected. Skipping remote sync operations and proceeding in offline mode.", 10)
-        else:
-            safe_update_log("Internet connection detected. Proceeding with remote synchronization.", 10)
-            # Verify remote branch 'main'
-            ls_out, ls_err, ls_rc = run_command("git ls-remote --heads origin main", cwd=vault_path)
-            if not ls_out.strip():
-                safe_update_log("Remote branch 'main' not found. Pushing initial commit to create the remote branch...", 10)
-                out_push, err_push, rc_push = run_command("git push -u origin main", cwd=vault_path)
-                if rc_push == 0:
-                    safe_update_log("Initial commit has been successfully pushed to GitHub.", 15)
-                else:
-                    safe_update_log(f"❌ Error pushing initial commit: {err_push}", 15)
-                    network_available = False
-            else:
-                safe_update_log("Remote branch 'main' found. Proceeding to pull updates from GitHub...", 10)
+    def __init__(self):
+        self._sock = None
+        if sys.platform.startswith("linux"):
+            import socket
+            groups = (self.RTMGRP_LINK | self.RTMGRP_IPV4_IFADDR | self.RTMGRP_IPV4_ROUTE |
+                      self.RTMGRP_IPV6_IFADDR | self.RTMGRP_IPV6_ROUTE)
+            try:
+                sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+                sock.bind((0, groups))
+                sock.setblocking(False)
+                self._sock = sock
+            except (OSError, AttributeError):
+                self._sock = None
 
-        # Step 3: Stash local changes
-        safe_update_log("Stashing any local changes...", 15)
-        run_command("git stash", cwd=vault_path)
+    @property
+    def native(self):
+        return self._sock is not None
 
-        # Step 4: If online, pull the latest updates (with conflict resolution)
-        if network_available:
-            safe_update_log("Pulling the latest updates from GitHub...", 20)
-            out, err, rc = run_command("git pull --rebase origin main", cwd=vault_path)
-            if rc != 0:
-                if "Could not resolve hostname" in err or "network" in err.lower():
-                    safe_update_log("❌ Unable to pull updates due to a network error. Local changes remain safely stashed.", 30)
-                elif "CONFLICT" in (out + err):  # Detect merge conflicts
-                    safe_update_log("❌ A merge conflict was detected during the pull operation.", 30)
-                    # Retrieve the list of conflicting files
-                    conflict_files, _, _ = run_command("git diff --name-only --diff-filter=U", cwd=vault_path)
-                    if not conflict_files.strip():
-                        conflict_files = "Unknown files"
-                    # Prompt user for resolution choice
-                    choice = conflict_resolution_dialog(conflict_files)
-                    if choice == "ours":
-                        safe_update_log("Resolving conflict by keeping local changes...", 30)
-                        run_command("git checkout --ours .", cwd=vault_path)
-                        run_command("git add -A", cwd=vault_path)
-                        rc_rebase, err_rebase, _ = run_command("git rebase --continue", cwd=vault_path)
-                        if rc_rebase != 0:
-                            safe_update_log(f"Error continuing rebase: {err_rebase}", 30)
-                            run_command("git rebase --abort", cwd=vault_path)
-                    elif choice == "theirs":
-                        safe_update_log("Resolving conflict by using remote changes...", 30)
-                        run_command("git checkout --theirs .", cwd=vault_path)
-                        run_command("git add -A", cwd=vault_path)
-                        rc_rebase, err_rebase, _ = run_command("git rebase --continue", cwd=vault_path)
-                        if rc_rebase != 0:
-                            safe_update_log(f"Error continuing rebase: {err_rebase}", 30)
-                            run_command("git rebase --abort", cwd=vault_path)
-                    elif choice == "manual":
-                        safe_update_log("Please resolve the conflicts manually. After resolving, click OK to continue.", 30)
-                        messagebox.showinfo("Manual Merge", "Please resolve the conflicts in the affected files manually and then click OK.")
-                        run_command("git add -A", cwd=vault_path)
-                        rc_rebase, err_rebase, _ = run_command("git rebase --continue", cwd=vault_path)
-                        if rc_rebase != 0:
-                            safe_update_log(f"Error continuing rebase after manual merge: {err_rebase}", 30)
-                            run_command("git rebase --abort", cwd=vault_path)
-                    else:
-                        safe_update_log("No valid conflict resolution chosen. Aborting rebase.", 30)
-                        run_command("git rebase --abort", cwd=vault_path)
-                else:
-                    safe_update_log("Pull operation completed successfully. Your vault is updated with the latest changes from GitHub.", 30)
-                    # Log pulled files
-                    for line in out.splitlines():
-                        safe_update_log(f"✓ Pulled: {line}", 30)
-            else:
-                safe_update_log("Pull operation completed successfully. Your vault is up to date.", 30)
-        else:
-            safe_update_log("Skipping pull operation due to offline mode.", 20)
+    def wait(self, timeout):
+        """
+        Blocks for up to timeout seconds. Returns True if the network
+        configuration changed, False on timeout.
+        """
+        if self._sock is None:
+            time.sleep(max(timeout, 0))
+            return False
+        ready, _, _ = select.select([self._sock], [], [], max(timeout, 0))
+        if not ready:
+            return False
+        deadline = time.monotonic() + self.SETTLE_TIME
+        while True:
+            self._drain()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self._sock], [], [], remaining)[0]:
+                return True
 
-        # Step 5: Reapply stashed changes
-        out, err, rc = run_command("git stash pop", cwd=vault_path)
-        if rc != 0 and "No stash" not in err:
-            if "CONFLICT" in (out + err):
-                safe_update_log("❌ A merge conflict occurred while reapplying stashed changes. Please resolve manually.", 35)
+    def _drain(self):
+        while True:
+            try:
+                self._sock.recv(65536)
+            except OSError:  # BlockingIOError once the socket is empty
                 return
-            else:
-                safe_update_log(f"Stash pop operation failed: {err}", 35)
-                return
-        safe_update_log("Successfully reapplied stashed local changes.", 35)
 
-        # Step 6: Open Obsidian for editing using the helper function
-        safe_update_log("Launching Obsidian. Please edit your vault and close Obsidian when finished.", 40)
-        try:
-            open_obsidian(obsidian_path)
-        except Exception as e:
-            safe_update_log(f"Error launching Obsidian: {e}", 40)
-            return
-        safe_update_log("Waiting for Obsidian to close...", 45)
-        while is_obsidian_running():
-            time.sleep(0.5)
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
 
+def push_queued_vault(vault_path):
+    """
+    One push attempt for a queued vault. Returns "done" (nothing left to push),
+    "offline" (GitHub unreachable), "retry" (push failed on a network error) or
+    "drop" (push rejected; the next full sync has to merge first).
+    """
+    if not is_git_repo(vault_path):
+        return "drop"
+    session = get_git_session(vault_path)
+    if not session.unpushed_commits():
+        return "done"
+    if not is_network_available(vault_path):
+        return "offline"
+    with session.operation_lock:
+        _, err, rc = session.remote(["git", "push", "origin", "main"])
+    if rc == 0:
+        safe_update_log(f"Pushed queued commits of {vault_path} to GitHub.", None)
+        return "done"
+    if is_network_error(err):
+        update_push_queue(add=[vault_path], error=err)
+        return "retry"
+    safe_update_log(f"Push of {vault_path} was rejected ({err}); it will be merged on the next sync.", None)
+    return "drop"
 
-        # Step 7: Pull any new changes from GitHub after Obsidian closes
-        safe_update_log("Obsidian has been closed. Checking for new remote changes before committing...", 50)
+def push_retry_delay(attempts):
+    """
+    Exponential backoff with jitter: between half and all of
+    PUSH_RETRY_BASE * 2^(attempts-1), capped at PUSH_RETRY_MAX, so several
+    machines coming back online do not retry in lockstep.
+    """
+    import random
+    cap = min(PUSH_RETRY_BASE * 2 ** max(attempts - 1, 0), PUSH_RETRY_MAX)
+    return cap / 2 + random.uniform(0, cap / 2)
 
-        # Re-check network connectivity before pulling
-        network_available = is_network_available()
-        if network_available:
-            safe_update_log("Pulling any new updates from GitHub before committing...", 50)
-            out, err, rc = run_command("git pull --rebase origin main", cwd=vault_path)
-            if rc != 0:
-                if "Could not resolve hostname" in err or "network" in err.lower():
-                    safe_update_log("❌ Unable to pull updates due to network error. Continuing with local commit.", 50)
-                elif "CONFLICT" in (out + err):  # Detect merge conflicts
-                    safe_update_log("❌ Merge conflict detected in new remote changes.", 50)
-                    # Retrieve the list of conflicting files
-                    conflict_files, _, _ = run_command("git diff --name-only --diff-filter=U", cwd=vault_path)
-                    if not conflict_files.strip():
-                        conflict_files = "Unknown files"
-                    # Prompt user for conflict resolution
-                    choice = conflict_resolution_dialog(conflict_files)
-                    if choice == "ours":
-                        safe_update_log("Resolving conflict by keeping local changes...", 50)
-                        run_command("git checkout --ours .", cwd=vault_path)
-                        run_command("git add -A", cwd=vault_path)
-                        rc_rebase, err_rebase, _ = run_command("git rebase --continue", cwd=vault_path)
-                        if rc_rebase != 0:
-                            safe_update_log(f"Error continuing rebase: {err_rebase}", 50)
-                            run_command("git rebase --abort", cwd=vault_path)
-                    elif choice == "theirs":
-                        safe_update_log("Resolving conflict by using remote changes...", 50)
-                        run_command("git checkout --theirs .", cwd=vault_path)
-                        run_command("git add -A", cwd=vault_path)
-                        rc_rebase, err_rebase, _ = run_command("git rebase --continue", cwd=vault_path)
-                        if rc_rebase != 0:
-                            safe_update_log(f"Error continuing rebase: {err_rebase}", 50)
-                            run_command("git rebase --abort", cwd=vault_path)
-                    elif choice == "manual":
-                        safe_update_log("Please resolve the conflicts manually. After resolving, click OK to continue.", 50)
-                        messagebox.showinfo("Manual Merge", "Please resolve the conflicts in the affected files manually and then click OK.")
-                        run_command("git add -A", cwd=vault_path)
-                        rc_rebase, err_rebase, _ = run_command("git rebase --continue", cwd=vault_path)
-                        if rc_rebase != 0:
-                            safe_update_log(f"Error continuing rebase after manual merge: {err_rebase}", 50)
-                            run_command("git rebase --abort", cwd=vault_path)
-                    else:
-                        safe_update_log("No valid conflict resolution chosen. Aborting rebase.", 50)
-                        run_command("git rebase --abort", cwd=vault_path)
-                else:
-                    safe_update_log("New remote updates have been successfully pulled.", 50)
-                    # Log pulled files
-                    for line in out.splitlines():
-                        safe_update_log(f"✓ Pulled: {line}", 50)
-        else:
-            safe_update_log("No network detected. Skipping remote check and proceeding with local commit.", 50)
+def run_push_agent(probe_interval=None):
+    """
+    Background push agent ('Ogresync push-agent'). Pushes every queued vault as
+    soon as GitHub is reachable and exits when the queue is empty.
 
-        # Step 8: Commit changes after Obsidian closes
-        safe_update_log("Obsidian has been closed. Committing any local changes...", 50)
-        run_command("git add -A", cwd=vault_path)
-        out, err, rc = run_command('git commit -m "Auto sync commit"', cwd=vault_path)
-        committed = True
-        if rc != 0 and "nothing to commit" in (out + err).lower():
-            safe_update_log("No changes detected during this session. Nothing to commit.", 55)
-            committed = False
-        elif rc != 0:
-            safe_update_log(f"❌ Commit operation failed: {err}", 55)
-            return
-        else:
-            safe_update_log("Local changes have been committed successfully.", 55)
-            commit_details, err_details, rc_details = run_command("git diff-tree --no-commit-id --name-status -r HEAD", cwd=vault_path)
-            if rc_details == 0 and commit_details.strip():
-                for line in commit_details.splitlines():
-                    safe_update_log(f"✓ {line}", None)
-
-        # Step 9: Push changes if network is available
-        network_available = is_network_available()
-        if network_available:
-            unpushed = get_unpushed_commits(vault_path)
-            if unpushed:
-                safe_update_log("Pushing all unpushed commits to GitHub...", 60)
-                out, err, rc = run_command("git push origin main", cwd=vault_path)
-                if rc != 0:
-                    if "Could not resolve hostname" in err or "network" in err.lower():
-                        safe_update_log("❌ Unable to push changes due to network issues. Your changes remain locally committed and will be pushed once connectivity is restored.", 70)
-                    else:
-                        safe_update_log(f"❌ Push operation failed: {err}", 70)
-                    return
-                safe_update_log("✅ All changes have been successfully pushed to GitHub.", 70)
-            else:
-                safe_update_log("No new commits to push.", 70)
-        else:
-            safe_update_log("Offline mode: Changes have been committed locally. They will be automatically pushed when an internet connection is available.", 70)
+    Vaults waiting for the network are re-checked on every connectivity change
+    (netlink on Linux) and at least every probe_interval seconds. A push that
+    fails on a network error is retried with jittered exponential backoff.
+    A vault leaves the queue once 'git log origin/main..HEAD' is empty.
 
-        # Step 9: Final message
-        safe_update_log("Synchronization complete. You may now close this window.", 100)
+    Only one agent runs at a time: it holds push-agent.lock from start to exit,
+    and an agent that cannot take it exits at once.
+    """
+    probe_interval = probe_interval or get_config("PUSH_AGENT_INTERVAL")
+    os.makedirs(get_config_dir(), exist_ok=True)
+    lock = open(os.path.join(get_config_dir(), PUSH_AGENT_LOCK_FILE), "a+b")
+    if not lock_file(lock, blocking=False):
+        lock.close()
+        safe_update_log("Another push agent is already running; exiting.", None)
+        return
+    pid_path = os.path.join(get_config_dir(), PUSH_AGENT_PID_FILE)
 
-    threading.Thread(target=sync_thread, daemon=True).start()
+    def release():
+        if not lock.closed:
+            try:
+                os.remove(pid_path)
+            except OSError:
+                pass
+            unlock_file(lock)
 
+    write_file_atomically(pid_path, lambda f: f.write(str(os.getpid())))
+    watcher = ConnectivityWatcher()
+    safe_update_log(f"Push agent started (pid {os.getpid()}, "
+                    f"{'netlink events + ' if watcher.native else ''}probe every {probe_interval:g} s).", None)
+    attempts = {}    # vault -> failed pushes in a row
+    next_try = {}    # vault -> time.monotonic() of the next attempt
+    try:
+        while True:
+            with push_queue_lock():
+                queue = load_push_queue()
+                if not queue:
+                    # Released under the queue lock: a session that queues a vault
+                    # after this sees no agent running and starts a new one.
+                    release()
+            if not queue:
+                safe_update_log("Push queue is empty; push agent exiting.", None)
+                return
+            now = time.monotonic()
+            finished = []
+            for vault_path in queue:
+                if next_try.get(vault_path, 0) > now:
+                    continue
+                outcome = push_queued_vault(vault_path)
+                if outcome in ("done", "drop"):
+                    finished.append(vault_path)
+                    attempts.pop(vault_path, None)
+                    next_try.pop(vault_path, None)
+                elif outcome == "offline":
+                    next_try[vault_path] = now + probe_interval
+                else:
+                    attempts[vault_path] = attempts.get(vault_path, 0) + 1
+                    delay = push_retry_delay(attempts[vault_path])
+                    next_try[vault_path] = now + delay
+                    safe_update_log(f"Push of {vault_path} failed; retrying in {delay:.0f} s.", None)
+            if finished:
+                update_push_queue(remove=finished)
+                continue
+            wait = min((next_try.get(v, now) for v in queue), default=now) - time.monotonic()
+            if watcher.wait(min(max(wait, 0.0), probe_interval)):
+                # The network changed: forget cached probe results and try everything now.
+                invalidate_network_cache()
+                next_try.clear()
+                attempts.clear()
+            else:
+                invalidate_network_cache()
+    finally:
+        watcher.close()
+        close_git_sessions()
+        release()
 
 # ------------------------------------------------
 # ONE-TIME SETUP WORKFLOW
@@ -888,31 +4957,163 @@ def run_setup_wizard():
     re_test_ssh()
 
    
+# ------------------------------------------------
+# COMMAND LINE (HEADLESS)
+# ------------------------------------------------
+
+def build_arg_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="Ogresync",
+        description="Synchronize an Obsidian vault with GitHub. Run without arguments to open the window.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sync = commands.add_parser("sync", help="pull, commit and push a vault without opening a window")
+    sync.add_argument("--vault", action="append",
+                      help="vault folder; repeat to sync several (default: every vault in ogresync.ini)")
+    sync.add_argument("--workers", type=int, metavar="N",
+                      help=f"vaults synced at the same time (default: {MAX_SYNC_WORKERS})")
+    sync.add_argument("--open-obsidian", action="store_true",
+                      help="open Obsidian (OBSIDIAN_PATH) and wait for it to close before committing")
+    sync.add_argument("--conflict-policy", choices=("ours", "theirs", "abort"),
+                      help="how to resolve conflicting remote changes (default: conflict_policy "
+                           "from ogresync.ini; 'ask' acts as 'abort' without a window)")
+    sync.add_argument("--interval", type=float, metavar="SECONDS",
+                      help="keep running and sync again every SECONDS (for systemd/launchd)")
+    sync.add_argument("--json", action="store_true", help="print log messages as JSON lines")
+    agent = commands.add_parser("push-agent",
+                                help="push queued offline commits as soon as GitHub is reachable, then exit")
+    agent.add_argument("--interval", type=float, metavar="SECONDS",
+                       help="how often to re-check connectivity (default: push_agent_interval from ogresync.ini)")
+    agent.add_argument("--json", action="store_true", help="print log messages as JSON lines")
+    driver = commands.add_parser("merge-driver",
+                                 help="three-way merge of a Markdown note; run by git (see install_merge_driver)")
+    driver.add_argument("base", help="common ancestor version (%%O)")
+    driver.add_argument("current", help="local version, overwritten with the result (%%A)")
+    driver.add_argument("other", help="remote version (%%B)")
+    driver.add_argument("path", nargs="?", help="path of the note in the vault (%%P)")
+    driver.add_argument("--marker-size", type=int, default=MERGE_MARKER_SIZE, help="length of conflict markers (%%L)")
+    return parser
+
+def run_cli(argv):
+    """
+    Headless entry point ('python Ogresync.py sync ...', 'push-agent' or 'merge-driver').
+    Never imports tkinter; conflicts are resolved by the conflict policy instead
+    of a dialog. Returns the process exit code: 0 every vault synced, 1 a sync
+    failed, 2 bad configuration, 130 interrupted (Ctrl+C, SIGTERM).
+    """
+    global console_log_json
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "merge-driver":
+        return run_merge_driver(args.base, args.current, args.other, args.path, args.marker_size)
+    console_log_json = args.json
+    load_config()
+    if args.command == "push-agent":
+        import signal
+        # Exit through the normal cleanup (pid file) when the session ends.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            run_push_agent(args.interval)
+        except KeyboardInterrupt:
+            return 130
+        return 0
+
+    if args.conflict_policy:
+        # The command line wins over the global setting and any per-vault override.
+        config_data["CONFLICT_POLICY"] = args.conflict_policy
+        for section in vault_configs.values():
+            section.pop("CONFLICT_POLICY", None)
+
+    vault_paths = [os.path.abspath(path) for path in args.vault] if args.vault else configured_vault_paths()
+    if not vault_paths:
+        safe_update_log("❌ No vault to sync: pass --vault or complete the setup wizard first.", 0)
+        return 2
+    for vault_path in vault_paths:
+        if not is_git_repo(vault_path):
+            safe_update_log(f"❌ {vault_path} is not a Git repository: pass --vault or complete the setup wizard first.", 0)
+            return 2
+    obsidian_path = None
+    if args.open_obsidian:
+        obsidian_path = config_data["OBSIDIAN_PATH"]
+        if not obsidian_path:
+            safe_update_log("❌ obsidian_path is not set in ogresync.ini.", 0)
+            return 2
+
+    try:
+        while True:
+            engine = SyncEngine(vault_paths, obsidian_path, args.workers)
+            results = engine.run()
+            if engine.cancelled:
+                return 130
+            if not args.interval:
+                return 0 if all(results.values()) else 1
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 130
+
 # ------------------------------------------------
 # MAIN ENTRY POINT
 # ------------------------------------------------
 
 def main():
-    load_config()
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    load_config()  # a few lines of text; only decides which window to build
 
     # If setup is done, run auto-sync in a minimal/no-UI approach
     # But if you still want a log window, we can create a small UI. 
     # We'll do this: if SETUP_DONE=0, show the wizard UI. If =1, show a minimal UI with auto-sync logs.
-    if config_data["SETUP_DONE"] == "1":
+    if get_config("SETUP_DONE"):
         # Already set up: run auto-sync with a minimal window or even no window.
         # If you truly want NO window at all, you can remove the UI entirely.
         # But let's provide a small log window for user feedback.
-        create_minimal_ui(auto_run=True)
-        auto_sync()
+        create_minimal_ui(auto_run=True, vault_names=list(vault_labels(configured_vault_paths()).values()))
+        work = auto_sync
     else:
         # Not set up yet: run the wizard UI
         create_wizard_ui()
-        run_setup_wizard()
+        work = run_setup_wizard
+
+    # SIGTERM (e.g. logging out) stops a running sync cleanly before the window closes.
+    # The log pump runs Python code every few milliseconds, so the handler is not delayed.
+    import signal
+    signal.signal(signal.SIGTERM, lambda signum, frame: close_after_sync("Received SIGTERM."))
 
+    # Paint the window before any slow work (git, network probes, Obsidian detection,
+    # wizard dialogs) starts, so the first thing the user sees is the window.
+    root.update()
+    root.after(0, work)
     root.mainloop()
 
-def create_minimal_ui(auto_run=False):
-    global root, log_text, progress_bar
+def close_after_sync(reason):
+    """
+    Cancels the running sync (if any) and closes the window once it has stopped.
+    """
+    cancel_sync(reason)
+
+    def close_when_idle():
+        if active_sync is not None:
+            root.after(100, close_when_idle)
+        else:
+            root.destroy()
+    root.after(0, close_when_idle)
+
+def on_cancel_clicked():
+    """
+    Cancel button: stops the running sync, or closes the window if none is running.
+    """
+    if cancel_sync("Cancelled by user."):
+        cancel_button.config(state="disabled", text="Cancelling...")
+        safe_update_log("Cancelling: waiting for running git commands to stop...", None)
+    else:
+        root.destroy()
+
+def create_minimal_ui(auto_run=False, vault_names=()):
+    """
+    Creates the small log window used while syncing. With more than one vault,
+    each vault gets its own progress bar and the main bar shows the average.
+    """
+    global root, log_text, progress_bar, cancel_button
+    load_gui_modules()
     root = tk.Tk()
     root.title("Obsidian Sync" if auto_run else "Obsidian Setup")
     root.geometry("500x300")
@@ -926,6 +5127,22 @@ def create_minimal_ui(auto_run=False):
     progress_bar = ttk.Progressbar(root, orient="horizontal", length=450, mode="determinate")
     progress_bar.pack(pady=5)
 
+    vault_progress_bars.clear()
+    if len(vault_names) > 1:
+        vault_frame = tk.Frame(root, bg="#1e1e1e")
+        vault_frame.pack(pady=5)
+        for row, label in enumerate(vault_names):
+            tk.Label(vault_frame, text=label, bg="#1e1e1e", fg="white", anchor="w", width=16).grid(row=row, column=0, padx=5)
+            bar = ttk.Progressbar(vault_frame, orient="horizontal", length=300, mode="determinate")
+            bar.grid(row=row, column=1, padx=5, pady=1)
+            vault_progress_bars[label] = bar
+        root.geometry(f"500x{300 + 24 * len(vault_names)}")
+
+    cancel_button = tk.Button(root, text="Cancel", command=on_cancel_clicked, bg="#ff4444", fg="white", width=12)
+    cancel_button.pack(pady=5)
+    start_log_pump()
+    start_prompt_pump()
+
 
     # If you truly want to hide it, do: root.withdraw()
 
@@ -934,6 +5151,7 @@ def create_wizard_ui():
     Creates a larger UI with wizard-related buttons.
     """
     global root, log_text, progress_bar
+    load_gui_modules()
     root = tk.Tk()
     root.title("Obsidian Sync Setup")
     root.geometry("550x400")
@@ -947,6 +5165,7 @@ def create_wizard_ui():
 
     progress_bar = ttk.Progressbar(root, orient="horizontal", length=500, mode="determinate")
     progress_bar.pack(pady=5)
+    start_log_pump()
 
     # Optional buttons for SSH key generation or copy
     btn_frame = tk.Frame(root, bg="#1e1e1e")
@@ -0,0 +1,42 @@
+"""
+Helpers shared by the benchmark and check scripts. Importing this module puts
+the repository root on sys.path, so a script can 'import Ogresync' after it.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPO_ROOT, "Ogresync.py")
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def git(cwd, *args, env=None):
+    """
+    Runs a git command in cwd and returns its output without surrounding
+    whitespace. env holds variables to set on top of the current environment.
+    A failing command raises RuntimeError with git's error message.
+    """
+    result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, errors="replace",
+                            env={**os.environ, **env} if env else None)
+    if result.returncode != 0:
+        raise RuntimeError(f"'git {' '.join(args)}' failed in {cwd} ({result.returncode}): {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+def wait_until(predicate, timeout, step=0.05):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(step)
+    return predicate()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,146 @@
+"""
+File state index benchmark: time to find out what changed in a vault since
+the last sync, with the file state index versus letting git scan the vault
+('git add -A' followed by 'git commit', the commit step without the index).
+
+For each size a committed vault of notes plus some larger attachments is
+generated. Measured, as the median of --runs:
+
+  - git add -A + commit with nothing to commit (the old no-change path),
+  - the first detection (no index yet: a stat scan) and building the index,
+  - detection with nothing changed,
+  - detection after editing, adding, deleting and only touching a few files,
+
+together with the index size on disk and its load time. The detected
+paths are checked against the edits made.
+
+Usage:
+    python benchmarks/bench_file_state.py [--files 10000,100000] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _util import git
+
+NOTES_PER_FOLDER = 200
+ATTACHMENT_EVERY = 100       # one attachment per this many files
+ATTACHMENT_SIZE = 1024 * 1024
+EDITS = 10
+
+
+def make_vault(tmp, count):
+    vault = os.path.join(tmp, f"vault-{count}")
+    git(tmp, "init", "-q", "-b", "main", vault)
+    for key, val in (("user.name", "bench"), ("user.email", "bench@example.com")):
+        git(vault, "config", key, val)
+    paths = []
+    for i in range(count):
+        folder = os.path.join(vault, f"folder-{i // NOTES_PER_FOLDER:04d}")
+        os.makedirs(folder, exist_ok=True)
+        if i % ATTACHMENT_EVERY == 0:
+            path = os.path.join(folder, f"scan-{i}.pdf")
+            content = os.urandom(64) * (ATTACHMENT_SIZE // 64)
+        else:
+            path = os.path.join(folder, f"note-{i}.md")
+            content = f"# Note {i}\n\nSome text for note {i}.\n".encode()
+        with open(path, "wb") as f:
+            f.write(content)
+        paths.append(os.path.relpath(path, vault).replace(os.sep, "/"))
+    git(vault, "add", "-A")
+    git(vault, "commit", "-q", "-m", "init")
+    age(vault, paths)
+    return vault, paths
+
+
+def age(vault, paths):
+    """Backdates files so their mtimes are not treated as racy."""
+    past = time.time() - 60
+    for path in paths:
+        full = os.path.join(vault, path)
+        if os.path.exists(full):
+            os.utime(full, (past, past))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000.0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", default="10000,100000")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["OGRESYNC_CONFIG_DIR"] = os.path.join(tmp, "config")
+        import Ogresync
+        failures = []
+        for count in (int(n) for n in args.files.split(",")):
+            vault, paths = make_vault(tmp, count)
+            session = Ogresync.GitSession(vault)
+            times = {name: [] for name in ("git", "first", "record", "clean", "edited", "load")}
+
+            def git_scan():
+                subprocess.run(["git", "add", "-A"], cwd=vault, capture_output=True)
+                subprocess.run(["git", "commit", "-m", "nothing"], cwd=vault, capture_output=True)
+
+            for _ in range(args.runs):
+                times["git"].append(timed(git_scan)[0])
+                if os.path.exists(Ogresync.file_state_path(session)):
+                    os.remove(Ogresync.file_state_path(session))
+                elapsed, changes = timed(Ogresync.detect_work_tree_changes, session)
+                times["first"].append(elapsed)
+                times["record"].append(timed(Ogresync.record_file_state, session, changes)[0])
+                elapsed, changes = timed(Ogresync.detect_work_tree_changes, session)
+                times["clean"].append(elapsed)
+                if changes.paths != []:
+                    failures.append(f"{count}: unchanged vault reported {changes.paths and changes.paths[:5]}")
+                times["load"].append(timed(Ogresync.FileStateIndex.load, Ogresync.file_state_path(session))[0])
+
+            # A few edits of each kind; touched files must not be reported.
+            step = len(paths) // (4 * EDITS)
+            edited, touched, deleted = paths[1::step][:EDITS], paths[2::step][:EDITS], paths[3::step][:EDITS]
+            added = [f"new/note-{i}.md" for i in range(EDITS)]
+            os.makedirs(os.path.join(vault, "new"), exist_ok=True)
+            for path in edited:
+                with open(os.path.join(vault, path), "ab") as f:
+                    f.write(b"Edited.\n")
+            for path in touched:
+                os.utime(os.path.join(vault, path))
+            for path in deleted:
+                os.remove(os.path.join(vault, path))
+            for path in added:
+                with open(os.path.join(vault, path), "w", encoding="utf-8") as f:
+                    f.write("New.\n")
+            for _ in range(args.runs):
+                elapsed, changes = timed(Ogresync.detect_work_tree_changes, session)
+                times["edited"].append(elapsed)
+            if changes.paths != sorted(edited + deleted + added):
+                failures.append(f"{count}: edits detected as {changes.paths}")
+            size = os.path.getsize(Ogresync.file_state_path(session))
+            session.close()
+
+            median = {name: statistics.median(values) for name, values in times.items()}
+            print(f"{count} files ({count // ATTACHMENT_EVERY} attachments of {ATTACHMENT_SIZE // 1024} KB), "
+                  f"median of {args.runs}")
+            print(f"  git add -A + commit, nothing changed : {median['git']:8.1f} ms")
+            print(f"  first detection (no index)           : {median['first']:8.1f} ms")
+            print(f"  build and save the index             : {median['record']:8.1f} ms")
+            print(f"  detection, nothing changed           : {median['clean']:8.1f} ms")
+            print(f"  detection, {EDITS} edited/added/deleted, {EDITS} touched: {median['edited']:6.1f} ms")
+            print(f"  index on disk {size / 1024 / 1024:.1f} MB, loaded in {median['load']:.1f} ms")
+
+    for failure in failures:
+        print(f"  ❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
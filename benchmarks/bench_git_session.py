@@ -0,0 +1,72 @@
+"""
+Per-call latency of git read queries: one shell + git process per call
+(run_command) versus answers over the persistent GitSession pipes.
+
+Usage:
+    python benchmarks/bench_git_session.py [--calls 200] [--commits 20]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import _util  # noqa: F401  (puts the repository on sys.path)
+import Ogresync
+
+
+def make_repo(path, commits):
+    subprocess.run(["git", "init", "-q", "-b", "main", path], check=True)
+    for key, val in (("user.name", "bench"), ("user.email", "bench@example.com")):
+        subprocess.run(["git", "config", key, val], cwd=path, check=True)
+    for i in range(commits):
+        with open(os.path.join(path, f"note-{i % 5}.md"), "a", encoding="utf-8") as f:
+            f.write(f"line {i}\n")
+        subprocess.run(["git", "add", "-A"], cwd=path, check=True)
+        subprocess.run(["git", "commit", "-q", "-m", f"commit {i}"], cwd=path, check=True)
+        if i == commits - 4:
+            # Pretend the last three commits have not been pushed yet.
+            subprocess.run(["git", "update-ref", "refs/remotes/origin/main", "HEAD"], cwd=path, check=True)
+
+
+def per_call_ms(func, calls):
+    func()  # warm up (starts the helper processes for the session case)
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) * 1000.0 / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--commits", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as repo:
+        make_repo(repo, args.commits)
+        session = Ogresync.GitSession(repo)
+        cases = [
+            ("rev-parse HEAD",
+             lambda: Ogresync.run_command(["git", "rev-parse", "HEAD"], cwd=repo),
+             lambda: session.resolve("HEAD")),
+            ("is-inside-work-tree",
+             lambda: Ogresync.run_command(["git", "rev-parse", "--is-inside-work-tree"], cwd=repo),
+             session.is_repo),
+            ("diff-tree HEAD",
+             lambda: Ogresync.run_command(["git", "diff-tree", "--no-commit-id", "--name-status", "-r", "HEAD"], cwd=repo),
+             lambda: session.diff_tree("HEAD")),
+            ("log origin/main..HEAD",
+             lambda: Ogresync.run_command(["git", "log", "origin/main..HEAD", "--oneline"], cwd=repo),
+             lambda: session.unpushed_commits("origin/main", "HEAD")),
+        ]
+        print(f"{'query':<24}{'spawn (ms)':>12}{'session (ms)':>14}{'speedup':>10}")
+        for name, spawn, piped in cases:
+            before = per_call_ms(spawn, args.calls)
+            after = per_call_ms(piped, args.calls)
+            print(f"{name:<24}{before:>12.3f}{after:>14.3f}{before / after:>9.1f}x")
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Markdown merge benchmark: how many concurrently edited notes Ogresync's merge
+driver resolves without asking, compared with git's built-in line merge, and
+how many merges per second it handles.
+
+The corpus is synthetic daily notes with YAML frontmatter. Each case applies
+one to three random edits per side, the kind two devices typically make to
+the same note: appending a log line, editing a paragraph, adding a list item,
+adding a tag or bumping a frontmatter key. Some cases edit the same paragraph
+on both sides and are expected to stay conflicts. Clean results are checked
+to contain every line either side added.
+
+Usage:
+    python benchmarks/bench_markdown_merge.py [--cases 2000] [--seed 1]
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _util import SCRIPT
+
+import Ogresync  # noqa: E402
+
+WORDS = ("meeting", "draft", "review", "garden", "invoice", "idea", "call", "notes", "plan", "walk",
+         "book", "refactor", "lunch", "deploy", "sketch", "errand", "backup", "read", "email", "gym")
+
+
+def sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_note(rng, day):
+    tags = rng.sample(WORDS, 2)
+    lines = ["---", f"date: 2026-01-{day:02d}", f"tags: [{', '.join(tags)}]", "updated: 1", "---",
+             f"# 2026-01-{day:02d}", "", "## Tasks"]
+    lines += [f"- [ ] {sentence(rng, 4)}" for _ in range(rng.randint(2, 5))]
+    lines += ["", "## Journal"]
+    for _ in range(rng.randint(3, 6)):
+        lines += ["", sentence(rng, rng.randint(8, 20))]
+    return lines
+
+
+def edit(rng, lines, tag):
+    """Applies one random edit in place."""
+    kind = rng.choice(("append", "append", "paragraph", "task", "tag", "updated"))
+    body_start = lines.index("---", 1) + 1
+    if kind == "append":
+        lines.append(f"- {tag} {sentence(rng, 5)}")
+    elif kind == "paragraph":
+        paragraphs = [i for i in range(body_start, len(lines)) if lines[i].endswith(".") and not lines[i].startswith("-")]
+        i = rng.choice(paragraphs)
+        lines[i] = lines[i][:-1] + f" ({tag})."
+    elif kind == "task":
+        i = lines.index("## Journal") - 1
+        lines.insert(i, f"- [ ] {tag} {sentence(rng, 3)}")
+    elif kind == "tag":
+        i = next(i for i, line in enumerate(lines) if line.startswith("tags: ["))
+        lines[i] = lines[i][:-1] + f", {tag}]"
+    else:
+        i = next(i for i, line in enumerate(lines) if line.startswith("updated: "))
+        lines[i] = f"updated: {tag}"
+
+
+def make_corpus(count, seed):
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < count:
+        base = make_note(rng, len(corpus) % 28 + 1)
+        ours, theirs = list(base), list(base)
+        for lines, tag in ((ours, "ours"), (theirs, "theirs")):
+            for _ in range(rng.randint(1, 3)):
+                edit(rng, lines, tag)
+        if ours == theirs:
+            continue  # identical edits: git never calls a merge driver
+        # Body lines either side added or changed must survive a clean merge.
+        body_start = base.index("---", 1) + 1
+        added = [line for lines in (ours, theirs) for line in lines[body_start:] if line not in base]
+        texts = ["\n".join(lines) + "\n" for lines in (base, ours, theirs)]
+        corpus.append((*texts, added))
+    return corpus
+
+
+def git_merge_file_conflicts(tmp, base, ours, theirs):
+    paths = []
+    for name, text in (("base", base), ("ours", ours), ("theirs", theirs)):
+        path = os.path.join(tmp, name + ".md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    result = subprocess.run(["git", "merge-file", "-p", "--quiet", paths[1], paths[0], paths[2]],
+                            capture_output=True)
+    return result.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--driver-runs", type=int, default=20, help="merges timed through the merge-driver command")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.cases, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        git_clean = sum(1 for base, ours, theirs, _ in corpus if git_merge_file_conflicts(tmp, base, ours, theirs) == 0)
+
+        start = time.perf_counter()
+        results = [Ogresync.merge_markdown(base, ours, theirs) for base, ours, theirs, _ in corpus]
+        elapsed = time.perf_counter() - start
+
+        lost = 0
+        for (base, ours, theirs, added), (merged, conflicts) in zip(corpus, results):
+            if not conflicts and any(line not in merged.splitlines() for line in added):
+                lost += 1
+
+        driver_ms = []
+        for base, ours, theirs, _ in corpus[:args.driver_runs]:
+            paths = []
+            for name, text in (("base", base), ("ours", ours), ("theirs", theirs)):
+                path = os.path.join(tmp, name + ".md")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                paths.append(path)
+            start = time.perf_counter()
+            subprocess.run([sys.executable, SCRIPT, "merge-driver", *paths, "note.md"], capture_output=True)
+            driver_ms.append((time.perf_counter() - start) * 1000.0)
+
+    ours_clean = sum(1 for _, conflicts in results if not conflicts)
+    print(f"{len(corpus)} concurrently edited notes (seed {args.seed})")
+    print(f"  git merge-file (built-in)  : {100.0 * git_clean / len(corpus):5.1f} % merged without conflicts")
+    print(f"  Ogresync merge driver      : {100.0 * ours_clean / len(corpus):5.1f} % merged without conflicts")
+    print(f"  merge_markdown throughput  : {len(corpus) / elapsed:8.0f} merges/s in-process")
+    print(f"  merge-driver command       : {statistics.median(driver_ms):8.1f} ms per note (median, incl. interpreter start)")
+    if lost:
+        print(f"  ❌ {lost} clean merge(s) dropped a line that one side added")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Multi-vault sync benchmark: the same headless 'sync' over N vaults, run with
+one worker (vaults one after another) and with several workers.
+
+Each vault has its own local bare repository as 'origin', a change pushed by
+another device and an uncommitted local edit, so every vault fetches, applies
+remote commits, commits and pushes. With --rtt-ms, remotes are reached over a
+fake 'ssh' that sleeps before every connection, which stands in for the
+network round trips to GitHub that parallel vaults can overlap; a local TCP
+listener answers Ogresync's reachability probe for the fake host.
+
+Usage:
+    python benchmarks/bench_multi_vault.py [--vaults 10] [--workers 4] [--notes 200]
+                                           [--rtt-ms 150] [--runs 3]
+"""
+import argparse
+import os
+import shutil
+import socket
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from _util import SCRIPT, git
+
+# ssh [options] HOST COMMAND: sleep for one round trip, then run the command locally.
+# Control requests ('ssh -O exit ...') from connection sharing are acknowledged.
+FAKE_SSH = """#!/bin/sh
+for arg in "$@"; do [ "$arg" = "-O" ] && exit 0; done
+sleep {delay}
+while [ $# -gt 1 ]; do shift; done
+exec sh -c "$1"
+"""
+
+
+def prepare_vault(workdir, index, notes, remote_url):
+    """
+    Creates origin, the vault under test and a peer clone for one vault, and
+    leaves the vault one remote commit behind with one local edit.
+    """
+    bare = os.path.join(workdir, f"origin-{index:02d}.git")
+    vault = os.path.join(workdir, f"vault-{index:02d}")
+    peer = os.path.join(workdir, f"peer-{index:02d}")
+    git(workdir, "init", "-q", "--bare", "-b", "main", bare)
+    git(workdir, "init", "-q", "-b", "main", vault)
+    for key, val in (("user.name", "bench"), ("user.email", "bench@example.com")):
+        git(vault, "config", key, val)
+    for i in range(notes):
+        with open(os.path.join(vault, f"note-{i:04d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Note {i}\n\nVault {index}.\n")
+    git(vault, "add", "-A")
+    git(vault, "commit", "-q", "-m", "synthetic vault")
+    git(vault, "remote", "add", "origin", bare)
+    git(vault, "push", "-q", "-u", "origin", "main")
+    git(workdir, "clone", "-q", bare, peer)
+    for key, val in (("user.name", "peer"), ("user.email", "peer@example.com")):
+        git(peer, "config", key, val)
+    with open(os.path.join(peer, "from-peer.md"), "w", encoding="utf-8") as f:
+        f.write("Pushed by another device.\n")
+    git(peer, "add", "-A")
+    git(peer, "commit", "-q", "-m", "peer edit")
+    git(peer, "push", "-q", "origin", "main")
+    git(vault, "remote", "set-url", "origin", remote_url(bare))
+    with open(os.path.join(vault, "note-0000.md"), "a", encoding="utf-8") as f:
+        f.write("\nLocal edit.\n")
+    return vault
+
+
+def start_probe_listener():
+    """
+    Listens on a free local port so the reachability probe for the fake ssh
+    host succeeds; returns the port.
+    """
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(64)
+
+    def accept():
+        while True:
+            conn, _ = server.accept()
+            conn.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def run_sync(vaults, workers, env):
+    args = [sys.executable, SCRIPT, "sync", "--workers", str(workers)]
+    for vault in vaults:
+        args += ["--vault", vault]
+    start = time.perf_counter()
+    result = subprocess.run(args, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"sync failed (exit {result.returncode}):\n{result.stdout}\n{result.stderr}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vaults", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--notes", type=int, default=200, help="notes per vault")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated round trip per remote connection")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    timings = {1: [], args.workers: []}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, OGRESYNC_CONFIG_DIR=os.path.join(tmp, "config"))
+        if args.rtt_ms:
+            bin_dir = os.path.join(tmp, "bin")
+            os.makedirs(bin_dir)
+            ssh = os.path.join(bin_dir, "ssh")
+            with open(ssh, "w", encoding="utf-8") as f:
+                f.write(FAKE_SSH.format(delay=args.rtt_ms / 1000.0))
+            os.chmod(ssh, os.stat(ssh).st_mode | stat.S_IEXEC)
+            env.update(GIT_SSH=ssh, GIT_SSH_VARIANT="ssh")
+            port = start_probe_listener()
+            remote_url = lambda bare: f"ssh://127.0.0.1:{port}{bare}"
+        else:
+            remote_url = lambda bare: bare
+
+        for run in range(args.runs):
+            for workers in timings:
+                workdir = os.path.join(tmp, f"run-{run}-{workers}")
+                os.makedirs(workdir)
+                vaults = [prepare_vault(workdir, i, args.notes, remote_url) for i in range(args.vaults)]
+                timings[workers].append(run_sync(vaults, workers, env))
+                shutil.rmtree(workdir)
+
+    serial = statistics.median(timings[1])
+    parallel = statistics.median(timings[args.workers])
+    print(f"{args.vaults} vaults, {args.notes} notes each, simulated RTT {args.rtt_ms:.0f} ms "
+          f"(median of {args.runs})")
+    print(f"  1 worker   : {serial:7.2f} s")
+    print(f"  {args.workers} workers  : {parallel:7.2f} s  ({serial / parallel:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Spawn cost of run_command's argument-vector path versus the previous
+shell=True path (an extra /bin/sh or cmd.exe per call), and what tracing
+costs per command: the span setup while tracing is off (building the span
+name and details first, as before, versus testing tracer.enabled first), and
+run_command with tracing on and off.
+
+Usage:
+    python benchmarks/bench_spawn.py [--calls 1000] [--span-calls 1000000]
+"""
+import argparse
+import subprocess
+import time
+
+import _util  # noqa: F401  (puts the repository on sys.path)
+import Ogresync
+
+
+def run_shell(command):
+    # The pre-argv implementation of run_command, kept here for comparison.
+    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    return result.stdout.strip(), result.stderr.strip(), result.returncode
+
+
+def span_always_built(args):
+    # The span setup run_command used before it tested tracer.enabled.
+    with Ogresync.tracer.span(" ".join(args[:2]), "command", argv=args):
+        pass
+
+
+def span_fast_path(args):
+    tracer = Ogresync.tracer
+    with tracer.span(" ".join(args[:2]), "command", argv=args) if tracer.enabled else Ogresync._NULL_SPAN:
+        pass
+
+
+def total_seconds(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--span-calls", type=int, default=1000000)
+    args = parser.parse_args()
+
+    shell_s = total_seconds(lambda: run_shell("git --version"), args.calls)
+    argv_s = total_seconds(lambda: Ogresync.run_command(["git", "--version"]), args.calls)
+
+    print(f"{args.calls} x 'git --version'")
+    print(f"  shell=True : {shell_s:8.3f} s total, {shell_s * 1000 / args.calls:7.3f} ms/call")
+    print(f"  argv       : {argv_s:8.3f} s total, {argv_s * 1000 / args.calls:7.3f} ms/call")
+    print(f"  speedup    : {shell_s / argv_s:.2f}x")
+
+    argv = ["git", "rev-parse", "HEAD"]
+    built_s = total_seconds(lambda: span_always_built(argv), args.span_calls)
+    fast_s = total_seconds(lambda: span_fast_path(argv), args.span_calls)
+    Ogresync.tracer.start()
+    traced_s = total_seconds(lambda: Ogresync.run_command(["git", "--version"]), args.calls)
+    Ogresync.tracer.stop()
+    print(f"tracing off, span setup per command ({args.span_calls} calls)")
+    print(f"  name and details built first : {built_s * 1e9 / args.span_calls:7.0f} ns/call")
+    print(f"  tracer.enabled tested first  : {fast_s * 1e9 / args.span_calls:7.0f} ns/call")
+    print(f"run_command with tracing on    : {traced_s * 1000 / args.calls:7.3f} ms/call "
+          f"(off: {argv_s * 1000 / args.calls:.3f} ms/call)")
+
+
+if __name__ == "__main__":
+    main()
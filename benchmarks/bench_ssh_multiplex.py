@@ -0,0 +1,112 @@
+"""
+Remote round-trip cost with and without the session's SSH ControlMaster.
+
+A fake 'ssh' placed first on PATH sleeps for --handshake seconds whenever it
+would open a new connection (no live control socket) and then runs the git
+transport command locally against a bare repository, so the benchmark needs
+neither sshd nor network access.
+
+Usage:
+    python benchmarks/bench_ssh_multiplex.py [--fetches 10] [--handshake 0.2]
+"""
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+
+from _util import git
+import Ogresync
+
+FAKE_SSH = r'''#!{python}
+import hashlib, os, sys, time
+
+args = sys.argv[1:]
+opts, rest, control = {{}}, [], None
+i = 0
+while i < len(args):
+    arg = args[i]
+    if arg == "-o":
+        key, _, val = args[i + 1].partition("=")
+        opts[key] = val
+        i += 2
+    elif arg == "-O":
+        control = args[i + 1]
+        i += 2
+    elif arg in ("-p", "-i", "-l", "-S"):
+        i += 2
+    elif arg.startswith("-"):
+        i += 1
+    else:
+        rest = args[i:]
+        break
+host = rest[0] if rest else ""
+path = opts.get("ControlPath", "").replace("%C", hashlib.sha1(host.encode()).hexdigest())
+
+if control == "exit":
+    if path and os.path.exists(path):
+        os.remove(path)
+    sys.exit(0)
+if not (path and os.path.exists(path)):
+    time.sleep({handshake})  # key exchange + authentication
+    if path and opts.get("ControlMaster") in ("auto", "yes") and opts.get("ControlPersist"):
+        open(path, "w").close()
+os.execvp("sh", ["sh", "-c", " ".join(rest[1:])])
+'''
+
+
+def time_fetches(vault, fetches):
+    session = Ogresync.GitSession(vault)
+    start = time.perf_counter()
+    for _ in range(fetches):
+        _, err, rc = session.remote(["git", "fetch", "origin", "main"])
+        if rc != 0:
+            raise SystemExit(f"fetch failed: {err}")
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fetches", type=int, default=10)
+    parser.add_argument("--handshake", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = os.path.join(tmp, "bin")
+        os.makedirs(bin_dir)
+        ssh_path = os.path.join(bin_dir, "ssh")
+        with open(ssh_path, "w", encoding="utf-8") as f:
+            f.write(FAKE_SSH.format(python=sys.executable, handshake=args.handshake))
+        os.chmod(ssh_path, os.stat(ssh_path).st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+        os.environ["GIT_SSH_VARIANT"] = "ssh"
+        os.environ.pop("GIT_SSH_COMMAND", None)
+        os.environ.pop("GIT_SSH", None)
+
+        bare = os.path.join(tmp, "remote.git")
+        vault = os.path.join(tmp, "vault")
+        git(tmp, "init", "-q", "--bare", "-b", "main", bare)
+        git(tmp, "init", "-q", "-b", "main", vault)
+        git(vault, "-c", "user.name=bench", "-c", "user.email=bench@example.com",
+            "commit", "-q", "--allow-empty", "-m", "init")
+        git(vault, "remote", "add", "origin", f"ssh://fakehost{bare}")
+        git(vault, "push", "-q", "origin", "main")
+
+        plain = time_fetches(vault, args.fetches)
+        Ogresync.start_ssh_multiplexing()
+        try:
+            shared = time_fetches(vault, args.fetches)
+        finally:
+            Ogresync.stop_ssh_multiplexing()
+
+    print(f"{args.fetches} x 'git fetch' over ssh, {args.handshake * 1000:.0f} ms simulated handshake")
+    print(f"  new connection each time : {plain:7.3f} s ({plain * 1000 / args.fetches:7.1f} ms/fetch)")
+    print(f"  ControlMaster multiplexed: {shared:7.3f} s ({shared * 1000 / args.fetches:7.1f} ms/fetch)")
+    print(f"  speedup                  : {plain / shared:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
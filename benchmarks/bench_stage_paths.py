@@ -0,0 +1,132 @@
+"""
+Staging benchmark: 'git add -A' (git walks the whole vault) versus feeding
+only the changed paths to one 'git update-index --stdin' (GitSession.stage_paths).
+
+A committed vault is generated and then a few files are edited, deleted,
+renamed and added, next to an ignored file. Measured, as the median of --runs
+(the index is reset to HEAD before each run):
+
+  - git add -A,
+  - stage_paths with the known change set (as from a watcher),
+  - detect_work_tree_changes + stage_paths (as at the end of a sync).
+
+Each way must stage the same tree ('git write-tree'); a mismatch fails the run.
+
+Usage:
+    python benchmarks/bench_stage_paths.py [--files 100000] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from _util import git
+
+NOTES_PER_FOLDER = 200
+EDITS = 10
+
+
+def make_vault(tmp, count):
+    vault = os.path.join(tmp, f"vault-{count}")
+    git(tmp, "init", "-q", "-b", "main", vault)
+    for key, val in (("user.name", "bench"), ("user.email", "bench@example.com")):
+        git(vault, "config", key, val)
+    with open(os.path.join(vault, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("*.tmp\n")
+    paths = []
+    for i in range(count):
+        folder = os.path.join(vault, f"folder-{i // NOTES_PER_FOLDER:04d}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"note-{i}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# Note {i}\n\nSome text for note {i}.\n")
+        paths.append(os.path.relpath(path, vault).replace(os.sep, "/"))
+    git(vault, "add", "-A")
+    git(vault, "commit", "-q", "-m", "init")
+    past = time.time() - 60  # not racily clean
+    for path in paths:
+        os.utime(os.path.join(vault, path), (past, past))
+    return vault, paths
+
+
+def edit_vault(vault, paths):
+    """
+    Edits, deletes, renames and adds EDITS files each and writes an ignored
+    file. Returns the changed paths.
+    """
+    step = len(paths) // (3 * EDITS)
+    edited, deleted, renamed = paths[1::step][:EDITS], paths[2::step][:EDITS], paths[3::step][:EDITS]
+    added = [f"new/note-{i}.md" for i in range(EDITS)]
+    os.makedirs(os.path.join(vault, "new"), exist_ok=True)
+    for path in edited:
+        with open(os.path.join(vault, path), "a", encoding="utf-8") as f:
+            f.write("Edited.\n")
+    for path in deleted:
+        os.remove(os.path.join(vault, path))
+    moved = [path.replace(".md", "-renamed.md") for path in renamed]
+    for old, new in zip(renamed, moved):
+        os.rename(os.path.join(vault, old), os.path.join(vault, new))
+    for path in added + ["new/scratch.tmp"]:
+        with open(os.path.join(vault, path), "w", encoding="utf-8") as f:
+            f.write("New.\n")
+    return sorted(edited + deleted + renamed + moved + added + ["new/scratch.tmp"])
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000.0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", default="100000")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["OGRESYNC_CONFIG_DIR"] = os.path.join(tmp, "config")
+        import Ogresync
+        failures = []
+        for count in (int(n) for n in args.files.split(",")):
+            vault, paths = make_vault(tmp, count)
+            session = Ogresync.GitSession(vault)
+            Ogresync.record_file_state(session, Ogresync.detect_work_tree_changes(session))
+            changed = edit_vault(vault, paths)
+            times = {name: [] for name in ("add", "known", "detect")}
+
+            def stage_detected():
+                changes = Ogresync.detect_work_tree_changes(session)
+                return session.stage_paths(changes.paths)
+
+            ways = (("add", lambda: git(vault, "add", "-A")),
+                    ("known", lambda: session.stage_paths(changed)),
+                    ("detect", stage_detected))
+            for _ in range(args.runs):
+                trees = {}
+                for name, stage in ways:
+                    git(vault, "reset", "-q")
+                    elapsed, ok = timed(stage)
+                    times[name].append(elapsed)
+                    if ok is False:
+                        failures.append(f"{count}: {name} staging failed")
+                    trees[name] = git(vault, "write-tree").strip()
+                if len(set(trees.values())) != 1:
+                    failures.append(f"{count}: staged trees differ: {trees}")
+            session.close()
+
+            median = {name: statistics.median(values) for name, values in times.items()}
+            print(f"{count} files, {len(changed)} changed paths, median of {args.runs}")
+            print(f"  git add -A                             : {median['add']:8.1f} ms")
+            print(f"  stage_paths, known change set          : {median['known']:8.1f} ms")
+            print(f"  detect_work_tree_changes + stage_paths : {median['detect']:8.1f} ms")
+
+    for failure in failures:
+        print(f"  ❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cold-start cost of Ogresync: interpreter + module import time, and the time
+from process start to the first git command of a headless 'sync' run.
+
+A 'git' shim placed first on PATH records when it is first invoked and then
+hands over to the real git, so the measurement needs no instrumentation in
+Ogresync itself. A local bare repository stands in for GitHub.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10]
+"""
+import argparse
+import os
+import shutil
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _util import REPO_ROOT, SCRIPT, git
+
+GIT_SHIM = """#!/bin/sh
+[ -e "$OGRESYNC_BENCH_MARK" ] || {clock} > "$OGRESYNC_BENCH_MARK"
+exec {git} "$@"
+"""
+
+GUI_MODULES = ("tkinter", "psutil", "pyperclip", "webbrowser")
+
+
+def clock_command():
+    """
+    A shell command printing the time in nanoseconds; GNU date is much cheaper
+    to start than another interpreter.
+    """
+    probe = subprocess.run(["date", "+%s%N"], capture_output=True, text=True)
+    if probe.returncode == 0 and probe.stdout.strip().isdigit():
+        return "date +%s%N"
+    return f"{sys.executable} -c 'import time; print(time.time_ns())'"
+
+
+def make_vault(tmp):
+    bare = os.path.join(tmp, "origin.git")
+    vault = os.path.join(tmp, "vault")
+    git(tmp, "init", "-q", "--bare", "-b", "main", bare)
+    git(tmp, "init", "-q", "-b", "main", vault)
+    for key, val in (("user.name", "bench"), ("user.email", "bench@example.com")):
+        git(vault, "config", key, val)
+    git(vault, "remote", "add", "origin", bare)
+    with open(os.path.join(vault, "note.md"), "w", encoding="utf-8") as f:
+        f.write("# Note\n")
+    git(vault, "add", "-A")
+    git(vault, "commit", "-q", "-m", "init")
+    git(vault, "push", "-q", "-u", "origin", "main")
+    return vault
+
+
+def import_ms():
+    code = f"import sys; sys.path.insert(0, {REPO_ROOT!r}); import Ogresync"
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return (time.perf_counter() - start) * 1000.0
+
+
+def first_git_ms(vault, env, mark):
+    if os.path.exists(mark):
+        os.remove(mark)
+    start = time.time_ns()
+    result = subprocess.run([sys.executable, SCRIPT, "sync", "--vault", vault], env=env,
+                            cwd=os.path.dirname(vault), capture_output=True, text=True)
+    end = time.time_ns()
+    if result.returncode != 0:
+        raise SystemExit(f"sync failed:\n{result.stdout}\n{result.stderr}")
+    with open(mark, encoding="utf-8") as f:
+        first = int(f.read().strip())
+    return (first - start) / 1e6, (end - start) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    code = (f"import sys; sys.path.insert(0, {REPO_ROOT!r}); import Ogresync; "
+            f"print(','.join(m for m in {GUI_MODULES!r} if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+
+    imports = [import_ms() for _ in range(args.runs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = make_vault(tmp)
+        bin_dir = os.path.join(tmp, "bin")
+        os.makedirs(bin_dir)
+        shim = os.path.join(bin_dir, "git")
+        with open(shim, "w", encoding="utf-8") as f:
+            f.write(GIT_SHIM.format(clock=clock_command(), git=shutil.which("git")))
+        os.chmod(shim, os.stat(shim).st_mode | stat.S_IEXEC)
+        mark = os.path.join(tmp, "first-git")
+        env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ["PATH"], OGRESYNC_BENCH_MARK=mark,
+                   OGRESYNC_CONFIG_DIR=os.path.join(tmp, "config"))
+        runs = [first_git_ms(vault, env, mark) for _ in range(args.runs)]
+
+    print(f"GUI modules loaded by 'import Ogresync': {loaded or 'none'}")
+    print(f"python -c 'import Ogresync'        : {statistics.median(imports):7.1f} ms (median of {args.runs})")
+    print(f"'sync' start -> first git command : {statistics.median(r[0] for r in runs):7.1f} ms")
+    print(f"'sync' total (nothing to sync)    : {statistics.median(r[1] for r in runs):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
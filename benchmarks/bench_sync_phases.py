@@ -0,0 +1,333 @@
+"""
+End-to-end auto_sync benchmark on synthetic Obsidian vaults.
+
+For each scenario a vault of generated notes (and, for the '-attachments'
+variants, binary attachments) is committed and pushed to a local bare
+repository that acts as 'origin'. A second clone plays another device: it
+pushes a change before the sync starts and another one while the fake
+Obsidian is open, so both pull phases have work to do. The fake Obsidian
+appends to --edits notes, adds one note and exits.
+
+auto_sync runs headlessly in a fresh interpreter per scenario, so the
+reported peak RSS belongs to that scenario alone. Wall time is split into
+phases by the git subcommand being run; phases this version never reaches
+are reported as 0 so results from different versions can be diffed.
+
+When the version under test has the sync tracer, per-step times are
+reported as well and --trace-dir keeps the Chrome-trace file of each run.
+
+Usage:
+    python benchmarks/bench_sync_phases.py [--scenarios 1k,1k-attachments]
+                                           [--edits 20] [--output results.json]
+                                           [--trace-dir traces]
+
+Scenarios: 1k, 10k, 100k (notes) plus the same with an '-attachments' suffix.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from _util import REPO_ROOT, git
+
+NOTES_PER_FOLDER = 200
+ATTACHMENT_EVERY = 10                   # one attachment per this many notes
+ATTACHMENT_SIZES = (16 * 1024, 256 * 1024)
+
+PHASES = ("rev-parse", "stash", "fetch", "pull", "pop", "obsidian", "commit", "diff-tree", "push", "other")
+
+# git subcommand -> phase. Everything that moves the vault to the remote state
+# (merge, in-memory merge, work-tree updates) counts as 'pull'.
+GIT_PHASES = {
+    "rev-parse": "rev-parse", "cat-file": "rev-parse", "rev-list": "rev-parse", "log": "rev-parse",
+    "status": "rev-parse", "count-objects": "rev-parse",
+    "fetch": "fetch",
+    "pull": "pull", "merge": "pull", "merge-tree": "pull", "rebase": "pull", "restore": "pull",
+    "reset": "pull", "read-tree": "pull", "update-index": "pull", "write-tree": "pull",
+    "commit-tree": "pull", "update-ref": "pull", "checkout": "pull", "rm": "pull",
+    "add": "commit", "commit": "commit",
+    "diff-tree": "diff-tree", "diff": "diff-tree",
+    "push": "push",
+}
+
+WORDS = ("vault note idea link project meeting draft reading summary research todo "
+         "question answer review archive daily weekly journal reference quote").split()
+
+FAKE_OBSIDIAN = r'''
+import os, random, subprocess, sys, time
+vault, peer, edits, seed = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+rng = random.Random(seed)
+notes = []
+for dirpath, dirnames, filenames in os.walk(vault):
+    dirnames[:] = [d for d in dirnames if d != ".git"]
+    notes.extend(os.path.join(dirpath, f) for f in filenames if f.endswith(".md"))
+notes.sort()
+for path in rng.sample(notes, min(edits, len(notes))):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"\nEdited during the session at {time.time():.3f}.\n")
+with open(os.path.join(vault, f"new-note-{seed}.md"), "w", encoding="utf-8") as f:
+    f.write("# New note\n\nWritten while Obsidian was open.\n")
+# The other device pushes while this one is still editing.
+with open(os.path.join(peer, "from-peer-during.md"), "w", encoding="utf-8") as f:
+    f.write("Pushed by another device while Obsidian was open.\n")
+for args in (["add", "-A"], ["commit", "-q", "-m", "peer edit (during)"], ["push", "-q", "origin", "main"]):
+    subprocess.run(["git", *args], cwd=peer, check=True, capture_output=True)
+'''
+
+
+def parse_scenario(name):
+    base, _, variant = name.partition("-")
+    if variant not in ("", "attachments") or not base.endswith("k") or not base[:-1].isdigit():
+        raise SystemExit(f"unknown scenario: {name}")
+    return int(base[:-1]) * 1000, variant == "attachments"
+
+
+def generate_vault(vault, notes, attachments, seed=1):
+    """
+    Writes 'notes' Markdown notes (frontmatter, paragraphs, wikilinks) into
+    folders of NOTES_PER_FOLDER, plus random binary attachments if requested.
+    Returns the number of bytes written.
+    """
+    rng = random.Random(seed)
+    written = 0
+    for i in range(notes):
+        folder = os.path.join(vault, f"folder-{i // NOTES_PER_FOLDER:04d}")
+        if i % NOTES_PER_FOLDER == 0:
+            os.makedirs(folder, exist_ok=True)
+        paragraphs = "\n\n".join(" ".join(rng.choices(WORDS, k=rng.randint(20, 80)))
+                                 for _ in range(rng.randint(2, 6)))
+        links = " ".join(f"[[note-{rng.randrange(notes):06d}]]" for _ in range(rng.randint(1, 5)))
+        body = (f"---\ntags: [{rng.choice(WORDS)}, {rng.choice(WORDS)}]\n---\n"
+                f"# Note {i}\n\n{paragraphs}\n\nSee also: {links}\n")
+        with open(os.path.join(folder, f"note-{i:06d}.md"), "w", encoding="utf-8") as f:
+            f.write(body)
+        written += len(body)
+        if attachments and i % ATTACHMENT_EVERY == 0:
+            os.makedirs(os.path.join(vault, "attachments"), exist_ok=True)
+            data = rng.randbytes(rng.randint(*ATTACHMENT_SIZES))
+            with open(os.path.join(vault, "attachments", f"image-{i:06d}.png"), "wb") as f:
+                f.write(data)
+            written += len(data)
+    return written
+
+
+def prepare(workdir, notes, attachments):
+    """
+    Creates origin (bare), the vault under test and a peer clone, and pushes a
+    peer change so the vault starts one commit behind.
+    """
+    bare = os.path.join(workdir, "origin.git")
+    vault = os.path.join(workdir, "vault")
+    peer = os.path.join(workdir, "peer")
+    git(workdir, "init", "-q", "--bare", "-b", "main", bare)
+    git(workdir, "init", "-q", "-b", "main", vault)
+    for key, val in (("user.name", "bench"), ("user.email", "bench@example.com")):
+        git(vault, "config", key, val)
+    git(vault, "remote", "add", "origin", bare)
+    size = generate_vault(vault, notes, attachments)
+    git(vault, "add", "-A")
+    git(vault, "commit", "-q", "-m", "synthetic vault")
+    git(vault, "push", "-q", "-u", "origin", "main")
+    git(workdir, "clone", "-q", bare, peer)
+    for key, val in (("user.name", "peer"), ("user.email", "peer@example.com")):
+        git(peer, "config", key, val)
+    with open(os.path.join(peer, "from-peer-before.md"), "w", encoding="utf-8") as f:
+        f.write("Pushed by another device before this session.\n")
+    git(peer, "add", "-A")
+    git(peer, "commit", "-q", "-m", "peer edit (before)")
+    git(peer, "push", "-q", "origin", "main")
+    return vault, peer, size
+
+
+def git_subcommand(args):
+    if isinstance(args, str):  # older versions passed shell strings
+        args = shlex.split(args)
+    if not args or os.path.basename(args[0]) not in ("git", "git.exe"):
+        return None, None
+    i = 1
+    while i < len(args) and args[i].startswith("-"):
+        i += 2 if args[i] in ("-c", "-C") else 1
+    sub = args[i] if i < len(args) else ""
+    action = args[i + 1] if sub == "stash" and i + 1 < len(args) else ""
+    return sub, action
+
+
+def phase_of(args):
+    sub, action = git_subcommand(args)
+    if sub is None:
+        return "other"
+    if sub == "stash":
+        return "pop" if action in ("pop", "apply") else "stash"
+    return GIT_PHASES.get(sub, "other")
+
+
+class PhaseTimer:
+    """
+    Accumulates wall time per phase. Only the outermost timed call on a
+    thread is counted, so wrapped helpers calling each other are not
+    counted twice.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, func, phase):
+        def timed(*args, **kwargs):
+            name = phase(args) if callable(phase) else phase
+            if getattr(self._local, "active", False):
+                return func(*args, **kwargs)
+            self._local.active = True
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._local.active = False
+                with self._lock:
+                    self.seconds[name] += elapsed
+                    self.calls[name] += 1
+        return timed
+
+    def wrap_async(self, func, phase):
+        # Coroutines of one event loop interleave on a thread, so no nesting check.
+        async def timed(*args, **kwargs):
+            name = phase(args)
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.seconds[name] += elapsed
+                    self.calls[name] += 1
+        return timed
+
+
+def peak_rss_kib(who):
+    import resource
+    rss = resource.getrusage(who).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # bytes on macOS, KiB on Linux
+
+
+def run_one(vault, peer, edits, trace_dir):
+    """
+    Runs auto_sync against a prepared vault in this process and returns the
+    phase report. Called in a child interpreter (see main()).
+    """
+    sys.path.insert(0, REPO_ROOT)
+    import Ogresync
+
+    timer = PhaseTimer()
+    Ogresync.run_command = timer.wrap(Ogresync.run_command, lambda args: phase_of(args[0]))
+    if hasattr(Ogresync, "async_run_command"):
+        # The asyncio sync engine runs commit, fetch and push through this one.
+        Ogresync.async_run_command = timer.wrap_async(Ogresync.async_run_command, lambda args: phase_of(args[0]))
+    session_cls = getattr(Ogresync, "GitSession", None)
+    if session_cls is not None:
+        # Queries answered over the session's cat-file pipes never reach run_command.
+        for name, phase in (("resolve", "rev-parse"), ("read_commit", "rev-parse"),
+                            ("unpushed_commits", "rev-parse"), ("diff_tree", "diff-tree")):
+            if hasattr(session_cls, name):
+                setattr(session_cls, name, timer.wrap(getattr(session_cls, name), phase))
+    Ogresync.wait_for_obsidian_exit = timer.wrap(Ogresync.wait_for_obsidian_exit, "obsidian")
+    messages = []
+    Ogresync.safe_update_log = lambda message, progress=None: messages.append(message)
+
+    script = os.path.join(os.path.dirname(vault), "fake_obsidian.py")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write(FAKE_OBSIDIAN)
+    Ogresync.config_data.update(
+        VAULT_PATH=vault,
+        OBSIDIAN_PATH=shlex.join([sys.executable, script, vault, peer, str(edits), "7"]),
+        LIVE_SYNC="0",
+        PREFETCH="0",
+    )
+    tracing = hasattr(Ogresync, "tracer")
+    if tracing:
+        Ogresync.config_data.update(TRACE="1", TRACE_DIR=trace_dir)
+
+    before = set(threading.enumerate())
+    start = time.perf_counter()
+    Ogresync.auto_sync()
+    for thread in set(threading.enumerate()) - before:
+        thread.join()
+    total = time.perf_counter() - start
+
+    return {
+        "total_s": round(total, 4),
+        "steps_s": {k: round(v, 4) for k, v in Ogresync.tracer.totals("step").items()} if tracing else {},
+        "phases_s": {k: round(v, 4) for k, v in timer.seconds.items()},
+        "calls": timer.calls,
+        "peak_rss_kib": peak_rss_kib(__import__("resource").RUSAGE_SELF),
+        # Largest git child; on Linux this is never below the interpreter's RSS at fork time.
+        "peak_child_rss_kib": peak_rss_kib(__import__("resource").RUSAGE_CHILDREN),
+        "completed": any(m.startswith("Synchronization complete") for m in messages),
+        "last_message": messages[-1] if messages else "",
+    }
+
+
+def git_head(path):
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default="1k,1k-attachments",
+                        help="comma-separated list, e.g. 1k,10k,100k,10k-attachments")
+    parser.add_argument("--edits", type=int, default=20, help="notes the fake Obsidian edits")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--trace-dir", help="keep each scenario's Chrome trace in DIR/<scenario>/")
+    parser.add_argument("--run-one", nargs=3, metavar=("VAULT", "PEER", "TRACE_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        vault, peer, trace_dir = args.run_one
+        json.dump(run_one(vault, peer, args.edits, trace_dir), sys.stdout)
+        return
+
+    report = {
+        "ogresync_commit": git_head(REPO_ROOT),
+        "git": subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "edits": args.edits,
+        "scenarios": {},
+    }
+    for name in filter(None, args.scenarios.split(",")):
+        notes, attachments = parse_scenario(name)
+        with tempfile.TemporaryDirectory() as workdir:
+            print(f"[{name}] generating {notes} notes{' with attachments' if attachments else ''}...", file=sys.stderr)
+            start = time.perf_counter()
+            vault, peer, size = prepare(workdir, notes, attachments)
+            setup_s = time.perf_counter() - start
+            trace_dir = os.path.join(os.path.abspath(args.trace_dir), name) if args.trace_dir else os.path.join(workdir, "traces")
+            print(f"[{name}] running auto_sync...", file=sys.stderr)
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "--edits", str(args.edits),
+                                    "--run-one", vault, peer, trace_dir], capture_output=True, text=True)
+            if child.returncode != 0:
+                raise SystemExit(f"[{name}] benchmark run failed:\n{child.stderr}")
+            result = json.loads(child.stdout)
+            result.update(notes=notes, attachments=attachments, vault_bytes=size, setup_s=round(setup_s, 2))
+            report["scenarios"][name] = result
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
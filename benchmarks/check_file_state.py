@@ -0,0 +1,118 @@
+"""
+End-to-end check of the file state index and .gitignore changes: headless
+syncs against a local bare remote, where a file that was ignored stops being
+ignored because a .gitignore was edited, deleted or changed by a pull. The
+file must be committed by the next sync, as 'git add -A' would, and a sync
+after that must find nothing to commit. Ignored files whose names start with
+a space must stay ignored.
+Exits with code 1 if any check fails.
+
+Usage:
+    python benchmarks/check_file_state.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from _util import SCRIPT, git
+
+
+def write(root, path, text):
+    full = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def main():
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_dir = os.path.join(tmp, "config")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "ogresync.ini"), "w", encoding="utf-8") as f:
+            f.write("[ogresync]\npush_agent = false\n")
+        env = dict(os.environ, OGRESYNC_CONFIG_DIR=config_dir)
+
+        bare = os.path.join(tmp, "origin.git")
+        vault = os.path.join(tmp, "vault")
+        peer = os.path.join(tmp, "peer")
+        git(tmp, "init", "-q", "--bare", "-b", "main", bare)
+        git(tmp, "init", "-q", "-b", "main", vault)
+        for key, val in (("user.name", "check"), ("user.email", "check@example.com")):
+            git(vault, "config", key, val)
+        write(vault, "note.md", "# Note\n")
+        write(vault, ".gitignore", "*.pdf\n*.log\n")
+        write(vault, "sub/.gitignore", "*.tmp\n")
+        git(vault, "add", "-A")
+        git(vault, "commit", "-q", "-m", "init")
+        git(vault, "remote", "add", "origin", bare)
+        git(vault, "push", "-q", "-u", "origin", "main")
+        git(tmp, "clone", "-q", bare, peer)
+        for key, val in (("user.name", "peer"), ("user.email", "peer@example.com")):
+            git(peer, "config", key, val)
+        write(vault, "a.pdf", "scan\n")
+        write(vault, "b.log", "log\n")
+        write(vault, "sub/c.tmp", "draft\n")
+
+        def sync():
+            result = subprocess.run([sys.executable, SCRIPT, "sync", "--vault", vault], env=env,
+                                    capture_output=True, text=True, timeout=120)
+            return result.returncode == 0, result.stdout
+
+        def tracked(path):
+            return bool(git(vault, "ls-files", "--", path))
+
+        def settled(what):
+            ok, out = sync()
+            check(ok and "Nothing to commit" in out and not git(vault, "status", "--porcelain"),
+                  f"{what}: the next sync finds nothing to commit")
+
+        ok, _ = sync()
+        check(ok and not any(tracked(path) for path in ("a.pdf", "b.log", "sub/c.tmp")),
+              "ignored files are not committed and the index is written")
+        check(os.path.exists(os.path.join(vault, ".git", "ogresync", "file-state")), "file state index exists")
+
+        # 1. The vault's .gitignore is edited to stop ignoring PDFs.
+        write(vault, ".gitignore", "*.log\n")
+        ok, _ = sync()
+        check(ok and tracked("a.pdf") and not tracked("b.log"), "edited .gitignore: a.pdf is committed")
+        settled("edited .gitignore")
+
+        # 2. A nested .gitignore is deleted.
+        os.remove(os.path.join(vault, "sub", ".gitignore"))
+        ok, _ = sync()
+        check(ok and tracked("sub/c.tmp") and not tracked("sub/.gitignore"),
+              "deleted sub/.gitignore: sub/c.tmp is committed")
+        settled("deleted sub/.gitignore")
+
+        # 3. Another device stops ignoring logs; the change arrives with a pull.
+        git(peer, "pull", "-q", "origin", "main")
+        write(peer, ".gitignore", "")
+        git(peer, "commit", "-q", "-am", "stop ignoring logs")
+        git(peer, "push", "-q", "origin", "main")
+        ok, _ = sync()
+        check(ok and tracked("b.log") and git(bare, "rev-parse", "main") == git(vault, "rev-parse", "HEAD"),
+              "pulled .gitignore change: b.log is committed and pushed")
+        settled("pulled .gitignore change")
+
+        # 4. Names starting with a space: the ignored one stays out, the other is committed.
+        write(vault, ".gitignore", "*.bak\n")
+        write(vault, " draft.bak", "backup\n")
+        write(vault, " spaced.md", "# Spaced\n")
+        ok, _ = sync()
+        check(ok and tracked(" spaced.md") and not tracked(" draft.bak"),
+              "leading space: ' draft.bak' stays ignored, ' spaced.md' is committed")
+        settled("leading space")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Startup import-cost regression check for 'import Ogresync'.
+
+Runs the import under 'python -X importtime' a few times (bytecode cache
+warmed first, best run kept), then fails with exit code 1 if
+  - the cumulative import time of Ogresync exceeds --budget-ms, or
+  - any module that must only be loaded on demand shows up at import time.
+
+Usage:
+    python benchmarks/check_import_budget.py [--budget-ms 40] [--runs 5] [--verbose]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from _util import REPO_ROOT
+
+# Loaded only when a window, a dialog or a specific feature needs them.
+ON_DEMAND_MODULES = ("tkinter", "psutil", "pyperclip", "webbrowser", "socket",
+                     "shlex", "shutil", "tempfile", "json", "argparse", "ctypes")
+
+
+def import_profile():
+    """
+    Returns ({module: (self_us, cumulative_us)}, [modules in import order]) for
+    one 'import Ogresync' in a fresh interpreter.
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # measure the cached-bytecode case, as shipped
+    code = f"import sys; sys.path.insert(0, {REPO_ROOT!r}); import Ogresync"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                            capture_output=True, text=True, check=True)
+    timings, order = {}, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        timings[name] = (int(self_us), int(cumulative_us))
+        order.append(name)
+    return timings, order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=40.0)  # ~23 ms measured, headroom for slower machines
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--verbose", action="store_true", help="list the slowest modules")
+    args = parser.parse_args()
+
+    import_profile()  # writes __pycache__
+    best = min((import_profile() for _ in range(args.runs)), key=lambda run: run[0]["Ogresync"][1])
+    timings, order = best
+    total_ms = timings["Ogresync"][1] / 1000.0
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"'import Ogresync' took {total_ms:.1f} ms (budget {args.budget_ms:.1f} ms)")
+    eager = [name for name in ON_DEMAND_MODULES if name in timings]
+    if eager:
+        failures.append("loaded at import time but should be imported on demand: " + ", ".join(eager))
+
+    print(f"'import Ogresync': {total_ms:.1f} ms cumulative, {len(order)} modules "
+          f"(budget {args.budget_ms:.1f} ms, best of {args.runs})")
+    if args.verbose or failures:
+        for name, (self_us, _) in sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:10]:
+            print(f"  {self_us / 1000.0:7.2f} ms  {name}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+End-to-end check of live sync: a scripted writer saves notes in a vault while
+LiveSync watches it, and the commits and pushes to a local bare remote are
+checked against the debounce and max-latency rules. A save that is still
+pending when live sync stops must be committed and pushed by the headless
+sync that follows (the final flush after Obsidian closes).
+Exits with code 1 if any check fails.
+
+Usage:
+    python benchmarks/check_live_sync.py [--debounce 1] [--max-latency 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _util import SCRIPT, git, wait_until
+
+SLACK = 1.5  # seconds a commit may come later than due (watcher wakeups, git)
+
+
+def save(vault, path, text):
+    with open(os.path.join(vault, path), "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--debounce", type=float, default=1.0)
+    parser.add_argument("--max-latency", type=float, default=3.0)
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_dir = os.path.join(tmp, "config")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "ogresync.ini"), "w", encoding="utf-8") as f:
+            f.write("[ogresync]\npush_agent = false\n")
+        os.environ["OGRESYNC_CONFIG_DIR"] = config_dir
+        import Ogresync
+
+        bare = os.path.join(tmp, "origin.git")
+        vault = os.path.join(tmp, "vault")
+        git(tmp, "init", "-q", "--bare", "-b", "main", bare)
+        git(tmp, "init", "-q", "-b", "main", vault)
+        for key, val in (("user.name", "check"), ("user.email", "check@example.com")):
+            git(vault, "config", key, val)
+        save(vault, "note.md", "# Note\n")
+        git(vault, "add", "-A")
+        git(vault, "commit", "-q", "-m", "init")
+        git(vault, "remote", "add", "origin", bare)
+        git(vault, "push", "-q", "-u", "origin", "main")
+
+        def pushed():
+            return git(bare, "rev-parse", "main") == git(vault, "rev-parse", "HEAD")
+
+        live = Ogresync.LiveSync(vault, debounce=args.debounce, max_latency=args.max_latency)
+        live.start()
+        time.sleep(0.5)  # let the watcher register the vault
+
+        # 1. One save is committed once saves have been quiet for 'debounce' seconds.
+        start = time.monotonic()
+        save(vault, "note.md", "First save.\n")
+        time.sleep(args.debounce / 2)
+        check(live.commits == 0, "nothing is committed before the debounce passed")
+        committed = wait_until(lambda: live.commits == 1, args.debounce + SLACK)
+        latency = time.monotonic() - start
+        check(committed and latency >= args.debounce, f"single save committed after the debounce ({latency:.1f} s)")
+        check(wait_until(pushed, SLACK), "debounced commit is pushed")
+
+        # 2. Saves that never pause for 'debounce' are committed after 'max_latency'.
+        start = time.monotonic()
+        interval = args.debounce / 3
+        first_commit = None
+        i = 0
+        while time.monotonic() - start < 2 * args.max_latency:
+            save(vault, f"burst-{i % 3}.md", f"Save {i}.\n")
+            i += 1
+            if first_commit is None and live.commits > 1:
+                first_commit = time.monotonic() - start
+            time.sleep(interval)
+        check(first_commit is not None and args.max_latency <= first_commit + interval
+              and first_commit <= args.max_latency + SLACK,
+              f"continuous saves committed after max_latency ({first_commit or 0:.1f} s)")
+        commits_while_saving = live.commits - 1
+        check(1 <= commits_while_saving <= 2,  # at most one per max_latency
+              f"a burst of {i} saves became {commits_while_saving} commit(s)")
+        check(wait_until(lambda: not git(vault, "status", "--porcelain"), args.debounce + SLACK) and
+              wait_until(pushed, SLACK), "saves after the last commit are committed and pushed once quiet")
+
+        # 3. A save still waiting for the debounce when live sync stops is left to the final sync.
+        commits = live.commits
+        save(vault, "note.md", "Last save before closing.\n")
+        live.stop()
+        check(live.commits == commits and git(vault, "status", "--porcelain"),
+              "stopping live sync leaves a pending save uncommitted")
+        result = subprocess.run([sys.executable, SCRIPT, "sync", "--vault", vault], env=os.environ,
+                                capture_output=True, text=True, timeout=120)
+        check(result.returncode == 0 and not git(vault, "status", "--porcelain") and pushed(),
+              "the sync after Obsidian closes commits and pushes the pending save")
+        check("Last save before closing." in git(bare, "show", "main:note.md"), "remote has the last save")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
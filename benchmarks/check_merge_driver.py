@@ -0,0 +1,87 @@
+"""
+Check of the Markdown merge driver: merge_markdown on edge cases around the
+final newline and notes added on both sides, then the same cases through
+'git merge' with the driver installed in a scratch repository (including a
+note whose name starts with '-'), checking the merged file and whether git
+reports a conflict.
+Exits with code 1 if any check fails.
+
+Usage:
+    python benchmarks/check_merge_driver.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from _util import git
+
+# (what, base, ours, theirs, merged text or None to only check for conflicts, conflicts)
+CASES = [
+    ("one side removed the final newline", "a\nb\n", "a\nb\n", "a\nb", "a\nb", 0),
+    ("one side added the final newline", "a\nb", "a\nb\n", "a\nb", "a\nb\n", 0),
+    ("removed final newline, other side edited", "a\nb\n", "A\nb\n", "a\nb", "A\nb", 0),
+    ("added final newline, other side edited", "a\nb", "A\nb", "a\nb\n", "A\nb\n", 0),
+    ("no final newline on any side, appended line", "a\nb", "a\nb", "a\nb\nc", "a\nb\nc", 0),
+    ("both sides removed the final newline", "a\nb\n", "a\nb", "a\nb", "a\nb", 0),
+    ("CRLF note, one side removed the final newline", "a\r\nb\r\n", "A\r\nb\r\n", "a\r\nb", "A\r\nb", 0),
+    ("different notes added on both sides", "", "# Title\nours\n", "# Title\ntheirs\n", None, 1),
+]
+
+
+def write(root, path, text):
+    with open(os.path.join(root, path), "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+
+
+def main():
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["OGRESYNC_CONFIG_DIR"] = os.path.join(tmp, "config")
+        import Ogresync
+
+        for what, base, ours, theirs, expected, conflicts in CASES:
+            merged, found = Ogresync.merge_markdown(base, ours, theirs)
+            check(found == conflicts and (expected is None or merged == expected),
+                  f"merge_markdown, {what}: {merged!r}")
+
+        # The same cases through git, which only runs the driver when both
+        # sides changed the note; the others are still merged as expected.
+        for i, (what, base, ours, theirs, expected, conflicts) in enumerate(CASES):
+            repo = os.path.join(tmp, f"repo-{i}")
+            git(tmp, "init", "-q", "-b", "main", repo)
+            for key, val in (("user.name", "check"), ("user.email", "check@example.com"),
+                             ("core.autocrlf", "false")):
+                git(repo, "config", key, val)
+            Ogresync.install_merge_driver(repo)
+            name = "-dash note.md" if i == 2 else "note.md"
+            if base:
+                write(repo, name, base)
+                git(repo, "add", "--", name)
+            git(repo, "commit", "-q", "--allow-empty", "-m", "base")
+            git(repo, "checkout", "-q", "-b", "theirs")
+            write(repo, name, theirs)
+            git(repo, "add", "--", name)
+            git(repo, "commit", "-q", "--allow-empty", "-m", "theirs")
+            git(repo, "checkout", "-q", "main")
+            write(repo, name, ours)
+            git(repo, "add", "--", name)
+            git(repo, "commit", "-q", "--allow-empty", "-m", "ours")
+            result = subprocess.run(["git", "merge", "-q", "--no-edit", "theirs"], cwd=repo,
+                                    capture_output=True, text=True)
+            with open(os.path.join(repo, name), encoding="utf-8", newline="") as f:
+                merged = f.read()
+            check((result.returncode != 0) == bool(conflicts) and (expected is None or merged == expected),
+                  f"git merge, {what}{' (' + name + ')' if name != 'note.md' else ''}: {merged!r}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
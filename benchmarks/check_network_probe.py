@@ -0,0 +1,180 @@
+"""
+Check of the remote reachability probe against local TCP listeners on
+127.0.0.1 and ::1 that are started and stopped by the script, with a vault
+whose 'origin' points at them. Covers the TTL cache (several calls share one
+probe), a stopped listener being noticed only once the cached success has
+expired, the known-offline fast path after a failure, and where the probed
+host and port come from ('git remote get-url origin' for https and scp-style
+ssh remotes, and an 'ssh -G' Port override through a test ssh_config).
+Exits with code 1 if any check fails.
+
+Usage:
+    python benchmarks/check_network_probe.py [--ttl 1]
+"""
+import argparse
+import os
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+from _util import free_port, git
+
+FAKE_SSH = """#!/bin/sh
+exec {ssh} -F {config} "$@"
+"""
+
+
+class Listener:
+    """
+    Accepts (and immediately closes) connections on one address while up,
+    counting them.
+    """
+
+    def __init__(self, family, host, port):
+        self.family, self.host, self.port = family, host, port
+        self.accepted = 0
+        self._server = None
+
+    def start(self):
+        server = socket.socket(self.family, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        server.listen(16)
+        self._server = server
+
+        def accept():
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                self.accepted += 1
+                conn.close()
+
+        threading.Thread(target=accept, daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)  # wakes the accept thread
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ttl", type=float, default=1.0, help="online/offline cache TTL used for the check")
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["OGRESYNC_CONFIG_DIR"] = os.path.join(tmp, "config")
+        import Ogresync
+        Ogresync.NETWORK_ONLINE_TTL = Ogresync.NETWORK_OFFLINE_TTL = args.ttl
+        Ogresync.NETWORK_PROBE_TIMEOUT = 1.0
+
+        probes = []
+        real_probe = Ogresync.probe_endpoint
+
+        def counting_probe(host, port, *rest):
+            probes.append((host, port))
+            return real_probe(host, port, *rest)
+
+        Ogresync.probe_endpoint = counting_probe
+
+        port = free_port()
+        listeners = [Listener(socket.AF_INET, "127.0.0.1", port)]
+        if socket.has_ipv6:
+            listeners.append(Listener(socket.AF_INET6, "::1", port))
+        for listener in list(listeners):
+            try:
+                listener.start()
+            except OSError as e:
+                print(f"note: no listener on {listener.host} ({e})")
+                listeners.remove(listener)
+
+        vault = os.path.join(tmp, "vault")
+        git(tmp, "init", "-q", "-b", "main", vault)
+        git(vault, "remote", "add", "origin", f"https://localhost:{port}/vault.git")
+
+        def set_origin(url):
+            git(vault, "remote", "set-url", "origin", url)
+            Ogresync.invalidate_network_cache()
+            probes.clear()
+
+        # 1. Three calls within the TTL share one probe.
+        Ogresync.invalidate_network_cache()
+        results = [Ogresync.is_network_available(vault) for _ in range(3)]
+        check(results == [True] * 3 and probes == [("localhost", port)],
+              f"three calls share one probe of localhost:{port} ({len(probes)} probe(s))")
+        check(sum(listener.accepted for listener in listeners) >= 1, "the probe connected to the listener")
+
+        # 2. A stopped listener is only noticed once the cached success expires.
+        for listener in listeners:
+            listener.stop()
+        stopped_at = time.monotonic()
+        cached = Ogresync.is_network_available(vault)
+        check(cached is True and len(probes) == 1, "right after the listener stops, the cached success is used")
+        time.sleep(max(args.ttl - (time.monotonic() - stopped_at), 0) + 0.1)
+        check(Ogresync.is_network_available(vault) is False and len(probes) == 2,
+              "after the TTL, a new probe reports the remote as unreachable")
+
+        # 3. After a failure, the known-offline fast path answers without connecting.
+        start = time.perf_counter()
+        fast = [Ogresync.is_known_offline(vault), Ogresync.is_network_available(vault)]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        check(fast == [True, False] and len(probes) == 2,
+              f"known offline: answered in {elapsed_ms:.2f} ms without a new probe")
+        for listener in listeners:
+            listener.start()
+        time.sleep(args.ttl + 0.1)
+        check(Ogresync.is_network_available(vault) is True and not Ogresync.is_known_offline(vault),
+              "once the offline TTL passed, the restarted listener is found again")
+
+        # 4. Where the endpoint comes from.
+        set_origin(f"https://localhost:{port}/vault.git")
+        check(Ogresync.get_remote_endpoint(vault) == ("localhost", port), "https URL: host and port from the URL")
+        set_origin(os.path.join(tmp, "origin.git"))
+        check(Ogresync.get_remote_endpoint(vault) is None and Ogresync.is_network_available(vault) and not probes,
+              "local path remote: no probe")
+        ssh = shutil.which("ssh")
+        if ssh is None:
+            print("note: no ssh client, scp-style and ssh -G checks skipped")
+        else:
+            config = os.path.join(tmp, "ssh_config")
+            with open(config, "w", encoding="utf-8") as f:
+                f.write(f"Host vault-alias\n  HostName localhost\n  Port {port}\n")
+            bin_dir = os.path.join(tmp, "bin")
+            os.makedirs(bin_dir)
+            fake_ssh = os.path.join(bin_dir, "ssh")
+            with open(fake_ssh, "w", encoding="utf-8") as f:
+                f.write(FAKE_SSH.format(ssh=ssh, config=config))
+            os.chmod(fake_ssh, os.stat(fake_ssh).st_mode | stat.S_IEXEC)
+            os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+
+            set_origin("git@localhost:user/vault.git")
+            check(Ogresync.get_remote_endpoint(vault) == ("localhost", 22), "scp-style ssh remote: host, port 22")
+            set_origin("git@vault-alias:user/vault.git")
+            endpoint = Ogresync.get_remote_endpoint(vault)
+            check(endpoint == ("localhost", port) and Ogresync.is_network_available(vault),
+                  f"ssh alias: HostName and Port from 'ssh -G' ({endpoint})")
+        for listener in listeners:
+            listener.stop()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+End-to-end check of the prompt channel between sync workers and the user:
+conflicting remote changes are synced in-process with conflict_policy = ask
+while a scripted backend answers (or ignores) the prompts, and the vault is
+checked after each run. Covers answers for all files and per file, timeouts,
+cancelling while a prompt is open, and a manual merge that is or is not
+acknowledged. Needs no display.
+Exits with code 1 if any check fails.
+
+Usage:
+    python benchmarks/check_prompts.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from _util import git
+
+
+def make_conflict(tmp, name, files=("note.md",)):
+    """
+    A vault whose last local commit and origin/main changed the same line of each file.
+    """
+    bare = os.path.join(tmp, f"{name}.git")
+    vault = os.path.join(tmp, name)
+    peer = os.path.join(tmp, f"{name}-peer")
+    git(tmp, "init", "-q", "--bare", "-b", "main", bare)
+    git(tmp, "init", "-q", "-b", "main", vault)
+    git(vault, "config", "user.name", "check")
+    git(vault, "config", "user.email", "check@example.com")
+    for path in files:
+        with open(os.path.join(vault, path), "w", encoding="utf-8") as f:
+            f.write("# Note\nshared line\n")
+    git(vault, "add", "-A")
+    git(vault, "commit", "-q", "-m", "init")
+    git(vault, "remote", "add", "origin", bare)
+    git(vault, "push", "-q", "-u", "origin", "main")
+    git(tmp, "clone", "-q", bare, peer)
+    git(peer, "config", "user.name", "peer")
+    git(peer, "config", "user.email", "peer@example.com")
+    for repo, text in ((peer, "remote line\n"), (vault, "local line\n")):
+        for path in files:
+            with open(os.path.join(repo, path), "w", encoding="utf-8") as f:
+                f.write("# Note\n" + text)
+        git(repo, "commit", "-q", "-am", "edit")
+    git(peer, "push", "-q", "origin", "main")
+    return vault
+
+
+def note(vault, path="note.md"):
+    with open(os.path.join(vault, path), encoding="utf-8") as f:
+        return f.read()
+
+
+def merging(vault):
+    return os.path.exists(os.path.join(vault, ".git", "MERGE_HEAD"))
+
+
+class SilentPrompts:
+    """
+    A backend that never answers, like a user who walked away from the dialog.
+    """
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, prompt, future):
+        self.futures.append(future)
+
+
+def main():
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["OGRESYNC_CONFIG_DIR"] = os.path.join(tmp, "config")
+        import Ogresync
+        Ogresync.config_data.update(CONFLICT_POLICY="ask", PUSH_AGENT=False)
+
+        def sync(vault, backend, cancel_after=None):
+            Ogresync.prompt_backend = backend
+            engine = Ogresync.SyncEngine([vault])
+            if cancel_after is not None:
+                threading.Timer(cancel_after, engine.cancel, args=("Cancelled by check.",)).start()
+            start = time.monotonic()
+            results = engine.run()
+            return results[vault], engine.cancelled, time.monotonic() - start
+
+        # 1. The worker's conflict prompt is answered "theirs".
+        vault = make_conflict(tmp, "theirs")
+        backend = Ogresync.ScriptedPrompts({"conflict": "theirs"})
+        ok, _, _ = sync(vault, backend)
+        check(ok and note(vault) == "# Note\nremote line\n", "answer 'theirs' keeps the remote version")
+        check([(p.kind, p.files) for p in backend.asked] == [("conflict", ["note.md"])],
+              "one conflict prompt listing note.md")
+
+        # 2. Answered "ours".
+        vault = make_conflict(tmp, "ours")
+        ok, _, _ = sync(vault, Ogresync.ScriptedPrompts({"conflict": "ours"}))
+        check(ok and note(vault) == "# Note\nlocal line\n", "answer 'ours' keeps the local version")
+
+        # 3. Nobody answers: the prompt times out and the remote changes are not applied.
+        vault = make_conflict(tmp, "timeout")
+        Ogresync.config_data["PROMPT_TIMEOUT"] = 1.0
+        backend = SilentPrompts()
+        _, _, elapsed = sync(vault, backend)
+        Ogresync.config_data["PROMPT_TIMEOUT"] = 0.0
+        check(note(vault) == "# Note\nlocal line\n" and backend.futures[0].cancelled(),
+              f"unanswered prompt times out after {elapsed:.1f} s and is withdrawn")
+
+        # 4. Cancelling while a prompt is open (no timeout) ends the sync promptly.
+        vault = make_conflict(tmp, "cancel")
+        _, cancelled, elapsed = sync(vault, SilentPrompts(), cancel_after=0.5)
+        check(cancelled and elapsed < 5 and not merging(vault), f"cancel with an open prompt stops in {elapsed:.1f} s")
+
+        # 5. Manual merge that is never acknowledged: the merge is aborted.
+        vault = make_conflict(tmp, "manual-abort")
+        ok, _, _ = sync(vault, Ogresync.ScriptedPrompts({"conflict": "manual"}))
+        check(not ok and not merging(vault) and note(vault) == "# Note\nlocal line\n",
+              "unacknowledged manual merge is aborted")
+
+        # 6. Manual merge that the "user" resolves before clicking OK.
+        vault = make_conflict(tmp, "manual-ok")
+
+        def resolve(prompt):
+            with open(os.path.join(vault, "note.md"), "w", encoding="utf-8") as f:
+                f.write("# Note\nlocal line\nremote line\n")
+            return "ok"
+
+        ok, _, _ = sync(vault, Ogresync.ScriptedPrompts({"conflict": "manual", "notice": resolve}))
+        check(ok and not merging(vault) and len(git(vault, "log", "-1", "--format=%P").split()) == 2,
+              "acknowledged manual merge is committed as a merge")
+
+        # 7. A choice per file; the dialog's preview reads both versions of a file.
+        vault = make_conflict(tmp, "per-file", files=("note.md", "other.md"))
+        previews = []
+
+        def per_file(prompt):
+            previews.append(prompt.sides("note.md"))
+            return {"note.md": "theirs", "other.md": "ours"}
+
+        ok, _, _ = sync(vault, Ogresync.ScriptedPrompts({"conflict": per_file}))
+        check(ok and note(vault) == "# Note\nremote line\n" and note(vault, "other.md") == "# Note\nlocal line\n",
+              "per-file answers keep the chosen version of each file")
+        check(previews == [(b"# Note\nlocal line\n", b"# Note\nremote line\n")],
+              "preview loads the local and remote version of a file")
+
+        # 8. Answers are validated against the prompt type.
+        try:
+            Ogresync.prompt_backend = Ogresync.ScriptedPrompts({"conflict": "delete everything"})
+            Ogresync.ask_user(Ogresync.ConflictPrompt(["a.md"]), timeout=1)
+            check(False, "invalid answers are rejected")
+        except ValueError:
+            check(True, "invalid answers are rejected")
+        try:
+            Ogresync.prompt_backend = Ogresync.ScriptedPrompts({"conflict": {"a.md": "ours"}})
+            Ogresync.ask_user(Ogresync.ConflictPrompt(["a.md", "b.md"]), timeout=1)
+            check(False, "per-file answers must cover every file")
+        except ValueError:
+            check(True, "per-file answers must cover every file")
+
+        # 9. The side-by-side preview stays instant for long, heavily edited notes.
+        local = b"".join(b"line %d\n" % i for i in range(20000))
+        remote = b"".join(b"line %d\n" % (i * 2) for i in range(20000))
+        start = time.perf_counter()
+        rows = Ogresync.conflict_preview_rows(local, remote)
+        elapsed = time.perf_counter() - start
+        check(elapsed < 1 and rows[0] == ("line 0", "line 0", ""),
+              f"preview of two 20000-line versions built in {elapsed * 1000:.0f} ms")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
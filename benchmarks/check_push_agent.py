@@ -0,0 +1,220 @@
+"""
+End-to-end check of the offline push queue: a headless sync while the remote
+is unreachable queues the vault and starts the push agent; once the remote
+comes back, the agent pushes the queued commit and exits.
+
+The remote is a local bare repository reached over ssh://127.0.0.1:PORT. A
+fake 'ssh' fails with "Connection refused" while a flag file exists, and a
+local TCP listener on PORT answers Ogresync's reachability probe only while
+the remote is "up", so availability can be toggled without touching the
+machine's network. Also checks that several processes can update the queue
+at once without losing entries, and that only one agent runs at a time, with
+liveness taken from the agent's lock rather than from its pid file. Exits with code 1 if any check fails.
+
+Usage:
+    python benchmarks/check_push_agent.py [--interval 1] [--timeout 30]
+"""
+import argparse
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from _util import REPO_ROOT, SCRIPT, free_port, git, wait_until
+
+FAKE_SSH = """#!/bin/sh
+for arg in "$@"; do [ "$arg" = "-O" ] && exit 0; done
+if [ -e "{down_flag}" ]; then
+    echo "ssh: connect to host 127.0.0.1 port {port}: Connection refused" >&2
+    exit 255
+fi
+while [ $# -gt 1 ]; do shift; done
+exec sh -c "$1"
+"""
+
+
+class Remote:
+    """
+    Toggles the fake remote: 'up' means the probe port accepts connections and
+    the fake ssh forwards to the bare repository.
+    """
+
+    def __init__(self, port, down_flag):
+        self.port = port
+        self.down_flag = down_flag
+        self._server = None
+
+    def up(self):
+        if os.path.exists(self.down_flag):
+            os.remove(self.down_flag)
+        server = socket.socket()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("127.0.0.1", self.port))
+        server.listen(16)
+        self._server = server
+
+        def accept():
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                conn.close()
+
+        threading.Thread(target=accept, daemon=True).start()
+
+    def down(self):
+        open(self.down_flag, "w").close()
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)  # wakes the accept thread
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--interval", type=float, default=1.0, help="push_agent_interval for the agent")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_dir = os.path.join(tmp, "config")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "ogresync.ini"), "w", encoding="utf-8") as f:
+            f.write(f"[ogresync]\npush_agent_interval = {args.interval}\n")
+        queue_path = os.path.join(config_dir, "push-queue.json")
+        pid_path = os.path.join(config_dir, "push-agent.pid")
+
+        port = free_port()
+        remote = Remote(port, os.path.join(tmp, "remote-down"))
+        ssh = os.path.join(tmp, "ssh")
+        with open(ssh, "w", encoding="utf-8") as f:
+            f.write(FAKE_SSH.format(down_flag=remote.down_flag, port=port))
+        os.chmod(ssh, os.stat(ssh).st_mode | stat.S_IEXEC)
+        env = dict(os.environ, OGRESYNC_CONFIG_DIR=config_dir, GIT_SSH=ssh, GIT_SSH_VARIANT="ssh")
+
+        bare = os.path.join(tmp, "origin.git")
+        vault = os.path.join(tmp, "vault")
+        git(tmp, "init", "-q", "--bare", "-b", "main", bare)
+        git(tmp, "init", "-q", "-b", "main", vault)
+        for key, val in (("user.name", "check"), ("user.email", "check@example.com")):
+            git(vault, "config", key, val)
+        with open(os.path.join(vault, "note.md"), "w", encoding="utf-8") as f:
+            f.write("# Note\n")
+        git(vault, "add", "-A")
+        git(vault, "commit", "-q", "-m", "init")
+        git(vault, "remote", "add", "origin", bare)
+        git(vault, "push", "-q", "-u", "origin", "main")
+        git(vault, "remote", "set-url", "origin", f"ssh://127.0.0.1:{port}{bare}")
+
+        # 1. Remote down: the sync commits locally, queues the vault and starts the agent.
+        remote.down()
+        with open(os.path.join(vault, "note.md"), "a", encoding="utf-8") as f:
+            f.write("Written offline.\n")
+        result = subprocess.run([sys.executable, SCRIPT, "sync", "--vault", vault], env=env,
+                                capture_output=True, text=True)
+        check(result.returncode == 0, "offline sync succeeds")
+        with open(queue_path, encoding="utf-8") as f:
+            queued = json.load(f)["vaults"]
+        check(os.path.abspath(vault) in queued, "vault is in the push queue")
+        check(wait_until(lambda: os.path.exists(pid_path), 5), "push agent started")
+        head = git(vault, "rev-parse", "HEAD")
+
+        time.sleep(2 * args.interval)
+        check(git(bare, "rev-parse", "main") != head, "nothing is pushed while the remote is down")
+
+        # 2. Remote back: the agent pushes within about one probe interval and exits.
+        remote.up()
+        start = time.monotonic()
+        pushed = wait_until(lambda: git(bare, "rev-parse", "main") == head, args.timeout)
+        latency = time.monotonic() - start
+        check(pushed, f"queued commit pushed after the remote came back ({latency:.1f} s)")
+        check(wait_until(lambda: not os.path.exists(pid_path), args.timeout), "push agent exited")
+        with open(queue_path, encoding="utf-8") as f:
+            check(json.load(f)["vaults"] == {}, "push queue is empty")
+
+        # 3. A queued vault with nothing to push is dropped without a push attempt.
+        with open(queue_path, "w", encoding="utf-8") as f:
+            json.dump({"vaults": {os.path.abspath(vault): {"queued_at": 0}}}, f)
+        agent = subprocess.run([sys.executable, SCRIPT, "push-agent"], env=env,
+                               capture_output=True, text=True, timeout=args.timeout)
+        with open(queue_path, encoding="utf-8") as f:
+            check(agent.returncode == 0 and json.load(f)["vaults"] == {},
+                  "agent stops once 'git log origin/main..HEAD' is empty")
+
+        # 4. Reachable but failing pushes back off instead of retrying in a loop.
+        open(remote.down_flag, "w").close()  # the probe still answers, ssh refuses
+        with open(os.path.join(vault, "note.md"), "a", encoding="utf-8") as f:
+            f.write("Second edit.\n")
+        git(vault, "commit", "-q", "-am", "second")
+        with open(queue_path, "w", encoding="utf-8") as f:
+            json.dump({"vaults": {os.path.abspath(vault): {"queued_at": 0}}}, f)
+        agent = subprocess.Popen([sys.executable, SCRIPT, "push-agent"], env=env,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        time.sleep(3 * args.interval)
+        agent.terminate()
+        output = agent.communicate(timeout=10)[0]
+        attempts = output.count("retrying in")
+        check(attempts == 1, f"failed push is retried with backoff ({attempts} attempt(s) in {3 * args.interval:g} s)")
+        check(not os.path.exists(pid_path), "terminated agent removes its pid file")
+        remote.down()
+
+        # 5. Several processes updating the queue at once keep each other's entries.
+        os.remove(queue_path)
+        writer = ("import sys, Ogresync\n"
+                  "for i in range(30):\n"
+                  "    Ogresync.update_push_queue(add=[f'/vaults/{sys.argv[1]}-{i}'])\n")
+        writers = [subprocess.Popen([sys.executable, "-c", writer, str(n)], env=dict(env, PYTHONPATH=REPO_ROOT))
+                   for n in range(8)]
+        for proc in writers:
+            proc.wait()
+        with open(queue_path, encoding="utf-8") as f:
+            queued = len(json.load(f)["vaults"])
+        check(queued == 8 * 30, f"8 concurrent writer processes kept {queued} of {8 * 30} queue entries")
+
+        # 6. Liveness comes from the agent's lock, not from the pid file.
+        def agent_running():
+            probe = "import Ogresync\nprint(Ogresync.push_agent_running())\n"
+            return subprocess.run([sys.executable, "-c", probe], env=dict(env, PYTHONPATH=REPO_ROOT),
+                                  capture_output=True, text=True).stdout.strip() == "True"
+
+        with open(pid_path, "w", encoding="utf-8") as f:
+            f.write(str(os.getpid()))  # stale file naming a live process
+        check(not agent_running(), "a stale pid file naming a live process is not a running agent")
+        with open(queue_path, "w", encoding="utf-8") as f:
+            json.dump({"vaults": {os.path.abspath(vault): {"queued_at": 0}}}, f)
+        agents = [subprocess.Popen([sys.executable, SCRIPT, "push-agent"], env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+                  for _ in range(2)]
+        check(wait_until(lambda: any(agent.poll() is not None for agent in agents), 10),
+              "of two agents started together, one exits")
+        running = [agent for agent in agents if agent.poll() is None]
+        exited = [agent for agent in agents if agent.poll() is not None]
+        check(len(running) == 1 and "already running" in exited[0].communicate()[0],
+              "the other keeps running")
+        check(agent_running(), "the running agent is reported")
+        for agent in running:
+            agent.terminate()
+            agent.communicate(timeout=10)
+        check(not agent_running(), "once it is terminated, no agent is reported")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
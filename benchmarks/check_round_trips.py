@@ -0,0 +1,101 @@
+"""
+Check of the remote round trips of a headless sync: a vault cloned from a
+local bare repository is synced in four situations (no changes, local branch
+ahead, remote branch ahead, both ahead) and the number of fetches and pushes is
+compared with what each needs. Fetches and pushes are counted by wrapping
+git-upload-pack and git-receive-pack (remote.origin.uploadpack/receivepack),
+and the total must match the count the sync reports (remote_round_trips).
+Exits with code 1 if any check fails.
+
+Usage:
+    python benchmarks/check_round_trips.py
+"""
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+
+from _util import SCRIPT, git
+
+# (situation, local commit, remote commit, fetches, pushes)
+SESSIONS = [
+    ("no changes", False, False, 1, 0),
+    ("local ahead", True, False, 1, 1),
+    ("remote ahead", False, True, 1, 0),
+    ("diverged", True, True, 1, 1),
+]
+
+
+def append(root, path, text):
+    with open(os.path.join(root, path), "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def main():
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_dir = os.path.join(tmp, "config")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "ogresync.ini"), "w", encoding="utf-8") as f:
+            f.write("[ogresync]\npush_agent = false\n")
+        env = dict(os.environ, OGRESYNC_CONFIG_DIR=config_dir)
+
+        bare = os.path.join(tmp, "origin.git")
+        seed = os.path.join(tmp, "seed")
+        vault = os.path.join(tmp, "vault")
+        peer = os.path.join(tmp, "peer")
+        log = os.path.join(tmp, "remote.log")
+        git(tmp, "init", "-q", "--bare", "-b", "main", bare)
+        git(tmp, "init", "-q", "-b", "main", seed)
+        for key, val in (("user.name", "check"), ("user.email", "check@example.com")):
+            git(seed, "config", key, val)
+        append(seed, "local.md", "# Local\n")
+        append(seed, "remote.md", "# Remote\n")
+        git(seed, "add", "-A")
+        git(seed, "commit", "-q", "-m", "init")
+        git(seed, "push", "-q", bare, "main")
+        for clone in (vault, peer):
+            git(tmp, "clone", "-q", bare, clone)
+            for key, val in (("user.name", "check"), ("user.email", "check@example.com")):
+                git(clone, "config", key, val)
+        # git runs these with the shell and the repository path appended.
+        git(vault, "config", "remote.origin.uploadpack", f"echo fetch >> {shlex.quote(log)}; git-upload-pack")
+        git(vault, "config", "remote.origin.receivepack", f"echo push >> {shlex.quote(log)}; git-receive-pack")
+
+        for i, (situation, local_commit, remote_commit, fetches, pushes) in enumerate(SESSIONS):
+            if remote_commit:
+                append(peer, "remote.md", f"Remote edit {i}.\n")
+                git(peer, "commit", "-q", "-am", f"remote {i}")
+                git(peer, "push", "-q", "origin", "main")
+            if local_commit:
+                append(vault, "local.md", f"Local edit {i}.\n")
+                git(vault, "commit", "-q", "-am", f"local {i}")
+            open(log, "w").close()
+            result = subprocess.run([sys.executable, SCRIPT, "sync", "--vault", vault], env=env,
+                                    capture_output=True, text=True, timeout=120)
+            with open(log, encoding="utf-8") as f:
+                calls = f.read().split()
+            reported = re.search(r"\((\d+) remote round trip", result.stdout)
+            reported = int(reported.group(1)) if reported else None
+            check(result.returncode == 0 and calls.count("fetch") == fetches and calls.count("push") == pushes,
+                  f"{situation}: {calls.count('fetch')} fetch(es), {calls.count('push')} push(es) "
+                  f"(expected {fetches} and {pushes})")
+            check(reported == len(calls), f"{situation}: the sync reports {reported} round trip(s)")
+            in_sync = git(bare, "rev-parse", "main") == git(vault, "rev-parse", "HEAD")
+            check(in_sync and not git(vault, "status", "--porcelain"),
+                  f"{situation}: vault and remote are at the same commit")
+            git(peer, "pull", "-q", "origin", "main")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()